@@ -1,322 +1,549 @@
-# Model_Word.py
-"""
-تنبؤ كلمات (89 صنف) باستخدام ONNX Runtime + MediaPipe Holistic
-- النموذج: Mubser_model_89cls_64.onnx
-- الميتاداتا: Mubser_model_89cls_64.meta.json
-- إدخال: صورة واحدة (PIL.Image أو مسار)
-- إخراج: (label, confidence, top_k_list)
-"""
-
-from typing import Tuple, List, Optional, Union
-from pathlib import Path
-import json
-import logging
-import atexit
-
-import numpy as np
-from PIL import Image
-import cv2
-import mediapipe as mp
-import onnxruntime as ort
-
-# ================= إعداد السجلات =================
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("Model_Word")
-
-# ================= إعداد المسارات =================
-MODEL_PATH = Path("Mubser_model_89cls_64.onnx")
-META_PATH  = Path("Mubser_model_89cls_64.meta.json")
-
-# ================= تحميل الميتاداتا =================
-try:
-    with META_PATH.open("r", encoding="utf-8") as f:
-        _meta = json.load(f)
-    CLASSES: List[str] = _meta["classes"]
-    IMG_SIZE: int = int(_meta.get("img_size", 64))
-    # اختياري: تطبيع (إذا موجود في الميتاداتا)
-    _norm = _meta.get("normalize") or {}
-    NORM_MEAN: Optional[List[float]] = _norm.get("mean")
-    NORM_STD: Optional[List[float]] = _norm.get("std")
-    # اختياري: mapping (إن وُجد) لتحويل اللابل لعرض عربي/إنجليزي
-    LABEL_MAPPING: Optional[dict] = _meta.get("mapping")
-    logger.info(f"✅ Loaded meta: {len(CLASSES)} classes, img_size={IMG_SIZE}")
-except Exception as e:
-    logger.error(f"❌ Failed to load meta '{META_PATH}': {e}")
-    raise
-
-# ================= تهيئة MediaPipe Holistic (وضع ثابت) =================
-mp_holistic = mp.solutions.holistic
-_holistic = mp_holistic.Holistic(
-    static_image_mode=True,
-    model_complexity=1,
-    refine_face_landmarks=False,
-    min_detection_confidence=0.6
-)
-def _close_holistic():
-    try:
-        _holistic.close()
-    except Exception:
-        pass
-atexit.register(_close_holistic)
-
-# ================= تهيئة ONNX Runtime =================
-try:
-    _session = ort.InferenceSession(str(MODEL_PATH), providers=["CPUExecutionProvider"])
-    _input_name = _session.get_inputs()[0].name
-    _output_name = _session.get_outputs()[0].name
-    logger.info("✅ ONNX session initialized (CPUExecutionProvider)")
-except Exception as e:
-    logger.error(f"❌ Failed to initialize ONNX session: {e}")
-    raise
-
-# =====================================================
-#                وظائف المعالجة/التنبؤ
-# =====================================================
-
-def crop_holistic_union_pil(img_pil: Image.Image, pad: int = 20, max_size: int = 640) -> Image.Image:
-    """
-    يقصّ مستطيلاً واحدًا يضم اليدين + الوجه + الجسم
-    """
-    try:
-        # تصغير الصورة أولاً لتسريع MediaPipe
-        w, h = img_pil.size
-        if max(w, h) > max_size:
-            scale = max_size / max(w, h)
-            new_w, new_h = int(w * scale), int(h * scale)
-            img_pil = img_pil.resize((new_w, new_h), Image.LANCZOS)
-        
-        bgr = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
-        h, w = bgr.shape[:2]
-        res = _holistic.process(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
-
-        xs, ys = [], []
-
-        # اليدان
-        for hand_lms in [res.left_hand_landmarks, res.right_hand_landmarks]:
-            if hand_lms:
-                for lm in hand_lms.landmark:
-                    xs.append(int(lm.x * w))
-                    ys.append(int(lm.y * h))
-
-        # الوجه (نقاط مفتاحية محددة فقط)
-        if res.face_landmarks:
-            key_face_points = [10, 152, 234, 454, 1]
-            lms = res.face_landmarks.landmark
-            for k in key_face_points:
-                if 0 <= k < len(lms):
-                    lm = lms[k]
-                    xs.append(int(lm.x * w))
-                    ys.append(int(lm.y * h))
-
-        # الجسم (نقاط أساسية)
-        if res.pose_landmarks:
-            pose_ids = [0, 11, 12, 23, 24]  # رأس، كتفين، وركين
-            lms = res.pose_landmarks.landmark
-            for k in pose_ids:
-                if 0 <= k < len(lms):
-                    lm = lms[k]
-                    xs.append(int(lm.x * w))
-                    ys.append(int(lm.y * h))
-
-        if not xs:
-            logger.warning("⚠️ لم يُكتشف إنسان - استخدام crop مركزي")
-            # ✅ fallback: قص مركزي بدلاً من الصورة الكاملة
-            center_x, center_y = w // 2, h // 2
-            crop_size = min(w, h) * 3 // 4
-            x1 = max(0, center_x - crop_size // 2)
-            y1 = max(0, center_y - crop_size // 2)
-            x2 = min(w, x1 + crop_size)
-            y2 = min(h, y1 + crop_size)
-            crop = bgr[y1:y2, x1:x2]
-            rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
-            return Image.fromarray(rgb)
-
-        x1, x2 = max(0, min(xs) - pad), min(w, max(xs) + pad)
-        y1, y2 = max(0, min(ys) - pad), min(h, max(ys) + pad)
-        
-        if x2 <= x1 or y2 <= y1:
-            logger.warning("⚠️ صندوق غير صالح")
-            return img_pil
-
-        crop = bgr[y1:y2, x1:x2]
-        rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
-        return Image.fromarray(rgb)
-        
-    except Exception as e:
-        logger.error(f"❌ خطأ في القص: {e}")
-        # fallback آمن
-        return img_pil.resize((IMG_SIZE, IMG_SIZE))
-
-def _apply_optional_normalize(x: np.ndarray) -> np.ndarray:
-    """
-    يطبّق Normalize (اختياري) إذا تم تعريفه في الميتاداتا
-    - x شكلها (1,1,H,W) وقيمها [0..1]
-    """
-    if NORM_MEAN and NORM_STD and len(NORM_MEAN) >= 1 and len(NORM_STD) >= 1:
-        mean = float(NORM_MEAN[0])
-        std = float(NORM_STD[0]) if float(NORM_STD[0]) != 0 else 1.0
-        x = (x - mean) / std
-    return x
-
-def preprocess_pil(img_pil: Image.Image, enhance: bool = True) -> np.ndarray:
-    """
-    pipeline معالجة محسّن
-    """
-    # 1. قص
-    img_pil = crop_holistic_union_pil(img_pil, pad=20)
-
-    # 2. ✅ تحسين الصورة (اختياري)
-    if enhance:
-        from PIL import ImageEnhance
-        # زيادة التباين قليلاً
-        enhancer = ImageEnhance.Contrast(img_pil)
-        img_pil = enhancer.enhance(1.2)
-        # ضبط السطوع
-        enhancer = ImageEnhance.Brightness(img_pil)
-        img_pil = enhancer.enhance(1.1)
-
-    # 3. رمادي + تغيير الحجم
-    img_pil = img_pil.convert("L").resize((IMG_SIZE, IMG_SIZE), Image.LANCZOS)
-
-    # 4. إلى مصفوفة
-    x = np.array(img_pil, dtype=np.float32) / 255.0
-
-    # 5. ✅ Histogram Equalization (اختياري للإضاءة السيئة)
-    # x = cv2.equalizeHist((x * 255).astype(np.uint8)) / 255.0
-
-    # 6. Normalize من الميتاداتا
-    x = _apply_optional_normalize(x)
-
-    # 7. إعادة تشكيل
-    x = x[None, None, :, :]
-    return x
-
-def _softmax(z: np.ndarray) -> np.ndarray:
-    z = z - np.max(z)
-    ez = np.exp(z)
-    return ez / np.sum(ez)
-
-def predict_word_from_pil(img_pil: Image.Image, top_k: int = 5) -> Tuple[str, float, List[Tuple[str, float]]]:
-    """
-    تنبؤ من PIL.Image
-    يرجّع: (label, confidence, top_k_list)
-    """
-    # تحضير الإدخال
-    x = preprocess_pil(img_pil)
-
-    # تشغيل النموذج
-    outputs = _session.run([_output_name], {_input_name: x})
-    logits = outputs[0][0]  # (num_classes,)
-
-    probs = _softmax(logits)
-    top_idx = int(np.argmax(probs))
-    top_label = CLASSES[top_idx]
-    top_conf = float(probs[top_idx])
-
-    # أعلى k
-    k = int(max(1, min(top_k, len(CLASSES))))
-    top_k_indices = np.argsort(probs)[-k:][::-1]
-    top_k_list = [(CLASSES[i], float(probs[i])) for i in top_k_indices]
-
-    # إذا عندنا mapping في الميتاداتا، نقدر نرفق التسمية العربية المقابلة
-    if LABEL_MAPPING and top_label in LABEL_MAPPING:
-        mapped = LABEL_MAPPING[top_label]
-        top_label = f"{top_label} | {mapped}"
-
-        # نطبّق نفس الشيء على top_k_list
-        new_top = []
-        for k_lbl, k_p in top_k_list:
-            if k_lbl in LABEL_MAPPING:
-                new_top.append((f"{k_lbl} | {LABEL_MAPPING[k_lbl]}", k_p))
-            else:
-                new_top.append((k_lbl, k_p))
-        top_k_list = new_top
-
-    return top_label, top_conf, top_k_list
-
-def check_image_quality(img_pil: Image.Image) -> bool:
-    """
-    فحص جودة الصورة قبل المعالجة
-    """
-    w, h = img_pil.size
-    
-    # 1. حجم أدنى
-    if w < 100 or h < 100:
-        logger.warning(f"⚠️ الصورة صغيرة جداً: {w}x{h}")
-        return False
-    
-    # 2. فحص الضبابية (Laplacian variance)
-    gray = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2GRAY)
-    laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-    
-    if laplacian_var < 50:  # عتبة تجريبية
-        logger.warning(f"⚠️ الصورة ضبابية: variance={laplacian_var:.2f}")
-        return False
-    
-    return True
-
-def predict_word(image: Union[str, Path, Image.Image], top_k: int = 5) -> Tuple[str, float, List[Tuple[str, float]]]:
-    """
-    تنبؤ مع فحص الجودة
-    """
-    if isinstance(image, (str, Path)):
-        img_pil = Image.open(image).convert("RGB")
-    elif isinstance(image, Image.Image):
-        img_pil = image
-    else:
-        raise TypeError("image يجب أن يكون مساراً أو PIL.Image")
-    
-    # ✅ فحص الجودة
-    if not check_image_quality(img_pil):
-        logger.warning("⚠️ جودة الصورة منخفضة - النتيجة قد لا تكون دقيقة")
-    
-    return predict_word_from_pil(img_pil, top_k=top_k)
-
-def predict_word_with_tta(
-    img_pil: Image.Image, 
-    top_k: int = 5,
-    use_tta: bool = False
-) -> Tuple[str, float, List[Tuple[str, float]]]:
-    """
-    تنبؤ مع TTA (اختياري)
-    """
-    if not use_tta:
-        return predict_word_from_pil(img_pil, top_k)
-    
-    # ✅ Test Time Augmentation
-    predictions = []
-    
-    # 1. الأصلية
-    predictions.append(predict_word_from_pil(img_pil, top_k))
-    
-    # 2. انعكاس أفقي
-    flipped = img_pil.transpose(Image.FLIP_LEFT_RIGHT)
-    predictions.append(predict_word_from_pil(flipped, top_k))
-    
-    # 3. دوران طفيف
-    for angle in [-5, 5]:
-        rotated = img_pil.rotate(angle, fillcolor='white')
-        predictions.append(predict_word_from_pil(rotated, top_k))
-    
-    # ✅ دمج النتائج (voting)
-    label_votes = {}
-    for label, conf, _ in predictions:
-        label_votes[label] = label_votes.get(label, 0) + conf
-    
-    # أعلى تصويت
-    best_label = max(label_votes, key=label_votes.get)
-    avg_conf = label_votes[best_label] / len(predictions)
-    
-    # إعادة الـ top_k
-    sorted_labels = sorted(label_votes.items(), key=lambda x: x[1], reverse=True)[:top_k]
-    top_k_list = [(lbl, conf / len(predictions)) for lbl, conf in sorted_labels]
-    
-    return best_label, avg_conf, top_k_list
-
-# اختياري: دالة بسيطة تُرجع نصاً فقط (للتوافق مع بعض الواجهات)
-def dummy_extract_text(image: Union[str, Path, Image.Image]) -> str:
-    try:
-        label, conf, _ = predict_word(image, top_k=5)
-        return f"{label} ({conf:.2f})"
-    except Exception as e:
-        return f"prediction_failed: {e}"
+# Model_Word.py
+"""
+تنبؤ كلمات (89 صنف) باستخدام ONNX Runtime + MediaPipe Holistic
+- النموذج: Mubser_model_89cls_64.onnx
+- الميتاداتا: Mubser_model_89cls_64.meta.json
+- إدخال: صورة واحدة (PIL.Image أو مسار)
+- إخراج: (label, confidence, top_k_list)
+"""
+
+from typing import Tuple, List, Optional, Union
+from pathlib import Path
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+import cv2
+import mediapipe as mp
+
+from . import metrics
+from .cache import prediction_cache
+from .image_io import open_rgb
+from .pipeline import (
+    Frame,
+    OnnxClassifier,
+    RESIZERS,
+    center_box,
+    downscale,
+    format_prediction,
+    register_box,
+    register_detector,
+    register_predictor,
+    softmax,
+    top_k_indices,
+)
+from .registry import MODEL_DIR, registry
+
+# ================= إعداد السجلات =================
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Model_Word")
+
+# ================= إعداد المسارات =================
+MODEL_PATH = MODEL_DIR / "Mubser_model_89cls_64.onnx"
+META_PATH  = MODEL_DIR / "Mubser_model_89cls_64.meta.json"
+
+mp_holistic = mp.solutions.holistic
+
+# أقصى ضلع للإطار قبل Holistic (الكشف والقص من نفس النسخة المصغّرة)
+HOLISTIC_MAX_SIZE = 640
+
+class WordModel(OnnxClassifier):
+    """
+    الميتاداتا + جلسة ONNX + مُجمِّع الدفعات لنموذج الكلمات
+    - يُنشأ مرة واحدة عند أول استخدام عبر registry.get("words")
+    """
+
+    name = "words"
+    batcher_name = "word"
+    default_pipeline = {
+        "detector": "holistic",
+        "box": "union",
+        "pad": 20,
+        "max_size": HOLISTIC_MAX_SIZE,
+        "detect_size": HOLISTIC_MAX_SIZE,
+        "enhance": True,
+        "resize": "area",
+        "fallback": "center",
+    }
+
+    def __init__(self, model_path: Path = MODEL_PATH, meta_path: Path = META_PATH):
+        super().__init__(model_path, meta_path)
+
+def _new_static_holistic():
+    """رسم Holistic بوضع ثابت - غير آمن للخيوط، لذلك يُعار من مجمّع السجل"""
+    return mp_holistic.Holistic(
+        static_image_mode=True,
+        model_complexity=1,
+        refine_face_landmarks=False,
+        min_detection_confidence=0.6
+    )
+
+def _warmup(model: WordModel):
+    model.batcher.submit(np.zeros((1, 1, model.img_size, model.img_size), dtype=np.float32))
+
+registry.register("words", WordModel, detector_factory=_new_static_holistic, warmup=_warmup)
+
+def _model() -> WordModel:
+    return registry.get("words")
+
+# توافق مع الكود القديم: Model_Word.CLASSES ... تُحمّل النموذج عند أول وصول
+_COMPAT_ATTRS = {
+    "CLASSES": "classes",
+    "IMG_SIZE": "img_size",
+    "NORM_MEAN": "norm_mean",
+    "NORM_STD": "norm_std",
+    "LABEL_MAPPING": "label_mapping",
+}
+
+def __getattr__(name: str):
+    if name in _COMPAT_ATTRS:
+        return getattr(_model(), _COMPAT_ATTRS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def new_tracking_holistic():
+    """
+    رسم Holistic بوضع التتبع (static_image_mode=False) لجلسات البث
+    - يتخطى الكشف الكامل في الإطارات التالية ما دام التتبع ناجحاً
+    - ملك لجلسة واحدة فقط (لا يُشارَك بين الجلسات)، وعلى المستدعي إغلاقه
+    """
+    return mp_holistic.Holistic(
+        static_image_mode=False,
+        model_complexity=1,
+        refine_face_landmarks=False,
+        min_detection_confidence=0.6,
+        min_tracking_confidence=0.5
+    )
+
+def batch_stats() -> Optional[dict]:
+    """مقاييس مُجمِّع الدفعات لنموذج الكلمات (None إذا لم يُحمَّل بعد)"""
+    entry = registry.entry("words")
+    return entry.get().batcher.stats() if entry.loaded else None
+
+# =====================================================
+#                وظائف المعالجة/التنبؤ
+# =====================================================
+
+# نقاط الوجه/الجسم المستخدمة في صندوق القص
+_FACE_POINTS = (10, 152, 234, 454, 1)
+_POSE_POINTS = (0, 11, 12, 23, 24)  # رأس، كتفين، وركين
+
+def _downscale_for_detection(rgb: np.ndarray, max_size: int) -> np.ndarray:
+    """تصغير الإطار أولاً لتسريع MediaPipe (والقص يتم من النسخة المصغّرة كما في السابق)"""
+    return downscale(rgb, max_size)
+
+# fallback: قص مركزي بدلاً من الصورة الكاملة
+_center_box = center_box
+
+def detect_holistic(rgb: np.ndarray, holistic=None):
+    """
+    تشغيل Holistic على إطار RGB (H,W,3)
+    - holistic: رسم خاص بجلسة (وضع التتبع)، وإلا يُستعار رسم ثابت من مجمّع السجل
+    """
+    if holistic is not None:
+        return holistic.process(rgb)
+    with registry.detector("words") as det:
+        return det.process(rgb)
+
+@register_detector("holistic")
+def _detect_holistic_frame(frame: Frame):
+    """كاشف الإطار المشترك (detect_size لنموذج الكلمات ، أو HOLISTIC_MAX_SIZE قبل تحميله)"""
+    entry = registry.entry("words")
+    size = entry.get().config.detection_size if entry.loaded else HOLISTIC_MAX_SIZE
+    return detect_holistic(frame.resized(size))
+
+def crop_box_array(rgb: np.ndarray, pad: int = 20, holistic=None) -> Tuple[int, int, int, int]:
+    """
+    صندوق واحد يضم اليدين + الوجه + الجسم في إطار RGB (H,W,3)
+    - holistic: رسم خاص بجلسة (وضع التتبع)، وإلا يُستعار رسم ثابت من مجمّع السجل
+    - بدون إنسان: قص مركزي ، صندوق غير صالح: الإطار كاملاً
+    """
+    h, w = rgb.shape[:2]
+    return union_box(detect_holistic(rgb, holistic), w, h, pad)
+
+@register_box("union")
+def union_box(res, w: int, h: int, pad: int = 20) -> Tuple[int, int, int, int]:
+    """صندوق القص من نتيجة Holistic جاهزة"""
+    xs, ys = [], []
+
+    # اليدان
+    for hand_lms in [res.left_hand_landmarks, res.right_hand_landmarks]:
+        if hand_lms:
+            for lm in hand_lms.landmark:
+                xs.append(int(lm.x * w))
+                ys.append(int(lm.y * h))
+
+    # الوجه (نقاط مفتاحية محددة فقط) + الجسم (نقاط أساسية)
+    for lms_obj, ids in ((res.face_landmarks, _FACE_POINTS), (res.pose_landmarks, _POSE_POINTS)):
+        if lms_obj:
+            lms = lms_obj.landmark
+            for k in ids:
+                if 0 <= k < len(lms):
+                    xs.append(int(lms[k].x * w))
+                    ys.append(int(lms[k].y * h))
+
+    if not xs:
+        logger.warning("⚠️ لم يُكتشف إنسان - استخدام crop مركزي")
+        return _center_box(w, h)
+
+    x1, x2 = max(0, min(xs) - pad), min(w, max(xs) + pad)
+    y1, y2 = max(0, min(ys) - pad), min(h, max(ys) + pad)
+    if x2 <= x1 or y2 <= y1:
+        logger.warning("⚠️ صندوق غير صالح")
+        return 0, 0, w, h
+    return x1, y1, x2, y2
+
+def crop_holistic_union_pil(img_pil: Image.Image, pad: int = 20, max_size: int = 640, holistic=None) -> Image.Image:
+    """
+    يقصّ مستطيلاً واحدًا يضم اليدين + الوجه + الجسم (واجهة PIL للتوافق)
+    - holistic: رسم خاص بجلسة (وضع التتبع)، وإلا يُستعار رسم ثابت من مجمّع السجل
+    """
+    rgb = np.asarray(img_pil if img_pil.mode == "RGB" else img_pil.convert("RGB"))
+    rgb = _downscale_for_detection(rgb, max_size)
+    try:
+        x1, y1, x2, y2 = crop_box_array(rgb, pad=pad, holistic=holistic)
+        return Image.fromarray(rgb[y1:y2, x1:x2])
+    except Exception as e:
+        logger.error(f"❌ خطأ في القص: {e}")
+        # fallback آمن
+        size = _model().img_size
+        return Image.fromarray(rgb).resize((size, size))
+
+# تحسين الصورة: تباين 1.2 ثم سطوع 1.1 (نفس ImageEnhance) كجدول LUT واحد
+ENHANCE_CONTRAST = 1.2
+ENHANCE_BRIGHTNESS = 1.1
+_LEVELS = np.arange(256, dtype=np.float32)
+
+def _enhance_lut(mean: int) -> np.ndarray:
+    """
+    ImageEnhance.Contrast: mean + f*(v-mean) ، Brightness: f*v
+    كل مرحلة تُقص إلى [0..255] وتُقتطع كما في PIL
+    """
+    v = np.clip(mean + ENHANCE_CONTRAST * (_LEVELS - mean), 0, 255).astype(np.uint8)
+    return np.clip(ENHANCE_BRIGHTNESS * v, 0, 255).astype(np.uint8)
+
+_buffers = threading.local()
+
+def _resize_buffer(size: int) -> np.ndarray:
+    """مخزن uint8 بحجم الإدخال لكل خيط (يُعاد استخدامه بين الطلبات)"""
+    buf = getattr(_buffers, "resized", None)
+    if buf is None or buf.shape != (size, size):
+        buf = _buffers.resized = np.empty((size, size), dtype=np.uint8)
+    return buf
+
+def _apply_optional_normalize(x: np.ndarray) -> np.ndarray:
+    """
+    يطبّق Normalize (اختياري) إذا تم تعريفه في الميتاداتا - في نفس المصفوفة
+    - x شكلها (N,...,H,W) وقيمها [0..1]
+    """
+    return _model().normalize(x)
+
+# نسخ TTA: الأصلية + انعكاس أفقي + دوران طفيف (تُطبَّق على القصّة الرمادية)
+TTA_ANGLES = (-5, 5)
+TTA_VIEWS = 2 + len(TTA_ANGLES)
+
+def tta_views(gray: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    يبني نسخ TTA من قصّة رمادية واحدة (H,W) بقيم [0..1]
+    يرجّع: (TTA_VIEWS,H,W) - أو يكتب في out إن مُرِّر
+    """
+    h, w = gray.shape
+    views = np.empty((TTA_VIEWS, h, w), dtype=np.float32) if out is None else out
+    if not np.shares_memory(views[0], gray):
+        views[0] = gray
+    views[1] = gray[:, ::-1]
+    for i, angle in enumerate(TTA_ANGLES, start=2):
+        # نفس اتجاه PIL.rotate (عكس عقارب الساعة) مع تعبئة بيضاء
+        m = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, 1.0)
+        cv2.warpAffine(gray, m, (w, h), dst=views[i], flags=cv2.INTER_LINEAR, borderValue=1.0)
+    return views
+
+def preprocess_array(
+    rgb: np.ndarray,
+    enhance: Optional[bool] = None,
+    tta: bool = False,
+    holistic=None,
+    box: Optional[Tuple[int, int, int, int]] = None,
+    max_size: int = 640,
+) -> np.ndarray:
+    """
+    pipeline معالجة على ndarray مباشرة (بدون تنقل PIL ↔ cv2)
+    - rgb: إطار (H,W,3) uint8
+    - box: صندوق جاهز (على الإطار المصغّر) لتخطي الكشف
+    - tta=True: قص واحد ثم نسخ TTA كدفعة (TTA_VIEWS,1,H,W)
+    - enhance=None: حسب إعدادات pipeline في الميتاداتا
+    """
+    model = _model()
+    size = model.img_size
+    if enhance is None:
+        enhance = model.config.enhance
+
+    # 1. كشف + قص (view بدون نسخ)
+    rgb = _downscale_for_detection(rgb, max_size)
+    try:
+        x1, y1, x2, y2 = box if box is not None else crop_box_array(rgb, pad=20, holistic=holistic)
+    except Exception as e:
+        logger.error(f"❌ خطأ في القص: {e}")
+        x1, y1, x2, y2 = 0, 0, rgb.shape[1], rgb.shape[0]
+    crop = rgb[y1:y2, x1:x2]
+
+    # 2. تحويل لوني واحد: RGB → رمادي
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+
+    # 3. ✅ تحسين الصورة (اختياري): تباين + سطوع كـ LUT واحد
+    if enhance:
+        with metrics.stage("enhance"):
+            cv2.LUT(gray, _enhance_lut(int(gray.mean() + 0.5)), dst=gray)
+
+    # 4. تغيير الحجم إلى مخزن مسبق الحجز
+    with metrics.stage("resize"):
+        resized = RESIZERS[model.config.resize](gray, size, dst=_resize_buffer(size))
+
+    # 5. إلى float32 في مصفوفة الإخراج مباشرة (V,1,H,W)
+    x = np.empty((TTA_VIEWS if tta else 1, 1, size, size), dtype=np.float32)
+    np.multiply(resized, np.float32(1.0 / 255.0), out=x[0, 0])
+
+    # 6. نسخ TTA (اختياري)
+    if tta:
+        tta_views(x[0, 0], out=x[:, 0])
+
+    # 7. Normalize من الميتاداتا (في نفس المصفوفة)
+    return _apply_optional_normalize(x)
+
+def preprocess_frame(frame: Frame, tta: bool = False, enhance: Optional[bool] = None) -> np.ndarray:
+    """نفس preprocess_array على إطار مشترك (نتيجة Holistic محسوبة مرة واحدة لكل النماذج)"""
+    config = _model().config
+    rgb, box = frame.locate(config)
+    return preprocess_array(rgb, enhance=enhance, tta=tta, box=box, max_size=config.max_size)
+
+def preprocess_pil(img_pil: Image.Image, enhance: Optional[bool] = None, tta: bool = False, holistic=None) -> np.ndarray:
+    """
+    pipeline معالجة محسّن (واجهة PIL)
+    - tta=True: قص واحد ثم نسخ TTA كدفعة (TTA_VIEWS,1,H,W)
+    - holistic: رسم التتبع الخاص بجلسة بث (وإلا الكشف عبر Frame وكاش النقاط)
+    """
+    if holistic is None:
+        return preprocess_frame(Frame(img_pil), tta=tta, enhance=enhance)
+    rgb = np.asarray(img_pil if img_pil.mode == "RGB" else img_pil.convert("RGB"))
+    return preprocess_array(rgb, enhance=enhance, tta=tta, holistic=holistic)
+
+# مشتركة مع نموذج الحروف (pipeline.py) - الأسماء القديمة للتوافق
+_softmax = softmax
+_top_k_indices = top_k_indices
+
+def _format_prediction(probs: np.ndarray, top_indices: np.ndarray, model=None) -> Tuple[str, float, List[Tuple[str, float]]]:
+    """model: أي كائن فيه classes + label_mapping (نموذج الكلمات افتراضياً)"""
+    model = model or _model()
+    return format_prediction(probs, top_indices, model.classes, model.label_mapping)
+
+def classify_word_batch(x: np.ndarray, top_k: int = 5, views: int = 1) -> List[Tuple[str, float, List[Tuple[str, float]]]]:
+    """
+    تصنيف دفعة جاهزة بشكل (N*views,1,H,W) في استدعاء session.run واحد
+    - views > 1: كل صورة ممثلة بعدة نسخ متتالية (TTA) ويُؤخذ متوسط الاحتمالات
+    يرجّع قائمة (label, confidence, top_k_list) لكل صورة
+    """
+    return _model().classify(x, top_k=top_k, views=views)
+
+def _classify_probs(x: np.ndarray, views: int = 1) -> np.ndarray:
+    """احتمالات (N,C) لدفعة (N*views,1,H,W) - متوسط النسخ عند views > 1"""
+    return _model().probs(x, views=views)
+
+def _format_top_k(probs: np.ndarray, top_k: int) -> Tuple[str, float, List[Tuple[str, float]]]:
+    return _model().format_top_k(probs[None, :], top_k)[0]
+
+def predict_word_from_pil(img_pil: Image.Image, top_k: int = 5, holistic=None) -> Tuple[str, float, List[Tuple[str, float]]]:
+    """
+    تنبؤ من PIL.Image
+    يرجّع: (label, confidence, top_k_list)
+    """
+    # رسم التتبع له حالة خاصة بالجلسة، فلا نمرّ بالكاش
+    if holistic is not None:
+        return classify_word_batch(preprocess_pil(img_pil, holistic=holistic), top_k=top_k)[0]
+    return predict_word_frame(Frame(img_pil), top_k=top_k)
+
+@register_predictor("words")
+def predict_word_frame(frame: Frame, top_k: int = 5) -> Tuple[str, float, List[Tuple[str, float]]]:
+    """تنبؤ على إطار مشترك (نفس مفتاح الكاش لـ predict_word_from_pil)"""
+    def compute():
+        # تحضير الإدخال ثم تشغيل النموذج (عبر مُجمِّع الدفعات)
+        return classify_word_batch(preprocess_frame(frame), top_k=top_k)[0]
+
+    if frame.image is None:
+        return compute()
+    return prediction_cache.get_or_compute(frame.image, _model().model_id, (top_k, False, True), compute, frame.key)
+
+def check_image_quality(img_pil: Image.Image) -> bool:
+    """
+    فحص جودة الصورة قبل المعالجة
+    """
+    with metrics.stage("quality"):
+        return _check_image_quality(img_pil)
+
+def _check_image_quality(img_pil: Image.Image) -> bool:
+    w, h = img_pil.size
+    
+    # 1. حجم أدنى
+    if w < 100 or h < 100:
+        logger.warning(f"⚠️ الصورة صغيرة جداً: {w}x{h}")
+        return False
+    
+    # 2. فحص الضبابية (Laplacian variance)
+    gray = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2GRAY)
+    laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+    
+    if laplacian_var < 50:  # عتبة تجريبية
+        logger.warning(f"⚠️ الصورة ضبابية: variance={laplacian_var:.2f}")
+        return False
+    
+    return True
+
+def predict_word(image: Union[str, Path, Image.Image], top_k: int = 5) -> Tuple[str, float, List[Tuple[str, float]]]:
+    """
+    تنبؤ مع فحص الجودة
+    """
+    if isinstance(image, (str, Path)):
+        img_pil = open_rgb(image)
+    elif isinstance(image, Image.Image):
+        img_pil = image
+    else:
+        raise TypeError("image يجب أن يكون مساراً أو PIL.Image")
+    
+    # ✅ فحص الجودة
+    if not check_image_quality(img_pil):
+        logger.warning("⚠️ جودة الصورة منخفضة - النتيجة قد لا تكون دقيقة")
+    
+    return predict_word_from_pil(img_pil, top_k=top_k)
+
+def predict_word_with_tta(
+    img_pil: Image.Image, 
+    top_k: int = 5,
+    use_tta: bool = False
+) -> Tuple[str, float, List[Tuple[str, float]]]:
+    """
+    تنبؤ مع TTA (اختياري)
+    """
+    if not use_tta:
+        return predict_word_from_pil(img_pil, top_k)
+    
+    # الإطار خارج compute: نفس hash البكسلات لمفتاح الكاش وكاش النقاط
+    frame = Frame(img_pil)
+
+    def compute():
+        # ✅ Test Time Augmentation: كشف وقص مرة واحدة، ثم كل النسخ في استدعاء واحد
+        x = preprocess_frame(frame, tta=True)
+
+        # ✅ دمج النتائج (متوسط متجهات الاحتمالات كاملة)
+        return classify_word_batch(x, top_k=top_k, views=TTA_VIEWS)[0]
+
+    return prediction_cache.get_or_compute(img_pil, _model().model_id, (top_k, True, True), compute, frame.key)
+
+# =====================================================
+#      الاستدلال المتدرج: مرحلة رخيصة أولاً، والمكلفة عند الشك فقط
+# =====================================================
+
+# الهامش = p(الأول) - p(الثاني) ؛ إذا تجاوز العتبة نرجّع النتيجة فوراً
+CASCADE_FAST_MARGIN = float(os.getenv("MUBSER_CASCADE_FAST_MARGIN", "0.5"))
+CASCADE_CROP_MARGIN = float(os.getenv("MUBSER_CASCADE_CROP_MARGIN", "0.3"))
+CASCADE_STAGES = ("fast", "crop", "tta")
+
+class CascadeStats:
+    """
+    عدد الطلبات التي أجابت عنها كل مرحلة + نسبة التصعيد
+    - نتائج الكاش تُحسب بمرحلتها الأصلية ، والزمن المتوسط من الحساب الفعلي فقط
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._answered = {stage: 0 for stage in CASCADE_STAGES}
+        self._computed = {stage: 0 for stage in CASCADE_STAGES}
+        self._ms = {stage: 0.0 for stage in CASCADE_STAGES}
+        self._cached = 0
+
+    def record(self, stage: str, elapsed_ms: float, cached: bool = False):
+        with self._lock:
+            self._answered[stage] += 1
+            if cached:
+                self._cached += 1
+            else:
+                self._computed[stage] += 1
+                self._ms[stage] += elapsed_ms
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self._answered.values())
+            return {
+                "requests": total,
+                "cached": self._cached,
+                "thresholds": {"fast": CASCADE_FAST_MARGIN, "crop": CASCADE_CROP_MARGIN},
+                "answered": dict(self._answered),
+                "answered_ratio": {s: (n / total if total else 0.0) for s, n in self._answered.items()},
+                # نسبة الطلبات التي احتاجت مرحلة بعد "fast"
+                "escalation_rate": (1.0 - self._answered["fast"] / total) if total else 0.0,
+                "tta_rate": (self._answered["tta"] / total) if total else 0.0,
+                "latency_ms_mean": {
+                    s: (self._ms[s] / n if n else 0.0) for s, n in self._computed.items()
+                },
+            }
+
+cascade_stats = CascadeStats()
+
+def _margin(probs: np.ndarray) -> float:
+    top2 = np.partition(probs, -2)[-2:] if probs.shape[-1] > 1 else np.array([0.0, probs[0]])
+    return float(top2[1] - top2[0])
+
+def predict_word_cascade(
+    img_pil: Image.Image,
+    top_k: int = 5,
+    fast_margin: float = CASCADE_FAST_MARGIN,
+    crop_margin: float = CASCADE_CROP_MARGIN,
+) -> Tuple[str, float, List[Tuple[str, float]], dict]:
+    """
+    1. fast: الإطار كاملاً (مصغّر) بدون MediaPipe
+    2. crop: قص Holistic (المسار العادي)
+    3. tta: نفس القصّة + 3 نسخ إضافية فقط (نسخة crop محسوبة مسبقاً)
+    يرجّع: (label, confidence, top_k_list, {"stage", "margin"})
+    """
+    frame = Frame(img_pil)
+    computed = []
+
+    def compute():
+        t0 = time.perf_counter()
+        config = _model().config
+        rgb = frame.resized(config.max_size)
+        h, w = rgb.shape[:2]
+
+        def done(stage: str, probs: np.ndarray, margin: float):
+            computed.append((time.perf_counter() - t0) * 1000.0)
+            return (*_format_top_k(probs, top_k), {"stage": stage, "margin": margin})
+
+        probs = _classify_probs(preprocess_array(rgb, box=(0, 0, w, h)))[0]
+        margin = _margin(probs)
+        if margin >= fast_margin:
+            return done("fast", probs, margin)
+
+        x = preprocess_frame(frame, tta=True)
+        probs = _classify_probs(x[:1])[0]
+        margin = _margin(probs)
+        if margin >= crop_margin:
+            return done("crop", probs, margin)
+
+        # متوسط النسخ الأربع = (احتمالات crop + مجموع النسخ الثلاث الإضافية) / 4
+        extra = _model().probs(x[1:])
+        probs = (probs + extra.sum(axis=0)) / TTA_VIEWS
+        return done("tta", probs, _margin(probs))
+
+    options = (top_k, "cascade", fast_margin, crop_margin)
+    result = prediction_cache.get_or_compute(img_pil, _model().model_id, options, compute, frame.key)
+    # بعد الكاش: الطلبات المجابة من الكاش تُحسب أيضاً (بمرحلة النتيجة المخزنة)
+    cascade_stats.record(result[3]["stage"], computed[0] if computed else 0.0, cached=not computed)
+    return result
+
+# اختياري: دالة بسيطة تُرجع نصاً فقط (للتوافق مع بعض الواجهات)
+def dummy_extract_text(image: Union[str, Path, Image.Image]) -> str:
+    try:
+        label, conf, _ = predict_word(image, top_k=5)
+        return f"{label} ({conf:.2f})"
+    except Exception as e:
+        return f"prediction_failed: {e}"
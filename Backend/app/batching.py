@@ -0,0 +1,147 @@
+"""
+مُجمِّع دفعات ديناميكي (micro-batching) أمام جلسات ONNX
+- يجمع الموترات المعالجة من الطلبات المتزامنة خلال نافذة انتظار قصيرة
+- يشغّلها في استدعاء session.run واحد ثم يوزّع الـ logits على كل طلب
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+import numpy as np
+
+# الإعدادات الافتراضية (قابلة للتغيير من البيئة)
+BATCH_MAX_SIZE = int(os.getenv("MUBSER_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("MUBSER_BATCH_MAX_WAIT_MS", "2.0"))
+
+
+class MicroBatcher:
+    """
+    يستقبل موترات بشكل (n,...) مثل (n,1,H,W) ويرجّع logits بشكل (n,C)
+    max_batch_size <= 1 يعطّل التجميع ويستدعي run_fn مباشرة
+    """
+
+    def __init__(
+        self,
+        run_fn: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS,
+        name: str = "model",
+    ):
+        self.run_fn = run_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._wait_max = 0.0
+        self._recent_waits = deque(maxlen=1024)
+        self._recent_fill = deque(maxlen=1024)
+
+        self._worker: Optional[threading.Thread] = None
+        if self.enabled:
+            self._worker = threading.Thread(
+                target=self._loop, name=f"batcher-{name}", daemon=True
+            )
+            self._worker.start()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch_size > 1
+
+    def submit(self, x: np.ndarray) -> np.ndarray:
+        """تشغيل موتر واحد (قد يحتوي عدة صفوف) وانتظار نتيجته"""
+        if not self.enabled:
+            logits = self.run_fn(x)
+            self._record(rows=x.shape[0], waits=[0.0])
+            return logits
+
+        fut: Future = Future()
+        self._queue.put((x, fut, time.perf_counter()))
+        return fut.result()
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            rows = first[0].shape[0]
+            deadline = time.perf_counter() + self.max_wait
+
+            # نجمع حتى نملأ الدفعة أو تنتهي نافذة الانتظار
+            while rows < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+                rows += item[0].shape[0]
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        waits = [started - enq for _, _, enq in batch]
+        try:
+            x = np.concatenate([b[0] for b in batch], axis=0) if len(batch) > 1 else batch[0][0]
+            logits = self.run_fn(x)
+        except Exception as e:
+            for _, fut, _ in batch:
+                fut.set_exception(e)
+            return
+
+        self._record(rows=x.shape[0], waits=waits)
+
+        offset = 0
+        for xb, fut, _ in batch:
+            n = xb.shape[0]
+            fut.set_result(logits[offset:offset + n])
+            offset += n
+
+    def _record(self, rows: int, waits):
+        with self._lock:
+            self._batches += 1
+            self._rows += rows
+            self._recent_fill.append(min(1.0, rows / self.max_batch_size))
+            for w in waits:
+                self._wait_max = max(self._wait_max, w)
+                self._recent_waits.append(w)
+
+    def stats(self) -> dict:
+        """مقاييس نسبة امتلاء الدفعات وزمن الانتظار في الطابور"""
+        with self._lock:
+            waits = np.array(self._recent_waits) * 1000.0
+            fill = np.array(self._recent_fill)
+            requests = len(self._recent_waits)
+            return {
+                "name": self.name,
+                "enabled": self.enabled,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self._batches,
+                "rows": self._rows,
+                "avg_batch_rows": (self._rows / self._batches) if self._batches else 0.0,
+                "fill_ratio_mean": float(fill.mean()) if fill.size else 0.0,
+                "queue_wait_ms_mean": float(waits.mean()) if requests else 0.0,
+                "queue_wait_ms_p95": float(np.percentile(waits, 95)) if requests else 0.0,
+                "queue_wait_ms_max": self._wait_max * 1000.0,
+                "queue_depth": self._queue.qsize(),
+            }
+
+    def close(self):
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker = None
@@ -0,0 +1,197 @@
+"""
+كاش نتائج التنبؤ للصور المكررة (LRU + TTL)
+- المفتاح: hash بكسلات الصورة بعد الفك + معرّف النموذج + الخيارات (top_k, tta, enhance)
+- طبقة اختيارية للصور شبه المكررة عبر perceptual hash (dHash 64 bit)
+  فهرس بالنطاقات: الـ 64 bit تُقسم إلى max_distance+1 نطاق، وأي hash على مسافة ≤ max_distance
+  يطابق نطاقاً واحداً على الأقل تماماً ، فالبحث في دلاء النطاقات بدل المرور على كل المدخلات
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from PIL import Image
+
+CACHE_MAX_ENTRIES = int(os.getenv("MUBSER_CACHE_MAX_ENTRIES", "2048"))
+CACHE_TTL_SECONDS = float(os.getenv("MUBSER_CACHE_TTL_SECONDS", "300"))
+CACHE_PHASH = os.getenv("MUBSER_CACHE_PHASH", "0") == "1"
+CACHE_PHASH_MAX_DISTANCE = int(os.getenv("MUBSER_CACHE_PHASH_MAX_DISTANCE", "4"))
+
+
+def pixel_hash(img: Image.Image) -> str:
+    """hash لمحتوى البكسلات (وليس بايتات الملف) مع الأبعاد والنمط"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{img.mode}:{img.size[0]}x{img.size[1]}:".encode())
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+def perceptual_hash(img: Image.Image) -> int:
+    """dHash: مقارنة السطوع بين البكسلات المتجاورة في نسخة 9x8 رمادية"""
+    small = img.convert("L").resize((9, 8), Image.BILINEAR)
+    px = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = px[row * 9 + col]
+            right = px[row * 9 + col + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+    return bits
+
+
+def phash_bands(count: int) -> List[Tuple[int, int]]:
+    """تقسيم 64 bit إلى count نطاقاً متقارباً: [(shift, mask)]"""
+    count = max(1, min(count, 64))
+    bands, start = [], 0
+    for i in range(count):
+        width = (64 - start) // (count - i)
+        bands.append((start, (1 << width) - 1))
+        start += width
+    return bands
+
+
+class PredictionCache:
+    """
+    كاش محدود الحجم وآمن للخيوط
+    - get_or_compute(): يرجّع النتيجة المخزنة أو يحسبها ويخزنها
+    - invalidate(): يُستدعى عند إعادة تحميل نموذج
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        use_phash: bool = CACHE_PHASH,
+        phash_max_distance: int = CACHE_PHASH_MAX_DISTANCE,
+    ):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl_seconds
+        self.use_phash = use_phash
+        self.phash_max_distance = phash_max_distance
+        self._bands = phash_bands(min(phash_max_distance, 63) + 1)
+
+        # key -> (expires_at, phash, value)
+        self._entries: "OrderedDict[Tuple, Tuple[float, Optional[int], Any]]" = OrderedDict()
+        # (scope, رقم النطاق, قيمة النطاق) -> مفاتيح المدخلات
+        self._buckets: Dict[Tuple, Set[Tuple]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _bucket_keys(self, scope: Tuple, phash: int):
+        for i, (shift, mask) in enumerate(self._bands):
+            yield (scope, i, (phash >> shift) & mask)
+
+    def _remove(self, key: Tuple):
+        """حذف مدخل من القاموس ومن دلاء النطاقات (مع القفل)"""
+        _, phash, _ = self._entries.pop(key)
+        if phash is None:
+            return
+        for bucket_key in self._bucket_keys(key[1:], phash):
+            bucket = self._buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[bucket_key]
+
+    def _lookup(self, key: Tuple, scope: Tuple, phash: Optional[int]) -> Tuple[bool, Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[2]
+                self._remove(key)
+
+            if phash is not None:
+                # المرشّحون من الدلاء فقط ؛ الأقرب مسافةً يفوز
+                best, best_distance = None, self.phash_max_distance + 1
+                for bucket_key in self._bucket_keys(scope, phash):
+                    for other_key in self._buckets.get(bucket_key, ()):
+                        expires, other_phash, _ = self._entries[other_key]
+                        distance = bin(phash ^ other_phash).count("1")
+                        if expires > now and distance < best_distance:
+                            best, best_distance = other_key, distance
+                if best is not None:
+                    self._entries.move_to_end(best)
+                    self.near_hits += 1
+                    return True, self._entries[best][2]
+
+            self.misses += 1
+            return False, None
+
+    def _store(self, key: Tuple, phash: Optional[int], value: Any):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, phash, value)
+            if phash is not None:
+                for bucket_key in self._bucket_keys(key[1:], phash):
+                    self._buckets.setdefault(bucket_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_compute(
+        self,
+        img: Image.Image,
+        model_id: str,
+        options: Hashable,
+        compute: Callable[[], Any],
+        digest: Optional[str] = None,
+    ) -> Any:
+        """digest: pixel_hash(img) محسوب مسبقاً (Frame.key) حتى لا يُعاد hash الإطار لكل نموذج"""
+        if not self.enabled:
+            return compute()
+
+        scope = (model_id, options)
+        key = (digest or pixel_hash(img),) + scope
+        phash = perceptual_hash(img) if self.use_phash else None
+
+        found, value = self._lookup(key, scope, phash)
+        if found:
+            return value
+
+        value = compute()
+        self._store(key, phash, value)
+        return value
+
+    def invalidate(self, model_id: Optional[str] = None):
+        """حذف كل النتائج (أو نتائج نموذج واحد فقط)"""
+        with self._lock:
+            if model_id is None:
+                self._entries.clear()
+                self._buckets.clear()
+                return
+            for key in [k for k in self._entries if k[1] == model_id]:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "phash": self.use_phash,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": ((self.hits + self.near_hits) / lookups) if lookups else 0.0,
+            }
+
+
+# كاش مشترك لنموذجي الحروف والكلمات
+prediction_cache = PredictionCache()
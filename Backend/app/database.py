@@ -1,19 +1,177 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-
-# SQLite محلياً. إن احتجت ملفاً بمجلد المشروع:
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
-Base = declarative_base()
-
-# Dependency لتمرير Session لكل ريكوست
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+"""
+الاتصال بقاعدة البيانات
+- MUBSER_DATABASE_URL (أو DATABASE_URL): SQLite افتراضياً، أو Postgres/MySQL
+- مجمّع اتصالات قابل للضبط (الحجم، الزيادة، المهلة، إعادة التدوير)
+- SQLite: وضع WAL + pragmas (القرّاء لا ينتظرون الكاتب، والكتّاب ينتظرون بدل "database is locked")
+- مسار async (SQLAlchemy asyncio) للـ endpoints حتى لا تحجز الكتابة حلقة الأحداث
+"""
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event, insert, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
+
+# SQLite محلياً. إن احتجت ملفاً بمجلد المشروع:
+SQLALCHEMY_DATABASE_URL = os.getenv("MUBSER_DATABASE_URL") or os.getenv("DATABASE_URL") or "sqlite:///./app.db"
+# فارغ = نفس الرابط مع مشغّل async المناسب (aiosqlite / asyncpg / aiomysql)
+ASYNC_DATABASE_URL = os.getenv("MUBSER_ASYNC_DATABASE_URL", "")
+
+# فارغ = 5 (+10 زيادة) ، إلا المحرك async مع SQLite: اتصال واحد (الكاتب واحد على أي حال،
+# فالكتّاب يصطفون في المجمّع بالترتيب بدل التنافس على قفل الملف وانتظار busy_timeout)
+DB_POOL_SIZE = os.getenv("MUBSER_DB_POOL_SIZE", "")
+DB_MAX_OVERFLOW = os.getenv("MUBSER_DB_MAX_OVERFLOW", "")
+DB_POOL_TIMEOUT = float(os.getenv("MUBSER_DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("MUBSER_DB_POOL_RECYCLE", "1800"))
+DB_ECHO = os.getenv("MUBSER_DB_ECHO", "0") == "1"
+
+# pragmas لكل اتصال SQLite جديد
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("MUBSER_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("MUBSER_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("MUBSER_SQLITE_SYNCHRONOUS", "NORMAL"),  # آمن مع WAL وأسرع من FULL
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+    "cache_size": -20000,  # ~20MB (بالسالب = KiB)
+}
+
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def is_sqlite(url) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_memory(url) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:"
+
+
+def async_url(url) -> str:
+    """نفس الرابط بمشغّل async (postgresql+psycopg2 → postgresql+asyncpg ...)"""
+    url = make_url(url)
+    driver = _ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"لا يوجد مشغّل async معروف لـ {url.get_backend_name()} - حدّد MUBSER_ASYNC_DATABASE_URL")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def _engine_kwargs(url, single_sqlite_writer: bool = False) -> dict:
+    if is_sqlite(url):
+        kwargs = {"connect_args": {"check_same_thread": False}}
+        if _is_memory(url):
+            # قاعدة في الذاكرة = اتصال واحد مشترك (وإلا كل اتصال يرى قاعدة فارغة)
+            kwargs["poolclass"] = StaticPool
+        else:
+            kwargs.update(
+                pool_size=int(DB_POOL_SIZE or (1 if single_sqlite_writer else 5)),
+                max_overflow=int(DB_MAX_OVERFLOW or (0 if single_sqlite_writer else 10)),
+                pool_timeout=DB_POOL_TIMEOUT,
+            )
+        return kwargs
+    return {
+        "pool_size": int(DB_POOL_SIZE or 5),
+        "max_overflow": int(DB_MAX_OVERFLOW or 10),
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def make_engine(url=SQLALCHEMY_DATABASE_URL):
+    engine = create_engine(url, echo=DB_ECHO, **_engine_kwargs(url))
+    if is_sqlite(url):
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+def make_async_engine(url=None):
+    url = url or ASYNC_DATABASE_URL or async_url(SQLALCHEMY_DATABASE_URL)
+    engine = create_async_engine(url, echo=DB_ECHO, **_engine_kwargs(url, single_sqlite_writer=True))
+    if is_sqlite(url):
+        event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+def increment(conn, table, key: Dict[str, Any], deltas: Dict[str, int], defaults: Optional[Dict[str, Any]] = None):
+    """
+    عدّاد += delta في صف واحد (upsert بحسب المشغّل، وإلا UPDATE ثم INSERT)
+    defaults: أعمدة إضافية تُكتب فقط عند إنشاء الصف
+    """
+    dialect = conn.dialect.name
+    values = {**key, **deltas, **(defaults or {})}
+    increments = {name: table.c[name] + delta for name, delta in deltas.items()}
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table).values(**values)
+        conn.execute(stmt.on_conflict_do_update(index_elements=list(key), set_=increments))
+        return
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+
+        conn.execute(dialect_insert(table).values(**values).on_duplicate_key_update(**increments))
+        return
+    condition = [table.c[name] == value for name, value in key.items()]
+    if conn.execute(update(table).where(*condition).values(**increments)).rowcount == 0:
+        conn.execute(insert(table).values(**values))
+
+
+engine = make_engine()
+SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+Base = declarative_base()
+
+# المحرك async يُنشأ عند أول استخدام (المشغّل aiosqlite/asyncpg مطلوب فقط حينها)
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        _async_engine = make_async_engine()
+        _async_session_factory = async_sessionmaker(_async_engine, expire_on_commit=False, autoflush=False)
+    return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    get_async_engine()
+    return _async_session_factory()
+
+
+async def dispose_engines():
+    """إغلاق اتصالات المجمّعين عند إيقاف الخادم"""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    engine.dispose()
+
+# Dependency لتمرير Session لكل ريكوست
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# نفس الشيء للـ endpoints غير المتزامنة
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
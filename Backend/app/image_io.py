@@ -0,0 +1,136 @@
+"""
+فك الصور والتحقق منها من الذاكرة مباشرة (بدون المرور على القرص)
+- المدخل: bytes جسم الملف المرفوع ، أو نص Base64 / data URL من طلب JSON
+- المخرج: PIL.Image بصيغة RGB جاهزة للمتنبئات
+- JPEG كبير (صور الهاتف 12MP) يُفك مصغّراً بمقياس DCT بدل فك كل البكسلات ثم رميها في التصغير
+"""
+import binascii
+import os
+from io import BytesIO
+from typing import BinaryIO, Optional, Tuple, Union
+
+from PIL import Image
+
+from . import metrics
+
+# الحد الأقصى لحجم الملف المرفوع (بايت)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# الحد الأقصى للبكسلات (يُفحص من رأس الملف قبل فك البكسلات)
+MAX_IMAGE_PIXELS = int(os.getenv("MUBSER_MAX_IMAGE_PIXELS", str(40_000_000)))
+# أقصر ضلع مطلوب بعد فك JPEG المصغّر (DCT: 1/2 ، 1/4 ، 1/8) ؛ 0 = فك بالدقة الكاملة دائماً
+DECODE_MIN_SIDE = int(os.getenv("MUBSER_DECODE_MIN_SIDE", "1024"))
+# حروف Base64 لكل جزء (مضاعف 4 حتى لا تنقسم مجموعة)
+BASE64_CHUNK_CHARS = 64 * 1024
+
+_B64_WHITESPACE = str.maketrans("", "", " \t\r\n")
+
+
+class InvalidImageError(ValueError):
+    """الملف ليس صورة صالحة أو يتجاوز الحد المسموح"""
+
+
+def open_rgb(fp: Union[str, os.PathLike, BinaryIO], min_side: int = DECODE_MIN_SIDE) -> Image.Image:
+    """
+    فك صورة إلى RGB
+    - JPEG: draft() يختار أكبر مقياس DCT يُبقي أقصر ضلع ≥ min_side
+      (4032x3024 → 2016x1512) ؛ الإطارات العادية (أقصر ضلع < 2×min_side) تُفك كما هي
+    - الكاشف يعمل على نسخة أصغر (detect_size) والقص من هذا الإطار
+    - أبعاد الملف الأصلية (قبل draft) في info["source_size"] ، انظر source_size()
+    """
+    with Image.open(fp) as im:
+        size = im.size
+        if min_side and im.format == "JPEG" and min(size) >= 2 * min_side:
+            im.draft("RGB", (min_side, min_side))
+        img = im.convert("RGB")
+    img.info["source_size"] = size
+    return img
+
+
+def source_size(img: Image.Image) -> Tuple[int, int]:
+    """أبعاد الصورة كما في الملف (لا أبعاد الإطار المفكوك مصغّراً)"""
+    return img.info.get("source_size", img.size)
+
+
+def decode_image_bytes(data: Union[bytes, memoryview], min_side: int = DECODE_MIN_SIDE) -> Image.Image:
+    """
+    يتحقق من الصورة ويفكّها من الذاكرة
+    يرجّع: PIL.Image (RGB) محمّلة بالكامل (مصغّرة بمقياس DCT لـ JPEG كبير ، انظر open_rgb)
+    """
+    if not data:
+        raise InvalidImageError("ملف فارغ")
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise InvalidImageError("حجم الملف يتجاوز الحد المسموح")
+
+    try:
+        # verify() يستهلك الكائن، لذلك نعيد الفتح من نفس الذاكرة
+        with metrics.stage("verify"), Image.open(BytesIO(data)) as im:
+            size = im.size
+            im.verify()
+    except Exception as e:
+        raise InvalidImageError("ملف صورة غير صالح") from e
+    # الأبعاد من الرأس فقط: صورة مضغوطة صغيرة بأبعاد ضخمة لا تصل إلى الفك
+    if size[0] * size[1] > MAX_IMAGE_PIXELS:
+        raise InvalidImageError("أبعاد الصورة تتجاوز الحد المسموح")
+
+    try:
+        with metrics.stage("decode"):
+            return open_rgb(BytesIO(data), min_side)
+    except Exception as e:
+        raise InvalidImageError("ملف صورة غير صالح") from e
+
+
+def _base64_payload_offset(text: str) -> int:
+    """بداية Base64 بعد بادئة data URL (data:image/jpeg;base64,) إن وُجدت"""
+    if not text.startswith("data:"):
+        return 0
+    comma = text.find(",", 0, 256)
+    header = text[5:comma].lower() if comma != -1 else ""
+    if not header.endswith(";base64") or not header.startswith("image/"):
+        raise InvalidImageError("data URL يجب أن يكون image/*;base64")
+    return comma + 1
+
+
+def _decode_chunks(text: str, start: int) -> Optional[bytes]:
+    """None: جزء كامل لم يُفك إلى 3/4 طوله (مسافات أو أسطر تكسر حدود المجموعات)"""
+    parts = []
+    for i in range(start, len(text), BASE64_CHUNK_CHARS):
+        chunk = text[i:i + BASE64_CHUNK_CHARS]
+        try:
+            part = binascii.a2b_base64(chunk)
+        except binascii.Error:
+            return None
+        if len(chunk) == BASE64_CHUNK_CHARS and len(part) * 4 != len(chunk) * 3:
+            return None
+        parts.append(part)
+    return b"".join(parts)
+
+
+def decode_base64(text: str, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """
+    Base64 خام أو data URL → bytes
+    - الحجم بعد الفك يُحسب من طول النص ويُرفض قبل فك أي شيء
+    - الفك على أجزاء من النص نفسه (بدون نسخة مقصوصة أو encode للنص كاملاً) ثم join واحد
+    - نص مقسّم بأسطر (MIME) يمر بمسار أبطأ يحذف المسافات أولاً
+    """
+    start = _base64_payload_offset(text)
+    length = len(text) - start
+    if length <= 0:
+        raise InvalidImageError("ملف فارغ")
+    if length // 4 * 3 > max_bytes + 2:
+        raise InvalidImageError("حجم الملف يتجاوز الحد المسموح")
+
+    data = _decode_chunks(text, start)
+    if data is None:
+        data = _decode_chunks(text[start:].translate(_B64_WHITESPACE), 0)
+        if data is None:
+            raise InvalidImageError("Base64 غير صالح")
+    if len(data) > max_bytes:
+        raise InvalidImageError("حجم الملف يتجاوز الحد المسموح")
+    return data
+
+
+def decode_image_base64(text: str) -> Image.Image:
+    """نفس تحقق الرفع العادي (الحجم، الأبعاد، verify) لصورة Base64 / data URL"""
+    with metrics.stage("base64"):
+        data = decode_base64(text)
+    return decode_image_bytes(data)
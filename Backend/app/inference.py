@@ -1,174 +1,216 @@
-"""
-نموذج التنبؤ بلغة الإشارة العربية باستخدام ONNX Runtime و MediaPipe
-"""
-import json
-from pathlib import Path
-from typing import Tuple, Optional, List
-import logging
-
-import numpy as np
-from PIL import Image
-import cv2
-import mediapipe as mp
-import onnxruntime as ort
-
-# إعداد السجلات
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-
-class SignLanguagePredictor:
-    """
-    كلاس للتنبؤ بلغة الإشارة العربية من الصور
-    """
-    
-    def __init__(
-        self,
-        model_path: str = "Mubser_model.onnx",
-        metadata_path: str = "Mubser_model.meta.json",
-        providers: List[str] = None
-    ):
-        """
-        تهيئة المتنبئ
-        """
-        # تحميل الميتاداتا + المابنق
-        try:
-            with open(metadata_path, "r", encoding="utf-8") as f:
-                metadata = json.load(f)
-                self.classes = metadata["classes"]
-                self.img_size = metadata["img_size"]
-                self.mapping = metadata.get("mapping", {})  # ✅ هنا التحميل فقط
-            logger.info(f"✅ تم تحميل {len(self.classes)} صنف من الميتاداتا")
-        except Exception as e:
-            logger.error(f"❌ خطأ في تحميل الميتاداتا: {e}")
-            raise
-        
-        # تحميل نموذج ONNX
-        try:
-            if providers is None:
-                providers = ["CPUExecutionProvider"]
-            
-            self.session = ort.InferenceSession(model_path, providers=providers)
-            self.input_name = self.session.get_inputs()[0].name
-            self.output_names = [o.name for o in self.session.get_outputs()]
-            logger.info(f"✅ تم تحميل النموذج باستخدام: {providers}")
-        except Exception as e:
-            logger.error(f"❌ خطأ في تحميل النموذج: {e}")
-            raise
-        
-        # تهيئة MediaPipe
-        self.mp_hands = mp.solutions.hands.Hands(
-            static_image_mode=True,
-            max_num_hands=1,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
-        logger.info("✅ تم تهيئة MediaPipe")
-    
-    def detect_hand_box(self, bgr: np.ndarray, pad: int = 20) -> Optional[Tuple[int, int, int, int]]:
-        h, w = bgr.shape[:2]
-        rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
-        
-        try:
-            results = self.mp_hands.process(rgb)
-            if not results.multi_hand_landmarks:
-                return None
-            
-            landmarks = results.multi_hand_landmarks[0].landmark
-            xs = [int(lm.x * w) for lm in landmarks]
-            ys = [int(lm.y * h) for lm in landmarks]
-            
-            x1 = max(0, min(xs) - pad)
-            y1 = max(0, min(ys) - pad)
-            x2 = min(w, max(xs) + pad)
-            y2 = min(h, max(ys) + pad)
-            
-            if x2 <= x1 or y2 <= y1:
-                return None
-            
-            return (x1, y1, x2, y2)
-        except:
-            return None
-    
-    def crop_hand(self, img_pil: Image.Image, pad: int = 20) -> Image.Image:
-        try:
-            bgr = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
-            box = self.detect_hand_box(bgr, pad=pad)
-            if box is None:
-                return img_pil
-            
-            x1, y1, x2, y2 = box
-            crop = bgr[y1:y2, x1:x2]
-            if crop.size == 0:
-                return img_pil
-            
-            rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
-            return Image.fromarray(rgb)
-        except:
-            return img_pil
-    
-    def preprocess(self, img_pil: Image.Image) -> np.ndarray:
-        img_pil = self.crop_hand(img_pil, pad=20)
-        img_pil = img_pil.convert("L").resize((self.img_size, self.img_size))
-        x = np.array(img_pil, dtype=np.float32) / 255.0
-        x = x[None, None, :, :]
-        return x
-    
-    def predict(self, image_path: str, top_k: int = 5) -> Tuple[str, float, List[Tuple[str, float]]]:
-        img = Image.open(image_path).convert("RGB")
-        x = self.preprocess(img)
-        outputs = self.session.run(self.output_names, {self.input_name: x})
-        logits = outputs[0][0]
-        
-        exp_logits = np.exp(logits - np.max(logits))
-        probs = exp_logits / np.sum(exp_logits)
-        
-        top_idx = int(np.argmax(probs))
-        top_label = self.classes[top_idx]
-        top_confidence = float(probs[top_idx])
-        
-        top_k_indices = np.argsort(probs)[-top_k:][::-1]
-        top_k_predictions = [(self.classes[idx], float(probs[idx])) for idx in top_k_indices]
-        
-        return top_label, top_confidence, top_k_predictions
-    
-    def __del__(self):
-        if hasattr(self, 'mp_hands'):
-            self.mp_hands.close()
-
-
-# ====== إنشاء كائن عام للاستخدام ======
-try:
-    predictor = SignLanguagePredictor()
-except Exception as e:
-    logger.error(f"❌ فشل تهيئة المتنبئ: {e}")
-    predictor = None
-
-
-# ====== دوال توافق مع الكود القديم ======
-
-def predict(image_path: str) -> Tuple[str, float]:
-    if predictor is None:
-        raise RuntimeError("المتنبئ غير متاح")
-    label, confidence, _ = predictor.predict(image_path)
-
-    # ✅ تحويل اللابل إلى عربي حسب ملف الميتاداتا
-    if hasattr(predictor, "mapping") and predictor.mapping:
-        label = predictor.mapping.get(label, label)
-
-    return label, confidence
-
-
-def dummy_extract_text(image_path: str) -> str:
-    try:
-        label, confidence = predict(image_path)
-        return f"{label} (ثقة: {confidence:.2%})"
-    except Exception as e:
-        return f"فشل استخراج النص: {str(e)}"
-
-
-def get_top_predictions(image_path: str, top_k: int = 5) -> List[Tuple[str, float]]:
-    if predictor is None:
-        raise RuntimeError("المتنبئ غير متاح")
-    _, _, top_k_preds = predictor.predict(image_path, top_k=top_k)
-    return top_k_preds
+"""
+نموذج التنبؤ بلغة الإشارة العربية باستخدام ONNX Runtime و MediaPipe
+"""
+from pathlib import Path
+from typing import Tuple, Optional, List, Union
+import logging
+
+import numpy as np
+from PIL import Image
+import cv2
+import mediapipe as mp
+
+from .cache import prediction_cache
+from .image_io import open_rgb
+from .pipeline import Frame, HandsFromHolistic, OnnxClassifier, register_box, register_detector, register_predictor
+from .registry import MODEL_DIR, registry
+
+# إعداد السجلات
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SignLanguagePredictor(OnnxClassifier):
+    """
+    كلاس للتنبؤ بلغة الإشارة العربية من الصور
+    - الميتاداتا/الجلسة/softmax/top-k مشتركة في pipeline.OnnxClassifier
+    """
+
+    name = "letters"
+    batcher_name = "letters"
+    # كشف اليد (MediaPipe Hands) على نسخة 640 ، والقص من الإطار بدقته الكاملة ، PIL resize الافتراضي
+    default_pipeline = {
+        "detector": "hands",
+        "box": "hand",
+        "pad": 20,
+        "max_size": None,
+        "detect_size": 640,
+        "enhance": False,
+        "resize": "bicubic",
+        "fallback": "full",
+    }
+    
+    def __init__(
+        self,
+        model_path: Union[str, Path] = MODEL_DIR / "Mubser_model.onnx",
+        metadata_path: Union[str, Path] = MODEL_DIR / "Mubser_model.meta.json",
+        providers: List[str] = None
+    ):
+        """
+        تهيئة المتنبئ
+        """
+        super().__init__(model_path, metadata_path, providers)
+        # كواشف MediaPipe Hands تُعار من مجمّع السجل (انظر registry.py)
+
+    @property
+    def mapping(self) -> dict:
+        return self.label_mapping
+    
+    def detect_hand_box(self, bgr: np.ndarray, pad: int = 20) -> Optional[Tuple[int, int, int, int]]:
+        h, w = bgr.shape[:2]
+        try:
+            frame = Frame(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+            return hand_box(frame.detect("hands"), w, h, pad)
+        except:
+            return None
+    
+    def crop_hand(self, img_pil: Image.Image, pad: int = 20) -> Image.Image:
+        try:
+            frame = Frame(img_pil)
+            rgb = frame.rgb
+            box = hand_box(frame.detect("hands"), rgb.shape[1], rgb.shape[0], pad)
+            if box is None:
+                return img_pil
+            x1, y1, x2, y2 = box
+            return Image.fromarray(rgb[y1:y2, x1:x2])
+        except:
+            return img_pil
+    
+    def preprocess(self, img_pil: Image.Image) -> np.ndarray:
+        return self.preprocess_frame(Frame(img_pil))
+
+    def preprocess_frame(self, frame: Frame) -> np.ndarray:
+        """قص اليد من الإطار المشترك → رمادي → (1,1,S,S)"""
+        rgb, (x1, y1, x2, y2) = frame.locate(self.config)
+        gray = cv2.cvtColor(rgb[y1:y2, x1:x2], cv2.COLOR_RGB2GRAY)
+        return self.to_input(gray)
+    
+    def predict(self, image: Union[str, Path, Image.Image], top_k: int = 5) -> Tuple[str, float, List[Tuple[str, float]]]:
+        if isinstance(image, (str, Path)):
+            img = open_rgb(image)
+        elif isinstance(image, Image.Image):
+            img = image
+        else:
+            raise TypeError("image يجب أن يكون مساراً أو PIL.Image")
+        return self.predict_frame(Frame(img), top_k)
+
+    def predict_frame(self, frame: Frame, top_k: int = 5) -> Tuple[str, float, List[Tuple[str, float]]]:
+        # اليد المشتقة من Holistic (frame.shared) قد تعطي قصّاً مختلفاً، فلها مفتاح كاش مستقل
+        def compute():
+            return self.classify(self.preprocess_frame(frame), top_k, mapped=False)[0]
+
+        if frame.image is None:
+            return compute()
+        options = (top_k, "holistic") if frame.shared else (top_k,)
+        return prediction_cache.get_or_compute(frame.image, self.model_id, options, compute, frame.key)
+    
+    def __del__(self):
+        self.close()
+
+
+# ====== مراحل المعالجة: كاشف Hands + صندوق اليد ======
+
+@register_detector("hands")
+def _detect_hands(frame: Frame):
+    # إطار مشترك: اليد من نتيجة Holistic نفسها بدلاً من تشغيل كاشف ثانٍ
+    if frame.shared:
+        return HandsFromHolistic(frame.detect("holistic"))
+    size = registry.get("letters").config.detection_size
+    with registry.detector("letters") as hands:
+        return hands.process(frame.resized(size))
+
+
+@register_box("hand")
+def hand_box(results, w: int, h: int, pad: int = 20) -> Optional[Tuple[int, int, int, int]]:
+    if not results.multi_hand_landmarks:
+        return None
+    
+    landmarks = results.multi_hand_landmarks[0].landmark
+    xs = [int(lm.x * w) for lm in landmarks]
+    ys = [int(lm.y * h) for lm in landmarks]
+    
+    x1 = max(0, min(xs) - pad)
+    y1 = max(0, min(ys) - pad)
+    x2 = min(w, max(xs) + pad)
+    y2 = min(h, max(ys) + pad)
+    
+    if x2 <= x1 or y2 <= y1:
+        return None
+    
+    return (x1, y1, x2, y2)
+
+
+# ====== التسجيل في سجل النماذج (تحميل كسول عند أول طلب) ======
+
+def _new_hands():
+    return mp.solutions.hands.Hands(
+        static_image_mode=True,
+        max_num_hands=1,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+
+
+def _warmup(model: SignLanguagePredictor):
+    model.batcher.submit(np.zeros((1, 1, model.img_size, model.img_size), dtype=np.float32))
+
+
+registry.register("letters", SignLanguagePredictor, detector_factory=_new_hands, warmup=_warmup)
+
+
+def get_predictor() -> SignLanguagePredictor:
+    try:
+        return registry.get("letters")
+    except Exception:
+        raise RuntimeError("المتنبئ غير متاح")
+
+
+@register_predictor("letters")
+def predict_letter_frame(frame: Frame, top_k: int = 5) -> Tuple[str, float, List[Tuple[str, float]]]:
+    """تنبؤ حرف على إطار مشترك (اللابل مترجم حسب الميتاداتا كما في predict)"""
+    predictor = get_predictor()
+    label, confidence, top = predictor.predict_frame(frame, top_k)
+    return predictor.mapping.get(label, label), confidence, top
+
+
+def batch_stats() -> Optional[dict]:
+    """مقاييس مُجمِّع الدفعات لنموذج الحروف (None إذا لم يُحمَّل بعد)"""
+    entry = registry.entry("letters")
+    return entry.get().batcher.stats() if entry.loaded else None
+
+
+def __getattr__(name: str):
+    # توافق: inference.predictor (None إذا فشل التحميل كما في السابق)
+    if name == "predictor":
+        try:
+            return get_predictor()
+        except RuntimeError:
+            return None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# ====== دوال توافق مع الكود القديم ======
+
+def predict(image: Union[str, Path, Image.Image]) -> Tuple[str, float]:
+    predictor = get_predictor()
+    label, confidence, _ = predictor.predict(image)
+
+    # ✅ تحويل اللابل إلى عربي حسب ملف الميتاداتا
+    if hasattr(predictor, "mapping") and predictor.mapping:
+        label = predictor.mapping.get(label, label)
+
+    return label, confidence
+
+
+def dummy_extract_text(image: Union[str, Path, Image.Image]) -> str:
+    try:
+        label, confidence = predict(image)
+        return f"{label} (ثقة: {confidence:.2%})"
+    except Exception as e:
+        return f"فشل استخراج النص: {str(e)}"
+
+
+def get_top_predictions(image: Union[str, Path, Image.Image], top_k: int = 5) -> List[Tuple[str, float]]:
+    predictor = get_predictor()
+    _, _, top_k_preds = predictor.predict(image, top_k=top_k)
+    return top_k_preds
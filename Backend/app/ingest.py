@@ -0,0 +1,256 @@
+"""
+طابور الإدخال غير المتزامن لـ /images و /images_word
+- الرفع يحفظ الملف + سجل ImageItem (status=pending) + صف في ingest_jobs بنفس المعاملة ثم يرد فوراً (202)
+- عمّال asyncio يسحبون المهام من الجدول (دائم: يبقى بعد إعادة التشغيل) وينفّذون التنبؤ في InferencePool
+- فشل = إعادة محاولة مع تراجع أسّي حتى MUBSER_INGEST_MAX_ATTEMPTS ثم status=failed
+- مهمة عالقة (عامل توقف أثناء التنفيذ) تُستعاد بعد انتهاء locked_until
+- الانتظار: GET /images/{id}/status?wait=ثواني (إشعار داخل العملية + فحص دوري للقاعدة)
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import jobs
+from .database import AsyncSessionLocal
+from .models import ImageItem, IngestJob
+from .workers import InferencePool, PoolSaturatedError
+
+logger = logging.getLogger(__name__)
+
+# sync = السلوك السابق (التنبؤ قبل الرد) ، async = الطابور (يمكن تغييره لكل طلب بـ ?ingest=)
+INGEST_MODE = os.getenv("MUBSER_INGEST_MODE", "sync")
+INGEST_MODES = ("sync", "async")
+# 0 = هذه العملية لا تستهلك الطابور (عند تشغيل عدة عمليات uvicorn يكفي أن تستهلكه إحداها)
+INGEST_WORKERS = int(os.getenv("MUBSER_INGEST_WORKERS", "2"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("MUBSER_INGEST_MAX_ATTEMPTS", "3"))
+INGEST_RETRY_BASE_SECONDS = float(os.getenv("MUBSER_INGEST_RETRY_BASE_SECONDS", "2"))
+INGEST_LEASE_SECONDS = float(os.getenv("MUBSER_INGEST_LEASE_SECONDS", "120"))
+INGEST_POLL_SECONDS = float(os.getenv("MUBSER_INGEST_POLL_SECONDS", "1"))
+
+# نوع المهمة → دالة التنبؤ على مسار الملف (jobs.py)
+INGEST_JOBS: Dict[str, Callable] = {
+    "letters": jobs.extract_letter_job,
+    "words": jobs.extract_word_job,
+}
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(IngestJob.status == "queued", IngestJob.next_attempt_at <= now),
+        and_(IngestJob.status == "running", IngestJob.locked_until < now),
+    )
+
+
+class IngestQueue:
+    """عمّال الطابور + عدّادات المعالجة (العمق الفعلي يُقرأ من الجدول)"""
+
+    def __init__(
+        self,
+        pool: InferencePool,
+        workers: int = INGEST_WORKERS,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+    ):
+        self.pool = pool
+        self.workers = max(0, workers)
+        self.session_factory = session_factory
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._waiters: Dict[int, List[asyncio.Event]] = {}
+        self._stopping = False
+
+        self.enqueued = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self._busy_ms = 0.0
+
+    # ---------- الإدخال ----------
+
+    def enqueue(self, db: AsyncSession, image_id: int, kind: str):
+        """يضيف المهمة لنفس معاملة السجل (الاستدعاء قبل commit ثم notify بعده)"""
+        if kind not in INGEST_JOBS:
+            raise ValueError(f"نوع مهمة غير معروف: {kind}")
+        now = _utcnow()
+        db.add(IngestJob(image_id=image_id, kind=kind, status="queued", attempts=0, next_attempt_at=now, created_at=now))
+        self.enqueued += 1
+
+    def notify(self):
+        """إيقاظ العمّال فوراً بدل انتظار الفحص الدوري"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def wait_for(self, image_id: int, timeout: float):
+        """
+        انتظار انتهاء صورة (داخل العملية) أو انتهاء المهلة
+        - حدث لكل منتظر يُحذف عند انتهاء الانتظار (صورة تنتهي في عملية أخرى أو تُحذف أو لا تنتهي)
+        """
+        event = asyncio.Event()
+        waiters = self._waiters.setdefault(image_id, [])
+        waiters.append(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if not event.is_set():
+                waiters.remove(event)
+                if not waiters and self._waiters.get(image_id) is waiters:
+                    del self._waiters[image_id]
+
+    def _finished(self, image_id: int):
+        for event in self._waiters.pop(image_id, ()):
+            event.set()
+
+    # ---------- العمّال ----------
+
+    def start(self):
+        if self.workers == 0 or self._tasks:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        logger.info(f"✅ طابور الإدخال: {self.workers} عامل (محاولات {INGEST_MAX_ATTEMPTS})")
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, n: int):
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"❌ عامل الإدخال {n}: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), INGEST_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._process(*job)
+            except Exception as e:
+                # المهمة تبقى running وتُستعاد بعد انتهاء المهلة
+                logger.error(f"❌ عامل الإدخال {n}: {e}")
+
+    async def _claim(self) -> Optional[Tuple[int, int, str, int, str]]:
+        """أقدم مهمة جاهزة → running مع مهلة (UPDATE مشروط: عاملان لا يأخذان نفس المهمة)"""
+        while True:
+            now = _utcnow()
+            async with self.session_factory() as db:
+                row = (await db.execute(
+                    select(IngestJob.id, IngestJob.image_id, IngestJob.kind, IngestJob.attempts, ImageItem.saved_path)
+                    .join(ImageItem, ImageItem.id == IngestJob.image_id)
+                    .where(_claimable(now))
+                    .order_by(IngestJob.next_attempt_at, IngestJob.id)
+                    .limit(1)
+                )).first()
+                if row is None:
+                    return None
+                claimed = await db.execute(
+                    update(IngestJob)
+                    .where(IngestJob.id == row.id, _claimable(now))
+                    .values(status="running", attempts=IngestJob.attempts + 1,
+                            locked_until=now + timedelta(seconds=INGEST_LEASE_SECONDS))
+                )
+                await db.commit()
+            if claimed.rowcount == 1:
+                return row.id, row.image_id, row.kind, row.attempts + 1, row.saved_path
+
+    async def _process(self, job_id: int, image_id: int, kind: str, attempts: int, saved_path: str):
+        t0 = time.perf_counter()
+        try:
+            prediction, _ = await self.pool.run(INGEST_JOBS[kind], saved_path)
+        except PoolSaturatedError as e:
+            # المجمّع مشغول بطلبات مباشرة: لا تُحسب محاولة
+            await self._reschedule(job_id, attempts - 1, e.retry_after, None)
+            return
+        except Exception as e:
+            self._busy_ms += (time.perf_counter() - t0) * 1000.0
+            await self._failed(job_id, image_id, attempts, f"فشل استخراج النص: {type(e).__name__}: {e}")
+            return
+        self._busy_ms += (time.perf_counter() - t0) * 1000.0
+        if prediction.get("label") is None:
+            # extract_letter_job يرجّع نص الخطأ بدل رفع الاستثناء
+            await self._failed(job_id, image_id, attempts, prediction.get("text") or "فشل استخراج النص")
+            return
+
+        async with self.session_factory() as db:
+            item = await db.get(ImageItem, image_id)
+            if item is not None:
+                item.extracted_text = prediction["text"]
+                item.predicted_label = prediction["label"]
+                item.confidence = prediction["confidence"]
+                item.status = "done"
+            await db.execute(delete(IngestJob).where(IngestJob.id == job_id))
+            await db.commit()
+        self.completed += 1
+        self._finished(image_id)
+
+    async def _reschedule(self, job_id: int, attempts: int, delay: float, error: Optional[str]):
+        async with self.session_factory() as db:
+            await db.execute(
+                update(IngestJob)
+                .where(IngestJob.id == job_id)
+                .values(status="queued", attempts=attempts, locked_until=None, last_error=error,
+                        next_attempt_at=_utcnow() + timedelta(seconds=delay))
+            )
+            await db.commit()
+
+    async def _failed(self, job_id: int, image_id: int, attempts: int, error: str):
+        if attempts < INGEST_MAX_ATTEMPTS:
+            delay = INGEST_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+            logger.warning(f"⚠️ إعادة محاولة الصورة {image_id} بعد {delay:.0f}s ({attempts}/{INGEST_MAX_ATTEMPTS}): {error}")
+            await self._reschedule(job_id, attempts, delay, error)
+            self.retried += 1
+            return
+
+        logger.error(f"❌ فشل تحليل الصورة {image_id} بعد {attempts} محاولات: {error}")
+        async with self.session_factory() as db:
+            await db.execute(
+                update(IngestJob).where(IngestJob.id == job_id).values(status="failed", locked_until=None, last_error=error)
+            )
+            item = await db.get(ImageItem, image_id)
+            if item is not None:
+                item.extracted_text = error
+                item.status = "failed"
+            await db.commit()
+        self.failed += 1
+        self._finished(image_id)
+
+    # ---------- المقاييس ----------
+
+    def counters(self) -> dict:
+        return {"enqueued": self.enqueued, "completed": self.completed, "retried": self.retried, "failed": self.failed}
+
+    async def stats(self, db: AsyncSession) -> dict:
+        depth = dict((await db.execute(select(IngestJob.status, func.count()).group_by(IngestJob.status))).all())
+        oldest = (await db.execute(
+            select(func.min(IngestJob.created_at)).where(IngestJob.status.in_(("queued", "running")))
+        )).scalar()
+        processed = self.completed + self.failed
+        return {
+            "mode": INGEST_MODE,
+            "workers": self.workers,
+            "running": bool(self._tasks),
+            "depth": {status: depth.get(status, 0) for status in ("queued", "running", "failed")},
+            "oldest_pending_seconds": round((_utcnow() - oldest).total_seconds(), 1) if oldest else 0.0,
+            **self.counters(),
+            "avg_process_ms": round(self._busy_ms / processed, 1) if processed else 0.0,
+            "waiters": len(self._waiters),
+        }
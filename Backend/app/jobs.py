@@ -0,0 +1,253 @@
+"""
+دوال الاستدلال التي تُنفَّذ داخل مجمّع العمّال (workers.InferencePool)
+- دوال على مستوى الموديول حتى تعمل في وضع process أيضاً
+- كل دالة ترجّع (النتيجة، توقيت كل مرحلة بالملي ثانية)
+"""
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+
+@contextmanager
+def _stage(timings: Dict[str, float], name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = (time.perf_counter() - t0) * 1000.0
+
+
+def analyze_letter_job(img_pil: Image.Image) -> Tuple[Tuple[str, float], Dict[str, float]]:
+    """تحليل حرف (32 صنف)"""
+    from .inference import predict
+
+    timings: Dict[str, float] = {}
+    with _stage(timings, "predict"):
+        result = predict(img_pil)
+    return result, timings
+
+
+def analyze_word_job(
+    img_pil: Image.Image, top_k: int = 5, use_tta: bool = False, engine: str = "cnn"
+) -> Tuple[dict, Dict[str, float]]:
+    """
+    تحليل كلمة (89 صنف) مع فحص الجودة
+    - engine="cnn": القصّة الرمادية 64x64 (مع TTA اختياري)
+    - engine="landmarks": نقاط Holistic المفتاحية + MLP (بدون TTA)
+    - engine="cascade": fast → crop → tta حسب هامش الثقة (use_tta يُتجاهل)
+    """
+    from .Model_Word import predict_word_cascade, predict_word_from_pil, predict_word_with_tta, check_image_quality
+    from .landmarks import predict_word_landmarks
+
+    timings: Dict[str, float] = {}
+    with _stage(timings, "quality"):
+        quality_ok = check_image_quality(img_pil)
+
+    cascade = None
+    with _stage(timings, "predict"):
+        if engine == "cascade":
+            label, conf, top, cascade = predict_word_cascade(img_pil, top_k=top_k)
+        elif engine == "landmarks":
+            label, conf, top = predict_word_landmarks(img_pil, top_k=top_k)
+        elif use_tta:
+            label, conf, top = predict_word_with_tta(img_pil, top_k=top_k, use_tta=True)
+        else:
+            label, conf, top = predict_word_from_pil(img_pil, top_k=top_k)
+
+    return {
+        "label": label,
+        "confidence": conf,
+        "top_k": top,
+        "quality_ok": quality_ok,
+        "cascade": cascade,
+    }, timings
+
+
+def analyze_frame_job(img_pil: Image.Image, models: Sequence[str], top_k: int = 5) -> Tuple[dict, Dict[str, float]]:
+    """
+    نفس الإطار على عدة نماذج (وضع auto): الكشف يعمل مرة واحدة ويُشارك بينها
+    يرجّع: {"results": {model: (label, confidence, top_k)}, "detections": عدد مرات تشغيل MediaPipe}
+    """
+    from . import Model_Word, inference, landmarks  # noqa: F401 (تسجيل دوال التنبؤ في السجل)
+    from .pipeline import FRAME_PREDICTORS, Frame
+
+    frame = Frame(img_pil, shared=len(models) > 1)
+    timings: Dict[str, float] = {}
+    results = {}
+    for name in models:
+        with _stage(timings, name):
+            results[name] = FRAME_PREDICTORS[name](frame, top_k)
+    return {"results": results, "detections": frame.detections_run}, timings
+
+
+def prepare_word_job(data: bytes, use_tta: bool = False) -> Tuple[dict, Dict[str, float]]:
+    """فك الصورة + فحص الجودة + القص/المعالجة (بدون تشغيل النموذج)"""
+    from .image_io import decode_image_bytes
+    from .Model_Word import preprocess_pil, check_image_quality
+
+    timings: Dict[str, float] = {}
+    with _stage(timings, "decode"):
+        img_pil = decode_image_bytes(data)
+    with _stage(timings, "quality"):
+        quality_ok = check_image_quality(img_pil)
+    with _stage(timings, "preprocess"):
+        x = preprocess_pil(img_pil, tta=use_tta)
+    return {"x": x, "quality_ok": quality_ok}, timings
+
+
+def frame_probs_job(img_pil: Image.Image, model: str, quality: bool = False) -> Tuple[dict, Dict[str, float]]:
+    """
+    متجه softmax كامل (C,) لإطار واحد بدون TTA - مدخل التجميع الزمني (temporal.py)
+    model: letters | words ؛ quality: فحص الجودة أيضاً (نموذج الكلمات)
+    """
+    from . import Model_Word, inference  # noqa: F401 (تسجيل النماذج في السجل)
+    from .pipeline import Frame
+    from .registry import registry
+
+    timings: Dict[str, float] = {}
+    quality_ok = None
+    if quality:
+        with _stage(timings, "quality"):
+            quality_ok = Model_Word.check_image_quality(img_pil)
+    with _stage(timings, "predict"):
+        frame = Frame(img_pil)
+        if model == "words":
+            probs = Model_Word._classify_probs(Model_Word.preprocess_frame(frame))[0]
+        else:
+            clf = registry.get(model)
+            probs = clf.probs(clf.preprocess_frame(frame))[0]
+    return {"probs": probs, "quality_ok": quality_ok}, timings
+
+
+def format_probs(model: str, probs: np.ndarray, top_k: int = 5):
+    """(label, confidence, top_k_list) من متجه احتمالات بنفس صيغة predict (حروف) و predict_word (كلمات)"""
+    from . import Model_Word, inference  # noqa: F401
+    from .registry import registry
+
+    clf = registry.get(model)
+    if model != "letters":
+        return clf.format_top_k(probs[None, :], top_k)[0]
+    label, conf, top = clf.format_top_k(probs[None, :], top_k, mapped=False)[0]
+    return clf.mapping.get(label, label), conf, top
+
+
+def classify_word_batch_job(x: np.ndarray, top_k: int = 5, views: int = 1) -> Tuple[list, Dict[str, float]]:
+    """تصنيف دفعة (N*views,1,H,W) في استدعاء ONNX واحد"""
+    from .Model_Word import classify_word_batch
+
+    timings: Dict[str, float] = {}
+    with _stage(timings, "predict"):
+        results = classify_word_batch(x, top_k=top_k, views=views)
+    return results, timings
+
+
+def open_stream_job(session) -> Tuple[None, Dict[str, float]]:
+    """بناء رسم التتبع لجلسة بث (streaming.WordStreamSession)"""
+    timings: Dict[str, float] = {}
+    with _stage(timings, "open"):
+        session.open()
+    return None, timings
+
+
+def analyze_stream_frame_job(holistic, data: bytes, top_k: int = 5, gate_key: Optional[tuple] = None) -> Tuple[dict, Dict[str, float]]:
+    """
+    إطار من جلسة بث: فك + قص برسم التتبع الخاص بالجلسة + تصنيف
+    gate_key: مفتاح بوابة الحركة (motion.py) - الإطار الساكن يعيد نتيجة آخر إطار محلَّل
+    """
+    from .image_io import decode_image_bytes
+    from .Model_Word import preprocess_pil, _classify_probs, _format_top_k
+    from .motion import motion_gate
+
+    timings: Dict[str, float] = {}
+    with _stage(timings, "decode"):
+        img_pil = decode_image_bytes(data)
+    check = None
+    if gate_key is not None:
+        check = motion_gate.check(gate_key, img_pil)
+        timings["gate"] = check.gate_ms
+        if check.reused:
+            return {**check.value, "reused": True}, timings
+    with _stage(timings, "preprocess"):
+        x = preprocess_pil(img_pil, holistic=holistic)
+    with _stage(timings, "predict"):
+        probs = _classify_probs(x)[0]
+        label, conf, top = _format_top_k(probs, top_k)
+    result = {"label": label, "confidence": conf, "top_k": top, "probs": probs, "reused": False}
+    if check is not None:
+        motion_gate.update(check, result, timings["preprocess"] + timings["predict"])
+    return result, timings
+
+
+def prediction_text(label: str, confidence: float) -> str:
+    return f"{label} (ثقة: {confidence:.2%})"
+
+
+def extract_letter_job(image: Union[str, Path, Image.Image]) -> Tuple[dict, Dict[str, float]]:
+    """نص + تسمية + ثقة الحرف للصور المحفوظة (/images)"""
+    from .inference import predict
+
+    timings: Dict[str, float] = {}
+    with _stage(timings, "predict"):
+        try:
+            label, conf = predict(image)
+            result = {"text": prediction_text(label, conf), "label": label, "confidence": conf}
+        except Exception as e:
+            result = {"text": f"فشل استخراج النص: {str(e)}", "label": None, "confidence": None}
+    return result, timings
+
+
+def extract_word_job(image: Union[str, Path, Image.Image]) -> Tuple[dict, Dict[str, float]]:
+    """نص + تسمية + ثقة الكلمة للصور المحفوظة (/images_word)"""
+    from .Model_Word import predict_word
+
+    timings: Dict[str, float] = {}
+    with _stage(timings, "predict"):
+        label, conf, _ = predict_word(image, top_k=5)
+    return {"text": prediction_text(label, conf), "label": label, "confidence": conf}, timings
+
+
+def classify_tensor_job(model: str, samples: np.ndarray, top_k: int = 5, tta: bool = False) -> Tuple[tuple, Dict[str, float]]:
+    """
+    تصنيف عينات جاهزة من الصيغة الثنائية (wire.py) بدون فك أو كشف
+    - uint8 (N,S,S): قصص رمادية بحجم img_size للنموذج (TTA اختياري لنموذج الكلمات)
+    - float32 (N,D): متجهات النقاط لنموذج word_landmarks
+    يرجّع: (indices (N,k) ، confidences (N,k)) - ValueError لشكل لا يناسب النموذج
+    """
+    from . import Model_Word, inference, landmarks  # noqa: F401 (تسجيل النماذج في السجل)
+    from .pipeline import top_k_indices
+    from .registry import registry
+
+    timings: Dict[str, float] = {}
+    with _stage(timings, "load"):
+        clf = registry.get(model)
+    n = samples.shape[0]
+    with _stage(timings, "prepare"):
+        if model == "word_landmarks":
+            # النموذج قبل dtype: مصنّف النقاط لا يملك img_size
+            if samples.dtype == np.uint8 or samples.ndim != 2 or samples.shape[1] != landmarks.FEATURE_DIM:
+                raise ValueError(f"word_landmarks يتوقع متجهات نقاط float32 بشكل (N, {landmarks.FEATURE_DIM})")
+            views = 1
+            x = np.ascontiguousarray(samples, dtype=np.float32)
+        elif samples.dtype == np.uint8:
+            size = clf.img_size
+            if samples.shape[1:] != (size, size):
+                raise ValueError(f"{model} يتوقع قصصاً uint8 بشكل (N, {size}, {size})")
+            views = Model_Word.TTA_VIEWS if tta and model == "words" else 1
+            x = np.empty((n * views, 1, size, size), dtype=np.float32)
+            np.multiply(samples, np.float32(1.0 / 255.0), out=x[::views, 0])
+            if views > 1:
+                for i in range(n):
+                    Model_Word.tta_views(x[i * views, 0], out=x[i * views:(i + 1) * views, 0])
+            clf.normalize(x)
+        else:
+            raise ValueError(f"متجهات النقاط ({landmarks.FEATURE_DIM}) لنموذج word_landmarks فقط ؛ {model} يتوقع قصصاً uint8")
+    with _stage(timings, "predict"):
+        probs = clf.probs(x, views=views)
+        k = int(max(1, min(top_k, probs.shape[-1])))
+        indices = top_k_indices(probs, k)
+        confidences = np.take_along_axis(probs, indices, axis=1)
+    return (indices, confidences), timings
@@ -0,0 +1,170 @@
+"""
+محرك الكلمات بالنقاط المفتاحية (بديل أخف من CNN على القصّة الرمادية)
+- نفس تشغيل Holistic، لكن نستخدم نقاط اليدين/الجسم/الوجه نفسها كمدخل
+- متجه خصائص مُطبَّع (مستقل عن الإضاءة وموضع الشخص وحجمه في الإطار)
+- مصنّف MLP صغير بصيغة ONNX (يُدرَّب بـ scripts/train_landmark_model.py)
+"""
+import logging
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .batching import BATCH_MAX_SIZE
+from .cache import prediction_cache
+from .pipeline import Frame, OnnxClassifier, downscale, register_predictor
+from .registry import MODEL_DIR, registry
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = MODEL_DIR / "Mubser_landmarks_mlp.onnx"
+META_PATH = MODEL_DIR / "Mubser_landmarks_mlp.meta.json"
+
+# إصدار صيغة الخصائص: يُحفظ في الميتاداتا ويُرفض النموذج إذا اختلف
+FEATURE_VERSION = 1
+HAND_POINTS = 21
+POSE_POINTS = (0, 11, 12, 13, 14, 15, 16)  # أنف، كتفان، مرفقان، معصمان
+FACE_POINTS = (10, 152, 234, 454, 1)
+# لكل يد: شكل اليد (21×3) + موضع المعصم (3) ، ثم الجسم + الوجه + علامتا وجود اليدين
+FEATURE_DIM = 2 * (HAND_POINTS * 3 + 3) + len(POSE_POINTS) * 3 + len(FACE_POINTS) * 3 + 2
+
+
+def _points(landmarks, ids=None) -> Optional[np.ndarray]:
+    if not landmarks:
+        return None
+    lms = landmarks.landmark
+    if ids is None:
+        ids = range(len(lms))
+    return np.array([[lms[i].x, lms[i].y, lms[i].z] for i in ids if i < len(lms)], dtype=np.float32)
+
+
+def landmark_features(res, aspect: float = 1.0) -> np.ndarray:
+    """
+    متجه خصائص (FEATURE_DIM,) من نتيجة Holistic
+    - aspect = عرض/ارتفاع الإطار (إحداثيات MediaPipe مُطبّعة لكل محور على حدة)
+    - مرجع الجسم: منتصف الكتفين ومسافة الكتفين (وإلا مركز الإطار)
+    - شكل اليد: نسبةً للمعصم ومقسوماً على حجم اليد
+    - الأجزاء غير المكتشفة = أصفار
+    """
+    scale_xyz = np.array([aspect, 1.0, aspect], dtype=np.float32)
+    pose = _points(res.pose_landmarks, POSE_POINTS)
+    face = _points(res.face_landmarks, FACE_POINTS)
+    hands = [_points(res.left_hand_landmarks), _points(res.right_hand_landmarks)]
+
+    origin = np.array([0.5 * aspect, 0.5, 0.0], dtype=np.float32)
+    unit = 1.0
+    if pose is not None and len(pose) == len(POSE_POINTS):
+        pose = pose * scale_xyz
+        l_sh, r_sh = pose[1], pose[2]
+        origin = (l_sh + r_sh) / 2.0
+        unit = float(np.linalg.norm((l_sh - r_sh)[:2])) or 1.0
+
+    def body(p: Optional[np.ndarray], n: int) -> np.ndarray:
+        if p is None or len(p) != n:
+            return np.zeros(n * 3, dtype=np.float32)
+        return ((p - origin) / unit).ravel()
+
+    parts = []
+    for hand in hands:
+        if hand is None or len(hand) != HAND_POINTS:
+            parts += [np.zeros(HAND_POINTS * 3 + 3, dtype=np.float32)]
+            continue
+        hand = hand * scale_xyz
+        wrist = hand[0]
+        rel = hand - wrist
+        size = float(np.abs(rel[:, :2]).max()) or 1.0
+        parts += [(rel / size).ravel(), (wrist - origin) / unit]
+    parts += [body(pose, len(POSE_POINTS))]
+    parts += [body(face * scale_xyz if face is not None else None, len(FACE_POINTS))]
+    parts += [np.array([hands[0] is not None, hands[1] is not None], dtype=np.float32)]
+    return np.concatenate(parts).astype(np.float32, copy=False)
+
+
+def hands_detected(features: np.ndarray) -> bool:
+    return bool(features[-2:].any())
+
+
+def extract_features(rgb: np.ndarray, holistic=None) -> np.ndarray:
+    """إطار RGB (H,W,3) → متجه الخصائص (نفس تصغير ومسار الكشف لنموذج الكلمات)"""
+    from .Model_Word import HOLISTIC_MAX_SIZE, detect_holistic
+
+    if holistic is None:
+        return frame_features(Frame(rgb))
+    rgb = downscale(rgb, HOLISTIC_MAX_SIZE)
+    h, w = rgb.shape[:2]
+    return landmark_features(detect_holistic(rgb, holistic), aspect=w / h)
+
+
+def frame_features(frame: Frame) -> np.ndarray:
+    """متجه الخصائص من نتيجة Holistic المشتركة للإطار (نفس كشف نموذج الكلمات)"""
+    from .Model_Word import HOLISTIC_MAX_SIZE
+
+    h, w = frame.resized(HOLISTIC_MAX_SIZE).shape[:2]
+    return landmark_features(frame.detect("holistic"), aspect=w / h)
+
+
+class LandmarkModel(OnnxClassifier):
+    """مصنّف MLP على متجهات الخصائص + ميتاداتا الأصناف"""
+
+    name = "word_landmarks"
+    batcher_name = "word_landmarks"
+
+    def __init__(self, model_path: Path = MODEL_PATH, meta_path: Path = META_PATH):
+        super().__init__(model_path, meta_path)
+        version = int(self.meta.get("feature_version", 0))
+        if version != FEATURE_VERSION or int(self.meta.get("feature_dim", 0)) != FEATURE_DIM:
+            self.close()
+            raise ValueError(
+                f"نموذج النقاط غير متوافق: feature_version={version} (المتوقع {FEATURE_VERSION})"
+            )
+
+    def sample_shape(self) -> Tuple[int, ...]:
+        return BATCH_MAX_SIZE, FEATURE_DIM
+
+
+def _warmup(model: LandmarkModel):
+    model.batcher.submit(np.zeros((1, FEATURE_DIM), dtype=np.float32))
+
+
+# نفس مجمّع كواشف Holistic الخاص بـ "words" (انظر Model_Word.detect_holistic)
+registry.register("word_landmarks", LandmarkModel, warmup=_warmup, optional=True)
+
+
+def available() -> bool:
+    return registry.entry("word_landmarks").loaded or MODEL_PATH.exists()
+
+
+def classify_features(x: np.ndarray, top_k: int = 5) -> List[Tuple[str, float, List[Tuple[str, float]]]]:
+    """تصنيف دفعة (N,FEATURE_DIM) في استدعاء واحد"""
+    model: LandmarkModel = registry.get("word_landmarks")
+    return model.classify(np.ascontiguousarray(x, dtype=np.float32), top_k=top_k)
+
+
+def predict_word_landmarks(img_pil: Image.Image, top_k: int = 5, holistic=None) -> Tuple[str, float, List[Tuple[str, float]]]:
+    """
+    تنبؤ بالنقاط المفتاحية من PIL.Image
+    يرجّع: (label, confidence, top_k_list) بنفس صيغة predict_word_from_pil
+    """
+    if holistic is not None:
+        rgb = np.asarray(img_pil if img_pil.mode == "RGB" else img_pil.convert("RGB"))
+        return _classify(extract_features(rgb, holistic=holistic), top_k)
+    return predict_landmarks_frame(Frame(img_pil), top_k=top_k)
+
+
+def _classify(features: np.ndarray, top_k: int) -> Tuple[str, float, List[Tuple[str, float]]]:
+    if not hands_detected(features):
+        logger.warning("⚠️ لم تُكتشف يد - نتيجة النقاط قد لا تكون دقيقة")
+    return classify_features(features[None, :], top_k=top_k)[0]
+
+
+@register_predictor("word_landmarks")
+def predict_landmarks_frame(frame: Frame, top_k: int = 5) -> Tuple[str, float, List[Tuple[str, float]]]:
+    """تنبؤ على إطار مشترك (يعيد استخدام نتيجة Holistic لنموذج الكلمات إن وُجدت)"""
+    def compute():
+        return _classify(frame_features(frame), top_k)
+
+    if frame.image is None:
+        return compute()
+    model_id = registry.get("word_landmarks").model_id
+    return prediction_cache.get_or_compute(frame.image, model_id, (top_k, "landmarks"), compute, frame.key)
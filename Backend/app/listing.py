@@ -0,0 +1,94 @@
+"""
+عرض الصور المحفوظة بترقيم المؤشر (keyset) بدل إرجاع الجدول كاملاً
+- الترتيب: الأحدث أولاً حسب id (created_at تُضبط عند الإدراج فترتيبها = ترتيب id)
+- المؤشر: آخر id في الصفحة (نص base64 غير شفاف للعميل)
+- نطاق التاريخ يتحول إلى نطاق id بفهرس (created_at, id) ، فكل صفحة = بحث في فهرس + limit صف
+- projection: أعمدة محددة فقط (fields=id,filename,predicted_label)
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import ImageItem
+from .schemas import ImageOut
+
+LIST_FIELDS: Tuple[str, ...] = tuple(ImageOut.model_fields)
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """قائمة الأعمدة المطلوبة (id دائماً لأنه المؤشر) - ValueError لحقل غير معروف"""
+    if not fields:
+        return list(LIST_FIELDS)
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"حقول غير معروفة: {unknown}")
+    return ["id"] + [f for f in dict.fromkeys(names) if f != "id"]
+
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["id"])
+    except Exception:
+        raise ValueError("مؤشر غير صالح")
+
+
+async def _boundary_id(db: AsyncSession, condition, descending: bool) -> Optional[int]:
+    order = (ImageItem.created_at.desc(), ImageItem.id.desc()) if descending else (ImageItem.created_at, ImageItem.id)
+    return (await db.execute(select(ImageItem.id).where(condition).order_by(*order).limit(1))).scalar()
+
+
+async def id_range(
+    db: AsyncSession, created_from: Optional[datetime], created_to: Optional[datetime]
+) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """[أول id ، آخر id] للنطاق [created_from, created_to) - None إذا كان النطاق فارغاً"""
+    low = high = None
+    if created_from is not None:
+        low = await _boundary_id(db, ImageItem.created_at >= created_from, descending=False)
+        if low is None:
+            return None
+    if created_to is not None:
+        high = await _boundary_id(db, ImageItem.created_at < created_to, descending=True)
+        if high is None:
+            return None
+    if low is not None and high is not None and low > high:
+        return None
+    return low, high
+
+
+def page_query(
+    fields: Sequence[str],
+    limit: int,
+    before_id: Optional[int] = None,
+    id_bounds: Tuple[Optional[int], Optional[int]] = (None, None),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    label: Optional[str] = None,
+) -> Select:
+    """صفحة واحدة (limit + 1 صف لمعرفة وجود صفحة تالية)"""
+    query = select(*(getattr(ImageItem, f) for f in fields))
+    low, high = id_bounds
+    if before_id is not None:
+        query = query.where(ImageItem.id < before_id)
+    if low is not None:
+        query = query.where(ImageItem.id >= low)
+    if high is not None:
+        query = query.where(ImageItem.id <= high)
+    # الشرط الدقيق على التاريخ يبقى (نطاق id للفهرس فقط)
+    if created_from is not None:
+        query = query.where(ImageItem.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(ImageItem.created_at < created_to)
+    if label is not None:
+        query = query.where(ImageItem.predicted_label == label)
+    return query.order_by(ImageItem.id.desc()).limit(limit + 1)
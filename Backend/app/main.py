@@ -1,419 +1,1022 @@
-import os
-import shutil
-from typing import List, Optional
-from pathlib import Path
-import logging
-
-from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from dotenv import load_dotenv
-from PIL import Image
-
-import base64
-from io import BytesIO
-from app.inference import predict, dummy_extract_text
-from .database import Base, engine, get_db
-from .models import ImageItem
-from .schemas import ImageOut, AnalyzeResponse, AnalyzeBase64Request
-from .Model_Word import predict_word, predict_word_from_pil
-
-load_dotenv()
-
-# Configure logger
-logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
-load_dotenv()
-
-app = FastAPI(
-    title="مُبصر - نظام لغة الإشارة",
-    description="API لتحليل لغة الإشارة العربية (حروف وكلمات)",
-    version="2.0.0"
-)
-
-# CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=False,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# إنشاء الجداول
-Base.metadata.create_all(bind=engine)
-
-# مجلد الرفع
-UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-
-def save_upload_file(upload_file: UploadFile, dest_dir: str) -> str:
-    """حفظ ملف مع التحقق"""
-    filename = upload_file.filename
-    dest_path = os.path.join(dest_dir, filename)
-
-    base, ext = os.path.splitext(filename)
-    i = 1
-    while os.path.exists(dest_path):
-        filename = f"{base}_{i}{ext}"
-        dest_path = os.path.join(dest_dir, filename)
-        i += 1
-
-    with open(dest_path, "wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
-
-    try:
-        with Image.open(dest_path) as im:
-            im.verify()
-    except Exception:
-        try:
-            os.remove(dest_path)
-        except Exception:
-            pass
-        raise HTTPException(status_code=400, detail="ملف صورة غير صالح")
-
-    return dest_path
-
-
-# ==================== ENDPOINTS ====================
-
-@app.get("/")
-def root():
-    """الصفحة الرئيسية"""
-    return {
-        "message": "مرحباً بك في مُبصر - نظام لغة الإشارة العربية",
-        "version": "2.0.0",
-        "endpoints": {
-            "health": "/health",
-            "docs": "/docs",
-            "upload_letter": "POST /images",
-            "upload_word": "POST /images_word",
-            "analyze_letter": "POST /analyze",
-            "analyze_word": "POST /analyze_word",
-            "list_images": "GET /images",
-            "get_image": "GET /images/{id}",
-            "delete_image": "DELETE /images/{id}"
-        }
-    }
-
-
-@app.get("/health")
-def health():
-    """فحص صحة الخادم"""
-    return {"status": "ok", "message": "الخادم يعمل بنجاح"}
-
-
-@app.post("/images", response_model=ImageOut)
-async def upload_letter_image(
-    file: UploadFile = File(..., description="ملف صورة الحرف"),
-    notes: Optional[str] = Form(None, description="ملاحظات اختيارية"),
-    db: Session = Depends(get_db),
-):
-    """رفع صورة حرف وتحليلها (32 صنف)"""
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=415, detail="الملف ليس صورة")
-
-    dest_path = save_upload_file(file, UPLOAD_DIR)
-    size_bytes = os.path.getsize(dest_path)
-    extracted_text = dummy_extract_text(dest_path)
-
-    item = ImageItem(
-        filename=os.path.basename(dest_path),
-        content_type=file.content_type,
-        size_bytes=size_bytes,
-        saved_path=dest_path,
-        notes=notes,
-        extracted_text=extracted_text,
-    )
-    db.add(item)
-    db.commit()
-    db.refresh(item)
-
-    return item
-
-
-@app.post("/images_word", response_model=ImageOut)
-async def upload_word_image(
-    file: UploadFile = File(..., description="ملف صورة الكلمة"),
-    notes: Optional[str] = Form(None, description="ملاحظات اختيارية"),
-    db: Session = Depends(get_db),
-):
-    """رفع صورة كلمة وتحليلها (89 صنف)"""
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=415, detail="الملف ليس صورة")
-
-    dest_path = save_upload_file(file, UPLOAD_DIR)
-    size_bytes = os.path.getsize(dest_path)
-    
-    # استخدام نموذج الكلمات (89 صنف)
-    label, conf, top_k = predict_word(dest_path, top_k=5)
-    extracted_text = f"{label} (ثقة: {conf:.2%})"
-
-    item = ImageItem(
-        filename=os.path.basename(dest_path),
-        content_type=file.content_type,
-        size_bytes=size_bytes,
-        saved_path=dest_path,
-        notes=notes,
-        extracted_text=extracted_text,
-    )
-    db.add(item)
-    db.commit()
-    db.refresh(item)
-
-    return item
-
-
-@app.get("/images", response_model=List[ImageOut])
-def list_images(db: Session = Depends(get_db)):
-    """عرض جميع الصور المحفوظة"""
-    return db.query(ImageItem).all()
-
-
-@app.get("/images/{image_id}", response_model=ImageOut)
-def get_image(image_id: int, db: Session = Depends(get_db)):
-    """الحصول على صورة محددة"""
-    item = db.get(ImageItem, image_id)
-    if not item:
-        raise HTTPException(status_code=404, detail="الصورة غير موجودة")
-    return item
-
-
-@app.delete("/images/{image_id}", status_code=204)
-def delete_image(image_id: int, db: Session = Depends(get_db)):
-    """حذف صورة"""
-    item = db.get(ImageItem, image_id)
-    if not item:
-        raise HTTPException(status_code=404, detail="غير موجود")
-    
-    try:
-        if os.path.exists(item.saved_path):
-            os.remove(item.saved_path)
-    except Exception:
-        pass
-
-    db.delete(item)
-    db.commit()
-
-
-@app.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_letter(
-    image: UploadFile = File(..., description="صورة حرف"),
-    db: Session = Depends(get_db),
-):
-    """تحليل حرف (32 صنف) - بدون حفظ دائم"""
-    if not image.content_type or not image.content_type.startswith("image/"):
-        raise HTTPException(status_code=415, detail="الملف ليس صورة")
-
-    saved_path = save_upload_file(image, UPLOAD_DIR)
-
-    try:
-        label, conf = predict(saved_path)
-
-        return AnalyzeResponse(
-            label=label,
-            confidence=conf,
-            text=f"{label} (ثقة: {conf:.2%})"
-        )
-
-    finally:
-        # حذف الصورة بعد التحليل
-        try:
-            if os.path.exists(saved_path):
-                os.remove(saved_path)
-        except Exception:
-            pass
-
-
-@app.post("/analyze_word")
-async def analyze_word(
-    image: UploadFile = File(..., description="صورة كلمة"),
-    use_tta: bool = Form(False, description="استخدام TTA للدقة الأعلى (أبطأ)"),
-    db: Session = Depends(get_db),
-):
-    """
-    تحليل كلمة (89 صنف) - مع Top 5 وتحسينات متقدمة
-    
-    **الميزات:**
-    - فحص جودة الصورة تلقائياً
-    - دعم TTA (Test Time Augmentation) للدقة الأعلى
-    - معالجة محسّنة للصور (تباين، سطوع)
-    - كشف MediaPipe Holistic لليدين والوجه
-    
-    **Parameters:**
-    - image: صورة الكلمة (JPEG/PNG)
-    - use_tta: تفعيل TTA (يزيد الدقة لكن أبطأ ~4x)
-    
-    **Returns:**
-    - label: الكلمة المتوقعة
-    - confidence: نسبة الثقة (0-1)
-    - text: نص منسق
-    - top_5: أعلى 5 احتمالات
-    - quality_warning: تحذير إن كانت جودة الصورة منخفضة
-    """
-    if not image.content_type or not image.content_type.startswith("image/"):
-        raise HTTPException(status_code=415, detail="الملف ليس صورة")
-
-    saved_path = save_upload_file(image, UPLOAD_DIR)
-
-    try:
-        # ✅ 1. فتح الصورة وفحص الجودة
-        from .Model_Word import predict_word_from_pil, predict_word_with_tta, check_image_quality
-        
-        img_pil = Image.open(saved_path).convert("RGB")
-        
-        # فحص الجودة
-        quality_ok = check_image_quality(img_pil)
-        quality_warning = None if quality_ok else "⚠️ جودة الصورة منخفضة - قد تؤثر على الدقة"
-
-        # ✅ 2. التنبؤ (مع أو بدون TTA)
-        if use_tta:
-            logger.info("🔄 استخدام TTA - قد يستغرق وقتاً أطول")
-            label, conf, top_k = predict_word_with_tta(img_pil, top_k=5, use_tta=True)
-        else:
-            label, conf, top_k = predict_word_from_pil(img_pil, top_k=5)
-
-        # ✅ 3. تنسيق الاستجابة
-        response = {
-            "label": label,
-            "confidence": float(conf),
-            "text": f"{label} (ثقة: {conf:.2%})",
-            "top_5": [
-                {
-                    "label": lbl,
-                    "confidence": float(c),
-                    "percentage": f"{c:.2%}"
-                }
-                for lbl, c in top_k
-            ],
-            "metadata": {
-                "used_tta": use_tta,
-                "quality_ok": quality_ok,
-                "image_size": f"{img_pil.size[0]}x{img_pil.size[1]}"
-            }
-        }
-        
-        if quality_warning:
-            response["quality_warning"] = quality_warning
-
-        return response
-
-    except Exception as e:
-        logger.error(f"❌ خطأ في تحليل الكلمة: {e}")
-        raise HTTPException(status_code=500, detail=f"فشل التحليل: {str(e)}")
-        
-    finally:
-        # حذف الصورة بعد التحليل
-        try:
-            if os.path.exists(saved_path):
-                os.remove(saved_path)
-        except Exception:
-            pass
-
-
-@app.post("/analyze_word_batch")
-async def analyze_word_batch(
-    images: List[UploadFile] = File(..., description="قائمة صور الكلمات"),
-    use_tta: bool = Form(False),
-    db: Session = Depends(get_db),
-):
-    """
-    تحليل دفعة من الكلمات (Batch Processing)
-    
-    **مفيد لـ:**
-    - رفع عدة صور دفعة واحدة
-    - معالجة مجموعات كبيرة
-    
-    **Limits:**
-    - حد أقصى 10 صور في الطلب الواحد
-    """
-    if len(images) > 10:
-        raise HTTPException(status_code=400, detail="الحد الأقصى 10 صور")
-    
-    results = []
-    
-    for idx, image in enumerate(images):
-        if not image.content_type or not image.content_type.startswith("image/"):
-            results.append({
-                "index": idx,
-                "filename": image.filename,
-                "error": "ليس ملف صورة"
-            })
-            continue
-        
-        saved_path = save_upload_file(image, UPLOAD_DIR)
-        
-        try:
-            from .Model_Word import predict_word_from_pil, predict_word_with_tta, check_image_quality
-            
-            img_pil = Image.open(saved_path).convert("RGB")
-            quality_ok = check_image_quality(img_pil)
-            
-            if use_tta:
-                label, conf, top_k = predict_word_with_tta(img_pil, top_k=3, use_tta=True)
-            else:
-                label, conf, top_k = predict_word_from_pil(img_pil, top_k=3)
-            
-            results.append({
-                "index": idx,
-                "filename": image.filename,
-                "label": label,
-                "confidence": float(conf),
-                "top_3": [
-                    {"label": lbl, "confidence": float(c)}
-                    for lbl, c in top_k
-                ],
-                "quality_ok": quality_ok
-            })
-            
-        except Exception as e:
-            results.append({
-                "index": idx,
-                "filename": image.filename,
-                "error": str(e)
-            })
-        finally:
-            try:
-                if os.path.exists(saved_path):
-                    os.remove(saved_path)
-            except Exception:
-                pass
-    
-    return {
-        "total": len(images),
-        "successful": sum(1 for r in results if "error" not in r),
-        "failed": sum(1 for r in results if "error" in r),
-        "results": results
-    }
-
-
-# ✅ إضافة endpoint لإحصائيات الصور المحفوظة
-@app.get("/images/stats")
-def get_images_stats(db: Session = Depends(get_db)):
-    """
-    إحصائيات الصور المحفوظة
-    """
-    total = db.query(ImageItem).count()
-    
-    # تجميع حسب التاريخ
-    from sqlalchemy import func, cast, Date
-    daily_counts = db.query(
-        cast(ImageItem.created_at, Date).label('date'),
-        func.count(ImageItem.id).label('count')
-    ).group_by('date').order_by('date').all()
-    
-    # حجم إجمالي
-    total_size = db.query(func.sum(ImageItem.size_bytes)).scalar() or 0
-    
-    return {
-        "total_images": total,
-        "total_size_mb": round(total_size / (1024 * 1024), 2),
-        "daily_stats": [
-            {"date": str(date), "count": count}
-            for date, count in daily_counts
-        ]
-    }
-
+import os
+import json
+import asyncio
+import time
+from typing import List, Optional
+from datetime import date, datetime
+from pathlib import Path
+import logging
+
+from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from PIL import Image
+import numpy as np
+
+import base64
+from io import BytesIO
+from app.inference import predict, dummy_extract_text
+from .database import Base, engine, get_async_db, dispose_engines
+from .models import ImageItem, IngestJob
+from .migrations import upgrade_schema
+from . import listing
+from .stats import image_stats
+from . import inference, metrics, storage, wire, Model_Word
+from .storage import StagedFile
+from .ingest import IngestQueue, INGEST_JOBS, INGEST_MODE, INGEST_MODES, INGEST_POLL_SECONDS
+from .schemas import ImageOut, AnalyzeResponse, AnalyzeBase64Request, AnalyzeWordBase64Request
+from .Model_Word import predict_word, predict_word_from_pil, TTA_VIEWS
+from .image_io import decode_image_base64, decode_image_bytes, source_size, InvalidImageError
+from .workers import InferencePool, PoolSaturatedError, server_timing
+from . import jobs
+from .streaming import WordStreamSession, StreamLimitError, active_sessions
+from .cache import prediction_cache
+from .motion import motion_gate, session_key
+from .temporal import temporal_aggregator
+from .registry import registry, warmup_targets
+from . import landmarks
+from .pipeline import FRAME_PREDICTORS, landmark_cache
+
+load_dotenv()
+
+# Configure logger
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+load_dotenv()
+
+app = FastAPI(
+    title="مُبصر - نظام لغة الإشارة",
+    description="API لتحليل لغة الإشارة العربية (حروف وكلمات)",
+    version="2.0.0"
+)
+
+# CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=False,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# إنشاء الجداول + الأعمدة/الفهارس الجديدة على قاعدة موجودة
+Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
+
+# مجمّع الاستدلال (خارج حلقة الأحداث)
+inference_pool = InferencePool()
+# طابور الإدخال غير المتزامن (يشارك نفس المجمّع)
+ingest_queue = IngestQueue(inference_pool)
+
+
+@app.on_event("startup")
+def _start_warmup():
+    # MUBSER_WARMUP=letters,words|all: تحميل النماذج والكواشف في الخلفية، /ready يرجّع 503 حتى ينتهي
+    targets = warmup_targets()
+    if targets:
+        registry.start_warmup(targets)
+
+
+@app.on_event("startup")
+async def _start_ingest():
+    # عمّال طابور الإدخال (MUBSER_INGEST_WORKERS=0: لا استهلاك في هذه العملية)
+    ingest_queue.start()
+
+
+@app.on_event("shutdown")
+async def _shutdown_pool():
+    await ingest_queue.stop()
+    inference_pool.shutdown()
+    await dispose_engines()
+
+
+@app.middleware("http")
+async def _http_metrics(request: Request, call_next):
+    # المسار كقالب (/images/{image_id}) حتى لا تنفجر التسميات بالمعرّفات
+    metrics.HTTP_IN_FLIGHT.inc()
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.HTTP_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - t0, request.method, getattr(route, "path", "unmatched"), str(status)
+        )
+
+
+# عدّادات موجودة تُقرأ عند /metrics فقط
+metrics.stats_collector("mubser_prediction_cache", prediction_cache.stats,
+                        counters=("hits", "near_hits", "misses", "evictions"), gauges=("entries",))
+metrics.stats_collector("mubser_landmark_cache", landmark_cache.stats, counters=("hits", "misses"), gauges=("entries",))
+metrics.stats_collector("mubser_inference_pool", inference_pool.stats, counters=("completed", "rejected"),
+                        gauges=("pending", "max_pending"))
+metrics.stats_collector("mubser_ingest", ingest_queue.counters, counters=("enqueued", "completed", "retried", "failed"))
+metrics.stats_collector("mubser_stream", lambda: {"sessions": active_sessions()}, gauges=("sessions",))
+metrics.stats_collector("mubser_motion_gate", motion_gate.stats,
+                        counters=("frames", "skipped", "saved_ms"), gauges=("sessions",))
+metrics.stats_collector("mubser_temporal", temporal_aggregator.stats,
+                        counters=("updates", "emitted", "evicted"), gauges=("sessions",))
+for _name, _batch_stats in (("letters", inference.batch_stats), ("words", Model_Word.batch_stats)):
+    metrics.stats_collector("mubser_batcher", _batch_stats, counters=("batches", "rows"), gauges=("queue_depth",),
+                            labels={"model": _name})
+
+
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request: Request, exc: PoolSaturatedError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# مجلد الرفع (مخزن حسب المحتوى: UPLOAD_DIR/ab/cd/<sha256>.ext - انظر storage.py)
+UPLOAD_DIR = storage.UPLOAD_DIR
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# حدود تحليل الدفعات
+BATCH_MAX_IMAGES = int(os.getenv("MUBSER_BATCH_MAX_IMAGES", "200"))
+BATCH_CHUNK_SIZE = int(os.getenv("MUBSER_BATCH_CHUNK_SIZE", "32"))
+# محرك الكلمات الافتراضي لـ /analyze_word
+WORD_ENGINES = ("cnn", "landmarks", "cascade")
+WORD_ENGINE = os.getenv("MUBSER_WORD_ENGINE", "cnn")
+# حجم صفحة GET /images
+LIST_DEFAULT_LIMIT = int(os.getenv("MUBSER_LIST_DEFAULT_LIMIT", "50"))
+LIST_MAX_LIMIT = int(os.getenv("MUBSER_LIST_MAX_LIMIT", "500"))
+# أقصى انتظار في GET /images/{id}/status?wait=
+INGEST_MAX_WAIT_SECONDS = float(os.getenv("MUBSER_INGEST_MAX_WAIT_SECONDS", "30"))
+# النماذج التي يجرّبها /analyze_auto افتراضياً
+AUTO_MODELS = ("letters", "words")
+
+
+async def save_upload_file(upload_file: UploadFile) -> StagedFile:
+    """نسخ الرفع لملف مؤقت (sha256 + التحقق) خارج حلقة الأحداث"""
+    try:
+        return await run_in_threadpool(storage.stage_upload, upload_file.file, upload_file.filename, UPLOAD_DIR)
+    except storage.InvalidUploadError:
+        raise HTTPException(status_code=400, detail="ملف صورة غير صالح")
+
+
+async def gated_run(key: Optional[tuple], img_pil: Image.Image, fn, *args):
+    """
+    inference_pool.run خلف بوابة الحركة (motion.py) لإطارات الكاميرا الحية
+    يرجّع: (النتيجة، التوقيتات، True إذا أُعيدت نتيجة آخر إطار محلَّل للجلسة)
+    """
+    if key is None:
+        result, stages = await inference_pool.run(fn, img_pil, *args)
+        return result, stages, False
+    check = await run_in_threadpool(motion_gate.check, key, img_pil)
+    if check.reused:
+        return check.value, {"gate": check.gate_ms}, True
+    result, stages = await inference_pool.run(fn, img_pil, *args)
+    motion_gate.update(check, result, stages.get("total", 0.0))
+    return result, {"gate": check.gate_ms, **stages}, False
+
+
+async def smoothed_run(session_id: str, model: str, img_pil: Image.Image, quality: bool = False, top_k: int = 5):
+    """
+    إطار كاميرا حية عبر التجميع الزمني (temporal.py): softmax الإطار (خلف بوابة الحركة) → متوسط الجلسة
+    يرجّع: ((label, confidence, top_k_list) من المتوسط ، quality_ok ، Smoothed ، التوقيتات ، reused)
+    """
+    result, stages, reused = await gated_run(
+        session_key(session_id, model, "probs"), img_pil, jobs.frame_probs_job, model, quality
+    )
+    smoothed = temporal_aggregator.update((session_id, model), result["probs"])
+    prediction = await run_in_threadpool(jobs.format_probs, model, smoothed.probs, top_k)
+    return prediction, result["quality_ok"], smoothed, stages, reused
+
+
+async def load_upload_image(upload_file: UploadFile) -> Image.Image:
+    """قراءة الصورة وفكّها من الذاكرة مع التحقق (بدون حفظ على القرص) - الفك خارج حلقة الأحداث"""
+    data = await upload_file.read()
+    try:
+        return await run_in_threadpool(decode_image_bytes, data)
+    except InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def load_base64_image(text: str) -> Image.Image:
+    """Base64 / data URL → صورة: فك على أجزاء + نفس تحقق الرفع (الحجم قبل الفك، الأبعاد من الرأس)"""
+    try:
+        return await run_in_threadpool(decode_image_base64, text)
+    except InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ==================== ENDPOINTS ====================
+
+@app.get("/")
+def root():
+    """الصفحة الرئيسية"""
+    return {
+        "message": "مرحباً بك في مُبصر - نظام لغة الإشارة العربية",
+        "version": "2.0.0",
+        "endpoints": {
+            "health": "/health",
+            "ready": "/ready",
+            "docs": "/docs",
+            "upload_letter": "POST /images",
+            "upload_word": "POST /images_word",
+            "analyze_letter": "POST /analyze",
+            "analyze_word": "POST /analyze_word",
+            "analyze_letter_base64": "POST /analyze_base64",
+            "analyze_word_base64": "POST /analyze_word_base64",
+            "analyze_auto": "POST /analyze_auto",
+            "analyze_word_stream": "WS /ws/analyze_word",
+            "list_images": "GET /images",
+            "get_image": "GET /images/{id}",
+            "delete_image": "DELETE /images/{id}"
+        }
+    }
+
+
+@app.get("/health")
+def health():
+    """فحص صحة الخادم"""
+    return {"status": "ok", "message": "الخادم يعمل بنجاح"}
+
+
+@app.get("/ready")
+def ready():
+    """جاهزية النماذج (تحميل + تسخين) - 503 حتى تنتهي نماذج MUBSER_WARMUP"""
+    status = registry.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """مقاييس Prometheus: زمن كل مرحلة، الطلبات الجارية، تشغيلات ONNX، نسبة فشل الكشف، الكاش والطوابير"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/workers/stats")
+def workers_stats():
+    """حالة مجمّع الاستدلال (المعلّق، المكتمل، المرفوض)"""
+    return {**inference_pool.stats(), "stream_sessions": active_sessions()}
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """إحصائيات كاش التنبؤ (إصابات، إخفاقات، الحجم) + كاش نتائج الكشف"""
+    return {**prediction_cache.stats(), "landmarks": landmark_cache.stats()}
+
+
+@app.delete("/cache", status_code=204)
+def clear_cache(model_id: Optional[str] = None):
+    """مسح كاش التنبؤ (كله أو لنموذج محدد)"""
+    prediction_cache.invalidate(model_id)
+
+
+@app.get("/cascade/stats")
+def cascade_stats():
+    """الاستدلال المتدرج: أي مرحلة أجابت + نسبة التصعيد"""
+    from .Model_Word import cascade_stats
+
+    return cascade_stats.stats()
+
+
+@app.get("/motion/stats")
+def motion_stats():
+    """بوابة الحركة: نسبة الإطارات الساكنة المُتخطّاة والوقت الموفَّر (تقديري)"""
+    return motion_gate.stats()
+
+
+@app.get("/temporal/stats")
+def temporal_stats():
+    """التجميع الزمني: الجلسات النشطة والتسميات المستقرة المُرسلة"""
+    return temporal_aggregator.stats()
+
+
+@app.get("/batching/stats")
+def batching_stats():
+    """مقاييس تجميع الدفعات (نسبة الامتلاء وزمن الانتظار)"""
+    from . import inference, Model_Word
+
+    return {
+        "letters": inference.batch_stats(),
+        "words": Model_Word.batch_stats(),
+    }
+
+
+async def store_upload(
+    file: UploadFile, notes: Optional[str], db: AsyncSession, kind: str, ingest: Optional[str], response: Response
+) -> ImageItem:
+    """
+    حفظ الصورة + سجلها
+    - sync: التنبؤ قبل الرد (السلوك السابق)
+    - async: status=pending + مهمة في طابور الإدخال، الرد فوراً بـ 202 و Location لحالة المعالجة
+    """
+    mode = ingest or INGEST_MODE
+    if mode not in INGEST_MODES:
+        raise HTTPException(status_code=422, detail=f"ingest غير معروف: {mode} (المتاح: {', '.join(INGEST_MODES)})")
+    if not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="الملف ليس صورة")
+
+    staged = await save_upload_file(file)
+    try:
+        item = ImageItem(
+            filename=os.path.basename(file.filename or staged.content_hash),
+            content_type=file.content_type,
+            size_bytes=staged.size_bytes,
+            notes=notes,
+            content_hash=staged.content_hash,
+        )
+        if mode == "sync":
+            # التنبؤ على الملف المؤقت قبل فتح المعاملة
+            prediction, _ = await inference_pool.run(INGEST_JOBS[kind], staged.temp_path)
+            item.extracted_text = prediction["text"]
+            item.predicted_label = prediction["label"]
+            item.confidence = prediction["confidence"]
+        else:
+            item.status = "pending"
+
+        item.saved_path = await storage.commit_upload(db, staged, UPLOAD_DIR)
+        try:
+            db.add(item)
+            if mode == "async":
+                await db.flush()
+                ingest_queue.enqueue(db, item.id, kind)
+            with metrics.stage("db_commit"):
+                await db.commit()
+        except Exception:
+            # rollback: الملف وُضع في المخزن لكن صفه قد لا يبقى
+            await db.rollback()
+            await storage.remove_if_unreferenced(db, staged.content_hash, item.saved_path)
+            raise
+    finally:
+        storage.discard(staged.temp_path)
+
+    if mode == "async":
+        ingest_queue.notify()
+        response.status_code = 202
+        response.headers["Location"] = f"/images/{item.id}/status"
+
+    await db.refresh(item)
+    return item
+
+
+@app.get("/ingest/stats")
+async def ingest_stats(db: AsyncSession = Depends(get_async_db)):
+    """عمق طابور الإدخال (queued/running/failed) + عدّادات المعالجة"""
+    return await ingest_queue.stats(db)
+
+
+@app.post("/images", response_model=ImageOut)
+async def upload_letter_image(
+    response: Response,
+    file: UploadFile = File(..., description="ملف صورة الحرف"),
+    notes: Optional[str] = Form(None, description="ملاحظات اختيارية"),
+    ingest: Optional[str] = Query(None, description="sync (افتراضي) | async: الرد فوراً والتحليل في الخلفية"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """رفع صورة حرف وتحليلها (32 صنف)"""
+    return await store_upload(file, notes, db, "letters", ingest, response)
+
+
+@app.post("/images_word", response_model=ImageOut)
+async def upload_word_image(
+    response: Response,
+    file: UploadFile = File(..., description="ملف صورة الكلمة"),
+    notes: Optional[str] = Form(None, description="ملاحظات اختيارية"),
+    ingest: Optional[str] = Query(None, description="sync (افتراضي) | async: الرد فوراً والتحليل في الخلفية"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """رفع صورة كلمة وتحليلها (89 صنف)"""
+    return await store_upload(file, notes, db, "words", ingest, response)
+
+
+@app.get("/images", response_model=None, responses={200: {"model": List[ImageOut]}})
+async def list_images(
+    request: Request,
+    limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor من الصفحة السابقة"),
+    created_from: Optional[datetime] = Query(None, description="من (شامل)"),
+    created_to: Optional[datetime] = Query(None, description="إلى (غير شامل)"),
+    label: Optional[str] = Query(None, description="التسمية المتوقعة"),
+    fields: Optional[str] = Query(None, description="أعمدة محددة مفصولة بفواصل (id دائماً)"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    عرض الصور المحفوظة (الأحدث أولاً) بترقيم المؤشر
+    - الصفحة التالية: ?cursor=<X-Next-Cursor> (أيضاً في ترويسة Link)
+    """
+    try:
+        columns = listing.parse_fields(fields)
+        before_id = listing.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    bounds = await listing.id_range(db, created_from, created_to)
+    if bounds is None:
+        return JSONResponse(content=[])
+    query = listing.page_query(columns, limit, before_id, bounds, created_from, created_to, label)
+    rows = (await db.execute(query)).all()
+
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = listing.encode_cursor(rows[-1].id)
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return JSONResponse(content=jsonable_encoder([dict(row._mapping) for row in rows]), headers=headers)
+
+
+@app.get("/images/stats")
+async def get_images_stats(
+    date_from: Optional[date] = Query(None, description="من يوم (شامل، UTC)"),
+    date_to: Optional[date] = Query(None, description="إلى يوم (شامل، UTC)"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    إحصائيات الصور المحفوظة (من جداول التجميع اليومية)
+    - قبل /images/{image_id} حتى لا يُفسَّر "stats" كمعرّف
+    """
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=422, detail="date_from بعد date_to")
+    return await image_stats(db, date_from, date_to)
+
+
+@app.get("/images/{image_id}/status")
+async def get_image_status(
+    image_id: int,
+    wait: float = Query(0, ge=0, le=INGEST_MAX_WAIT_SECONDS, description="انتظار حتى انتهاء المعالجة (ثواني)"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """حالة معالجة صورة مرفوعة بـ ingest=async (pending / done / failed)"""
+    item = await db.get(ImageItem, image_id)
+    deadline = asyncio.get_running_loop().time() + wait
+    while item is not None and item.status == "pending":
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            break
+        # إنهاء المعاملة قبل الانتظار حتى لا يُحجز اتصال المجمّع
+        await db.rollback()
+        await ingest_queue.wait_for(image_id, min(remaining, INGEST_POLL_SECONDS))
+        item = await db.get(ImageItem, image_id, populate_existing=True)
+    if not item:
+        raise HTTPException(status_code=404, detail="الصورة غير موجودة")
+
+    job = (await db.execute(select(IngestJob).where(IngestJob.image_id == image_id))).scalar_one_or_none()
+    return {
+        "id": item.id,
+        "status": item.status,
+        "extracted_text": item.extracted_text,
+        "predicted_label": item.predicted_label,
+        "confidence": item.confidence,
+        "job": None if job is None else {
+            "status": job.status,
+            "attempts": job.attempts,
+            "next_attempt_at": job.next_attempt_at,
+            "last_error": job.last_error,
+        },
+    }
+
+
+@app.get("/images/{image_id}", response_model=ImageOut)
+async def get_image(image_id: int, db: AsyncSession = Depends(get_async_db)):
+    """الحصول على صورة محددة"""
+    item = await db.get(ImageItem, image_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="الصورة غير موجودة")
+    return item
+
+
+@app.delete("/images/{image_id}", status_code=204)
+async def delete_image(image_id: int, db: AsyncSession = Depends(get_async_db)):
+    """حذف صورة"""
+    item = await db.get(ImageItem, image_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="غير موجود")
+    
+    content_hash, path = item.content_hash, item.saved_path
+    if content_hash:
+        # الملف مشترك بين الرفعات المتطابقة: يُحذف عند آخر مرجع فقط
+        path = await storage.release(db, content_hash)
+
+    await db.delete(item)
+    await db.commit()
+
+    # الملف بعد commit فقط: فشل الحذف في القاعدة لا يترك صفاً بلا ملف
+    if content_hash:
+        if path:
+            await storage.remove_if_unreferenced(db, content_hash, path)
+    else:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception:
+            pass
+
+
+async def _analyze_letter_image(response: Response, img_pil: Image.Image, session_id: Optional[str], smooth: bool) -> AnalyzeResponse:
+    """/analyze و /analyze_base64 بعد فك الصورة"""
+    smoothed = None
+    if session_id and smooth and temporal_aggregator.enabled:
+        (label, conf, _), _, smoothed, stages, reused = await smoothed_run(session_id, "letters", img_pil, top_k=1)
+    else:
+        (label, conf), stages, reused = await gated_run(session_key(session_id, "letters"), img_pil, jobs.analyze_letter_job)
+    response.headers["Server-Timing"] = server_timing(stages)
+    if reused:
+        response.headers["X-Frame-Reused"] = "1"
+
+    return AnalyzeResponse(
+        label=label,
+        confidence=conf,
+        text=f"{label} (ثقة: {conf:.2%})",
+        stable=smoothed.stable if smoothed else None,
+        emitted=smoothed.emitted if smoothed else None,
+    )
+
+
+@app.post("/analyze", response_model=AnalyzeResponse, response_model_exclude_none=True)
+async def analyze_letter(
+    response: Response,
+    image: UploadFile = File(..., description="صورة حرف"),
+    session_id: Optional[str] = Form(None, max_length=64, description="معرّف جلسة الكاميرا الحية (بوابة الحركة)"),
+    smooth: bool = Form(True, description="متوسط احتمالات إطارات الجلسة (مع session_id فقط)"),
+):
+    """
+    تحليل حرف (32 صنف) - بدون حفظ دائم
+    مع session_id و smooth: التسمية من متوسط إطارات الجلسة + stable/emitted (انظر temporal.py)
+    """
+    if not image.content_type or not image.content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="الملف ليس صورة")
+
+    img_pil = await load_upload_image(image)
+    return await _analyze_letter_image(response, img_pil, session_id, smooth)
+
+
+@app.post("/analyze_base64", response_model=AnalyzeResponse, response_model_exclude_none=True)
+async def analyze_letter_base64(response: Response, request: AnalyzeBase64Request):
+    """مثل /analyze بجسم JSON: image_b64 = Base64 خام أو data URL (بدون multipart ولا UPLOAD_DIR)"""
+    img_pil = await load_base64_image(request.image_b64)
+    return await _analyze_letter_image(response, img_pil, request.session_id, request.smooth)
+
+
+def check_word_engine(engine: str):
+    """engine معروف ومتاح (422 / 400)"""
+    if engine not in WORD_ENGINES:
+        raise HTTPException(status_code=422, detail=f"engine غير معروف: {engine}")
+    if engine == "landmarks" and not landmarks.available():
+        raise HTTPException(status_code=400, detail="محرك النقاط غير متاح (ملف النموذج غير موجود)")
+
+
+async def _analyze_word_image(
+    response: Response, img_pil: Image.Image, use_tta: bool, engine: str, session_id: Optional[str], smooth: bool
+) -> dict:
+    """/analyze_word و /analyze_word_base64 بعد فك الصورة"""
+    try:
+        # ✅ 1. فحص الجودة + التنبؤ (مع أو بدون TTA) داخل مجمّع الاستدلال
+        smoothed, cascade = None, None
+        if session_id and smooth and temporal_aggregator.enabled and engine == "cnn" and not use_tta:
+            (label, conf, top_k), quality_ok, smoothed, stages, reused = await smoothed_run(
+                session_id, "words", img_pil, quality=True
+            )
+        else:
+            result, stages, reused = await gated_run(
+                session_key(session_id, "words", use_tta, engine), img_pil, jobs.analyze_word_job, 5, use_tta, engine
+            )
+            label, conf, top_k = result["label"], result["confidence"], result["top_k"]
+            quality_ok, cascade = result["quality_ok"], result["cascade"]
+        quality_warning = None if quality_ok else "⚠️ جودة الصورة منخفضة - قد تؤثر على الدقة"
+        response.headers["Server-Timing"] = server_timing(stages)
+
+        # ✅ 2. تنسيق الاستجابة
+        payload = {
+            "label": label,
+            "confidence": float(conf),
+            "text": f"{label} (ثقة: {conf:.2%})",
+            "top_5": [
+                {
+                    "label": lbl,
+                    "confidence": float(c),
+                    "percentage": f"{c:.2%}"
+                }
+                for lbl, c in top_k
+            ],
+            "metadata": {
+                "used_tta": (use_tta and engine == "cnn") or (cascade or {}).get("stage") == "tta",
+                "engine": engine,
+                "quality_ok": quality_ok,
+                "reused": reused,
+                "image_size": "{}x{}".format(*source_size(img_pil)),
+                "timings_ms": {k: round(v, 2) for k, v in stages.items()}
+            }
+        }
+        
+        if cascade:
+            payload["metadata"]["stage"] = cascade["stage"]
+            payload["metadata"]["margin"] = round(cascade["margin"], 4)
+        if smoothed:
+            payload["metadata"]["temporal"] = smoothed.info()
+
+        if quality_warning:
+            payload["quality_warning"] = quality_warning
+
+        return payload
+
+    except PoolSaturatedError:
+        raise
+    except Exception as e:
+        logger.error(f"❌ خطأ في تحليل الكلمة: {e}")
+        raise HTTPException(status_code=500, detail=f"فشل التحليل: {str(e)}")
+
+
+@app.post("/analyze_word")
+async def analyze_word(
+    response: Response,
+    image: UploadFile = File(..., description="صورة كلمة"),
+    use_tta: bool = Form(False, description="استخدام TTA للدقة الأعلى"),
+    engine: str = Form(WORD_ENGINE, description="cnn | landmarks | cascade"),
+    session_id: Optional[str] = Form(None, max_length=64, description="معرّف جلسة الكاميرا الحية (بوابة الحركة)"),
+    smooth: bool = Form(True, description="متوسط احتمالات إطارات الجلسة (مع session_id ، محرك cnn بدون TTA)"),
+):
+    """
+    تحليل كلمة (89 صنف) - مع Top 5 وتحسينات متقدمة
+    
+    **الميزات:**
+    - فحص جودة الصورة تلقائياً
+    - دعم TTA (Test Time Augmentation) للدقة الأعلى
+    - معالجة محسّنة للصور (تباين، سطوع)
+    - كشف MediaPipe Holistic لليدين والوجه
+    
+    **Parameters:**
+    - image: صورة الكلمة (JPEG/PNG)
+    - use_tta: تفعيل TTA (قص واحد + 4 نسخ في استدعاء واحد، تكلفة قريبة من التنبؤ العادي)
+    - engine: cnn (القصّة الرمادية) أو landmarks (نقاط Holistic + MLP، أسرع ومستقل عن الإضاءة)
+      أو cascade (مرحلة رخيصة أولاً ثم القص ثم TTA فقط عند انخفاض هامش الثقة)
+    - session_id: لإطارات الكاميرا الحية - الإطار الساكن يعيد نتيجة آخر إطار محلَّل (metadata.reused)
+    - smooth: مع session_id: التسمية من متوسط softmax لإطارات الجلسة بدل TTA (metadata.temporal)
+    
+    **Returns:**
+    - label: الكلمة المتوقعة
+    - confidence: نسبة الثقة (0-1)
+    - text: نص منسق
+    - top_5: أعلى 5 احتمالات
+    - quality_warning: تحذير إن كانت جودة الصورة منخفضة
+    """
+    if not image.content_type or not image.content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="الملف ليس صورة")
+
+    check_word_engine(engine)
+    img_pil = await load_upload_image(image)
+    return await _analyze_word_image(response, img_pil, use_tta, engine, session_id, smooth)
+
+
+@app.post("/analyze_word_base64")
+async def analyze_word_base64(response: Response, request: AnalyzeWordBase64Request):
+    """مثل /analyze_word بجسم JSON: image_b64 = Base64 خام أو data URL (بدون multipart ولا UPLOAD_DIR)"""
+    engine = request.engine or WORD_ENGINE
+    check_word_engine(engine)
+    img_pil = await load_base64_image(request.image_b64)
+    return await _analyze_word_image(response, img_pil, request.use_tta, engine, request.session_id, request.smooth)
+
+
+@app.post("/analyze_auto")
+async def analyze_auto(
+    response: Response,
+    image: UploadFile = File(..., description="صورة حرف أو كلمة"),
+    models: str = Form("auto", description="auto أو قائمة مفصولة بفواصل: letters,words,word_landmarks"),
+    top_k: int = Form(5, ge=1, le=20),
+):
+    """
+    نفس الصورة على عدة نماذج: كشف MediaPipe مرة واحدة (Holistic) ثم كل المصنّفات
+    - best: النتيجة الأعلى ثقة بين النماذج
+    """
+    if not image.content_type or not image.content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="الملف ليس صورة")
+
+    names = list(AUTO_MODELS) if models == "auto" else [m.strip() for m in models.split(",") if m.strip()]
+    unknown = [m for m in names if m not in FRAME_PREDICTORS]
+    if not names or unknown:
+        raise HTTPException(status_code=422, detail=f"نماذج غير معروفة: {unknown or models}")
+    if "word_landmarks" in names and not landmarks.available():
+        raise HTTPException(status_code=400, detail="محرك النقاط غير متاح (ملف النموذج غير موجود)")
+
+    img_pil = await load_upload_image(image)
+    try:
+        result, stages = await inference_pool.run(jobs.analyze_frame_job, img_pil, names, top_k)
+    except PoolSaturatedError:
+        raise
+    except Exception as e:
+        logger.error(f"❌ خطأ في التحليل التلقائي: {e}")
+        raise HTTPException(status_code=500, detail=f"فشل التحليل: {str(e)}")
+    response.headers["Server-Timing"] = server_timing(stages)
+
+    results = {
+        name: {
+            "label": label,
+            "confidence": float(conf),
+            "top_k": [{"label": lbl, "confidence": float(c)} for lbl, c in top],
+        }
+        for name, (label, conf, top) in result["results"].items()
+    }
+    best = max(results, key=lambda name: results[name]["confidence"])
+    return {
+        "best": {
+            "model": best,
+            "label": results[best]["label"],
+            "confidence": results[best]["confidence"],
+            "text": f"{results[best]['label']} (ثقة: {results[best]['confidence']:.2%})",
+        },
+        "results": results,
+        "metadata": {
+            "models": names,
+            "detections": result["detections"],
+            "image_size": "{}x{}".format(*source_size(img_pil)),
+            "timings_ms": {k: round(v, 2) for k, v in stages.items()},
+        },
+    }
+
+
+def _wire_model_info(model: str) -> dict:
+    from .registry import registry
+
+    clf = registry.get(model)
+    info = {"model": model, "code": wire.MODEL_IDS[model], "classes": clf.labels()}
+    if model == "word_landmarks":
+        info["feature_dim"] = landmarks.FEATURE_DIM
+    else:
+        info["img_size"] = clf.img_size
+        info["tta_views"] = TTA_VIEWS if model == "words" else 1
+    return info
+
+
+@app.get("/wire/classes/{model}")
+async def wire_classes(model: str):
+    """ما يحتاجه عميل /analyze_tensor: رمز النموذج، حجم القصّة أو طول متجه النقاط، وأسماء الأصناف بالترتيب"""
+    if model not in wire.MODEL_IDS:
+        raise HTTPException(status_code=404, detail=f"نموذج غير معروف: {model}")
+    if model == "word_landmarks" and not landmarks.available():
+        raise HTTPException(status_code=400, detail="محرك النقاط غير متاح (ملف النموذج غير موجود)")
+    return await run_in_threadpool(_wire_model_info, model)
+
+
+# حد جسم /analyze_tensor قبل قراءته: رأس + أقصى عدد عينات × أكبر عينة (قصة أو متجه نقاط float32)
+WIRE_MAX_BODY = wire.REQUEST_HEADER.size + wire.WIRE_MAX_SAMPLES * max(
+    wire.WIRE_MAX_TILE ** 2, landmarks.FEATURE_DIM * 4
+)
+
+
+async def read_body_capped(request: Request, max_bytes: int) -> bytes:
+    """جسم الطلب حتى max_bytes (413 من Content-Length أو أثناء القراءة بدون تخزين الباقي)"""
+    too_large = HTTPException(status_code=413, detail=f"حجم الطلب يتجاوز {max_bytes} بايت")
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > max_bytes:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise too_large
+    return bytes(body)
+
+
+@app.post("/analyze_tensor", responses={200: {"content": {wire.RESPONSE_MEDIA_TYPE: {}}}})
+async def analyze_tensor(request: Request):
+    """
+    تحليل بصيغة ثنائية مضغوطة (انظر wire.py): قصص رمادية جاهزة أو متجهات نقاط
+    - بدون فك صورة ولا كشف MediaPipe: مباشرة إلى session.run (دفعة واحدة لكل العينات)
+    - الرد ثنائي افتراضياً ، أو JSON بأسماء الأصناف مع Accept: application/json
+    """
+    data = await read_body_capped(request, WIRE_MAX_BODY)
+    try:
+        req = wire.decode_request(data)
+    except wire.WireFormatError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if req.model == "word_landmarks" and not landmarks.available():
+        raise HTTPException(status_code=400, detail="محرك النقاط غير متاح (ملف النموذج غير موجود)")
+
+    try:
+        (indices, confidences), stages = await inference_pool.run(
+            jobs.classify_tensor_job, req.model, req.samples, req.top_k, req.tta
+        )
+    except PoolSaturatedError:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ خطأ في تحليل الموترات: {e}")
+        raise HTTPException(status_code=500, detail=f"فشل التحليل: {str(e)}")
+    headers = {"Server-Timing": server_timing(stages)}
+
+    if "application/json" in request.headers.get("accept", ""):
+        labels = (await run_in_threadpool(_wire_model_info, req.model))["classes"]
+        results = [
+            [{"label": labels[int(i)], "confidence": float(c)} for i, c in zip(row_idx, row_conf)]
+            for row_idx, row_conf in zip(indices, confidences)
+        ]
+        return JSONResponse({"model": req.model, "results": results}, headers=headers)
+    return Response(wire.encode_response(req.model, indices, confidences), media_type=wire.RESPONSE_MEDIA_TYPE, headers=headers)
+
+
+async def _analyze_word_chunk(chunk: list, use_tta: bool) -> List[dict]:
+    """
+    تحليل جزء من الدفعة:
+    فك + كشف متوازٍ عبر مجمّع الاستدلال، ثم استدعاء ONNX واحد لكل الصور
+    """
+    limiter = asyncio.Semaphore(inference_pool.workers)
+
+    async def prepare(data: Optional[bytes]):
+        if data is None:
+            raise ValueError("ليس ملف صورة")
+        async with limiter:
+            result, _ = await inference_pool.run(jobs.prepare_word_job, data, use_tta)
+            return result
+
+    prepared = await asyncio.gather(*(prepare(data) for _, _, data in chunk), return_exceptions=True)
+    ok = [i for i, p in enumerate(prepared) if not isinstance(p, BaseException)]
+
+    predictions = {}
+    if ok:
+        # نسخ TTA لكل صورة متتالية داخل نفس الدفعة
+        views = TTA_VIEWS if use_tta else 1
+        x = np.concatenate([prepared[i]["x"] for i in ok], axis=0)
+        try:
+            batch, _ = await inference_pool.run(jobs.classify_word_batch_job, x, 3, views)
+            predictions = dict(zip(ok, batch))
+        except Exception as e:
+            # فشل الاستدعاء المشترك = خطأ لكل صورة دخلته (أخطاء الفك تبقى كما هي)
+            logger.error(f"❌ خطأ في تصنيف دفعة الكلمات: {e}")
+            for i in ok:
+                prepared[i] = e
+
+    results = []
+    for i, (idx, filename, _) in enumerate(chunk):
+        if i in predictions:
+            label, conf, top_k = predictions[i]
+            results.append({
+                "index": idx,
+                "filename": filename,
+                "label": label,
+                "confidence": float(conf),
+                "top_3": [
+                    {"label": lbl, "confidence": float(c)}
+                    for lbl, c in top_k
+                ],
+                "quality_ok": prepared[i]["quality_ok"]
+            })
+        else:
+            results.append({
+                "index": idx,
+                "filename": filename,
+                "error": str(prepared[i])
+            })
+    return results
+
+
+@app.post("/analyze_word_batch")
+async def analyze_word_batch(
+    images: List[UploadFile] = File(..., description="قائمة صور الكلمات"),
+    use_tta: bool = Form(False),
+):
+    """
+    تحليل دفعة من الكلمات (Batch Processing)
+    
+    **مفيد لـ:**
+    - رفع عدة صور دفعة واحدة
+    - معالجة مجموعات كبيرة
+    
+    **Limits:**
+    - الحد الأقصى MUBSER_BATCH_MAX_IMAGES صورة (افتراضياً 200)
+    
+    **Returns (NDJSON):**
+    - سطر لكل صورة بنفس ترتيب الرفع، ثم سطر أخير {"summary": ...}
+    """
+    if len(images) > BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"الحد الأقصى {BATCH_MAX_IMAGES} صورة")
+
+    # الملفات تُقرأ جزءاً جزءاً داخل البث (تبقى مفتوحة حتى نهاية الاستجابة)
+    # فلا تُحمَّل الدفعة كلها في الذاكرة قبل أول سطر
+    async def read_chunk(chunk: list) -> list:
+        entries = []
+        for idx, image in chunk:
+            if not image.content_type or not image.content_type.startswith("image/"):
+                entries.append((idx, image.filename, None))
+            else:
+                entries.append((idx, image.filename, await image.read()))
+        return entries
+
+    async def stream():
+        successful = failed = 0
+        indexed = list(enumerate(images))
+        for start in range(0, len(indexed), BATCH_CHUNK_SIZE):
+            chunk = indexed[start:start + BATCH_CHUNK_SIZE]
+            # الترويسة 200 أُرسلت: خطأ في الجزء (امتلاء المجمّع، ONNX) يصبح سطر خطأ لكل صورة فيه
+            try:
+                results = await _analyze_word_chunk(await read_chunk(chunk), use_tta)
+            except Exception as e:
+                logger.error(f"❌ خطأ في تحليل جزء من الدفعة: {e}")
+                results = [{"index": idx, "filename": image.filename, "error": str(e)} for idx, image in chunk]
+            for result in results:
+                if "error" in result:
+                    failed += 1
+                else:
+                    successful += 1
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+
+        yield json.dumps({
+            "summary": {
+                "total": len(images),
+                "successful": successful,
+                "failed": failed
+            }
+        }, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.websocket("/ws/analyze_word")
+async def analyze_word_stream(websocket: WebSocket, top_k: int = 5, smooth: bool = True):
+    """
+    تحليل كلمات من بث إطارات مستمر (WebSocket)
+    
+    - العميل يرسل كل إطار كرسالة ثنائية (JPEG/PNG)
+    - الخادم يرد برسالة JSON لكل إطار تمت معالجته
+    - إذا تأخرت المعالجة يُتخطّى ما تراكم من إطارات ويُعالج الأحدث فقط
+    - الإطار الساكن (بوابة الحركة) يعيد نتيجة آخر إطار محلَّل مع reused=true
+    - smooth: التسمية من متوسط احتمالات إطارات الجلسة مع temporal (stable/emitted)
+    """
+    try:
+        session = WordStreamSession()
+    except StreamLimitError:
+        await websocket.close(code=1013)
+        return
+    try:
+        try:
+            await inference_pool.run_local(jobs.open_stream_job, session)
+        except Exception as e:
+            logger.error(f"❌ تعذّر بدء جلسة البث: {e}")
+            session.close()
+            await websocket.close(code=1013)
+            return
+        await websocket.accept()
+    except BaseException:
+        # انقطاع أثناء المصافحة أو إلغاء الطلب: تحرير مكان الجلسة قبل الخروج
+        session.close()
+        raise
+
+    async def receive_frames():
+        try:
+            while True:
+                session.push(await websocket.receive_bytes())
+        except (WebSocketDisconnect, RuntimeError, KeyError):
+            pass
+        finally:
+            session.finish()
+
+    stream_id = f"ws-{id(session)}"
+    gate_key = session_key(stream_id, "words", top_k)
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            data = await session.next_frame()
+            if data is None:
+                break
+            try:
+                # رسم التتبع خاص بالجلسة: خيط من المجمّع (نفس الحد و503) وليس عملية
+                result, stages = await inference_pool.run_local(
+                    jobs.analyze_stream_frame_job, session.holistic, data, top_k, gate_key
+                )
+                label, conf, top = result["label"], result["confidence"], result["top_k"]
+                smoothed = None
+                if smooth and temporal_aggregator.enabled:
+                    smoothed = temporal_aggregator.update((stream_id, "words"), result["probs"])
+                    label, conf, top = jobs.format_probs("words", smoothed.probs, top_k)
+                message = {
+                    "frame": session.processed,
+                    "label": label,
+                    "confidence": float(conf),
+                    "top_k": [
+                        {"label": lbl, "confidence": float(c)}
+                        for lbl, c in top
+                    ],
+                    "reused": result["reused"],
+                    "stats": session.stats(),
+                    "timings_ms": {k: round(v, 2) for k, v in stages.items()},
+                }
+                if smoothed:
+                    message["temporal"] = smoothed.info()
+            except InvalidImageError as e:
+                message = {"frame": session.processed, "error": str(e)}
+            except Exception as e:
+                # امتلاء المجمّع أو فشل الاستدلال: الجلسة تستمر مع الإطار التالي
+                logger.error(f"❌ خطأ في إطار البث: {e}")
+                message = {"frame": session.processed, "error": str(e)}
+            await websocket.send_json(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        session.close()
+        motion_gate.drop(stream_id)
+        temporal_aggregator.reset(stream_id)
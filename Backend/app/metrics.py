@@ -0,0 +1,275 @@
+"""
+مقاييس بصيغة Prometheus (نص 0.0.4) بدون مكتبة خارجية
+- Counter / Gauge / Histogram بقيم في الذاكرة (قفل لكل مقياس، bisect للـ buckets)
+- stage("decode"): زمن مرحلة داخل الطلب → mubser_stage_seconds{stage}
+- collectors: دوال تقرأ عدّادات موجودة (الكاش، المجمّع، الطابور) عند /metrics فقط
+- الكلفة: perf_counter + قفل قصير لكل مرحلة (MUBSER_METRICS=0 يعطّل التسجيل)
+في وضع MUBSER_WORKER_MODE=process مراحل العمليات الفرعية تصل فقط عبر توقيتات jobs (mubser_job_stage_seconds)
+"""
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("MUBSER_METRICS", "1") == "1"
+# ثوانٍ: من 0.5ms (LUT/resize) إلى 10s (طلب كامل تحت الحمل)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _labels(self, values: Tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name + "_total", self._labels(labels), value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, self._labels(labels), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels → [عدد كل bucket (غير تراكمي) ..., +Inf] ، المجموع
+        self._counts: Dict[Tuple, List[int]] = {}
+        self._sums: Dict[Tuple, float] = {}
+
+    def observe(self, value: float, *labels):
+        if not METRICS_ENABLED:
+            return
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[i] += 1
+            self._sums[labels] += value
+
+    def time(self, *labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), self._sums[labels]) for labels, counts in self._counts.items()]
+        for labels, counts, total in items:
+            base = self._labels(labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield self.name + "_bucket", {**base, "le": _format_value(bound)}, cumulative
+            yield self.name + "_sum", base, total
+            yield self.name + "_count", base, cumulative
+
+
+class _Timer:
+    """with histogram.time(labels): ... (أخف من contextmanager لأنه بدون مولّد)"""
+
+    __slots__ = ("histogram", "labels", "t0")
+
+    def __init__(self, histogram: Histogram, labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.t0, *self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        # دالة → [(name, kind, help, [(labels, value)])]
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"مقياس مكرر: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def register_collector(self, fn: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        # نفس الاسم من عدة collectors (نموذجا الحروف والكلمات) = عائلة واحدة
+        families: Dict[str, Tuple[str, str, List[Sample]]] = {}
+        for collect in collectors:
+            try:
+                collected = list(collect())
+            except Exception:
+                # مصدر غير جاهز (نموذج لم يُحمَّل...) لا يُسقط /metrics
+                continue
+            for name, kind, help_text, samples in collected:
+                families.setdefault(name, (kind, help_text, []))[2].extend(samples)
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            suffix = "_total" if kind == "counter" else ""
+            for labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ==================== المقاييس المشتركة ====================
+
+STAGE_SECONDS = registry.histogram(
+    "mubser_stage_seconds", "Time spent in one processing stage", ("stage",)
+)
+JOB_STAGE_SECONDS = registry.histogram(
+    "mubser_job_stage_seconds", "Inference pool job timings (queue wait, stages, total)", ("job", "stage")
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "mubser_http_request_seconds", "HTTP request latency", ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = registry.gauge(
+    "mubser_http_requests_in_flight", "HTTP requests currently being served"
+)
+ONNX_RUN_SECONDS = registry.histogram(
+    "mubser_onnx_run_seconds", "ONNX session.run latency per (micro)batch", ("model",)
+)
+MODEL_ROWS = registry.counter(
+    "mubser_model_rows", "Input rows run through each model (TTA views count separately)", ("model",)
+)
+MODEL_PREDICTIONS = registry.counter(
+    "mubser_model_predictions", "Predictions returned by each model", ("model",)
+)
+CROPS = registry.counter(
+    "mubser_crops", "Crop box outcome per detector (hit, miss = fallback box, error)", ("detector", "result")
+)
+
+
+def stage(name: str) -> _Timer:
+    """with metrics.stage("decode"): ..."""
+    return _Timer(STAGE_SECONDS, (name,))
+
+
+def observe_job(job: str, timings: Dict[str, float]):
+    """توقيتات jobs (بالملي ثانية) → mubser_job_stage_seconds"""
+    for name, ms in timings.items():
+        JOB_STAGE_SECONDS.observe(ms / 1000.0, job, name)
+
+
+def stats_collector(prefix: str, source: Callable[[], dict], counters: Sequence[str] = (), gauges: Sequence[str] = (),
+                    labels: Optional[Dict[str, str]] = None):
+    """
+    يعرض مفاتيح رقمية من دالة stats() موجودة كمقاييس (تُقرأ عند /metrics فقط)
+    مثال: stats_collector("mubser_prediction_cache", prediction_cache.stats, counters=("hits", "misses"))
+    """
+    labels = labels or {}
+
+    def collect():
+        data = source()
+        if data is None:
+            return []
+        families = []
+        for key in counters:
+            families.append((f"{prefix}_{key}", "counter", f"{prefix} {key}", [(labels, float(data.get(key) or 0))]))
+        for key in gauges:
+            families.append((f"{prefix}_{key}", "gauge", f"{prefix} {key}", [(labels, float(data.get(key) or 0))]))
+        return families
+
+    return registry.register_collector(collect)
@@ -0,0 +1,83 @@
+"""
+ترحيل خفيف للمخطط عند الإقلاع (بدون Alembic)
+- create_all ينشئ الجداول الجديدة فقط ولا يعدّل الموجودة
+- هنا: إضافة الأعمدة الناقصة (القابلة لـ NULL أو بقيمة افتراضية) + الفهارس الناقصة
+- تعبئة predicted_label/confidence للسجلات القديمة من نص extracted_text
+- بناء جداول تجميع الإحصائيات (app.stats) إن كانت فارغة والصور موجودة
+"""
+import logging
+import re
+from typing import Optional, Tuple
+
+from sqlalchemy import inspect, select, text, update
+from sqlalchemy.schema import CreateColumn
+
+from .database import Base
+from .models import ImageItem
+from .stats import rebuild_stats, stats_missing
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH = 1000
+# نفس صيغة jobs.prediction_text: "L1 (ثقة: 16.19%)"
+_PREDICTION_TEXT = re.compile(r"^(?P<label>.+) \(ثقة: (?P<percent>[\d.]+)%\)$")
+
+
+def parse_prediction_text(value: Optional[str]) -> Tuple[Optional[str], Optional[float]]:
+    match = _PREDICTION_TEXT.match(value or "")
+    if not match:
+        return None, None
+    return match.group("label"), float(match.group("percent")) / 100.0
+
+
+def _add_missing_columns(conn, table) -> set:
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    added = set()
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        if not column.nullable and column.server_default is None:
+            logger.warning(f"⚠️ تخطي العمود {table.name}.{column.name}: غير قابل لـ NULL وبدون قيمة افتراضية")
+            continue
+        # الاسم + النوع + NOT NULL/DEFAULT كما في create_all
+        col_spec = CreateColumn(column).compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col_spec}"))
+        logger.info(f"✅ أُضيف العمود {table.name}.{column.name}")
+        added.add(column.name)
+    return added
+
+
+def _backfill_predictions(conn) -> int:
+    """تعبئة على دفعات (مرة واحدة عند إضافة العمود)"""
+    filled, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            select(ImageItem.id, ImageItem.extracted_text)
+            .where(ImageItem.id > last_id, ImageItem.extracted_text.is_not(None))
+            .order_by(ImageItem.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            return filled
+        for row_id, extracted in rows:
+            label, confidence = parse_prediction_text(extracted)
+            if label is not None:
+                conn.execute(
+                    update(ImageItem).where(ImageItem.id == row_id).values(predicted_label=label, confidence=confidence)
+                )
+                filled += 1
+        last_id = rows[-1][0]
+
+
+def upgrade_schema(engine):
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspect(conn).has_table(table.name):
+                continue
+            added = _add_missing_columns(conn, table)
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+            if table.name == ImageItem.__tablename__ and "predicted_label" in added:
+                logger.info(f"✅ تعبئة predicted_label لـ {_backfill_predictions(conn)} سجل")
+        if stats_missing(conn):
+            logger.info(f"✅ بناء إحصائيات الصور من {rebuild_stats(conn)} سجل")
@@ -1,16 +1,74 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
-from sqlalchemy.sql import func
-from .database import Base
-
-class ImageItem(Base):
-    __tablename__ = "image_items"
-
-    id = Column(Integer, primary_key=True, index=True)
-    filename = Column(String(255), nullable=False)
-    content_type = Column(String(100), nullable=False)
-    size_bytes = Column(Integer, nullable=False)
-    saved_path = Column(String(500), nullable=False)  # مسار الملف على القرص
-    notes = Column(Text, nullable=True)               # نص يجي من الواجهة (اختياري)
-    extracted_text = Column(Text, nullable=True)      # لاحقاً: نص ناتج نموذج/تعرف OCR
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
\ No newline at end of file
+from sqlalchemy import BigInteger, Column, Date, ForeignKey, Integer, String, Text, DateTime, Float, Index
+from sqlalchemy.sql import func
+from .database import Base
+
+class ImageItem(Base):
+    __tablename__ = "image_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    saved_path = Column(String(500), nullable=False)  # مسار الملف على القرص
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 (app.storage) - فارغ = ملف قديم خارج المخزن
+    notes = Column(Text, nullable=True)               # نص يجي من الواجهة (اختياري)
+    extracted_text = Column(Text, nullable=True)      # لاحقاً: نص ناتج نموذج/تعرف OCR
+    predicted_label = Column(String(255), nullable=True)  # التسمية الأولى (للفلترة بدل تحليل extracted_text)
+    confidence = Column(Float, nullable=True)
+    status = Column(String(20), nullable=False, server_default="done")  # pending → done/failed (وضع الإدخال async)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        # فلترة بالتاريخ (created_at تُضبط عند الإدراج فترتيبها = ترتيب id)
+        Index("ix_image_items_created_at_id", "created_at", "id"),
+        # فلترة بالتسمية + ترقيم بالمؤشر على id
+        Index("ix_image_items_predicted_label_id", "predicted_label", "id"),
+    )
+
+
+# تجميعات مُحدَّثة تدريجياً عند الإدراج/الحذف (app.stats) بدل مسح image_items في كل طلب
+class DailyImageStat(Base):
+    __tablename__ = "image_daily_stats"
+
+    day = Column(Date, primary_key=True)              # يوم created_at (UTC)
+    image_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+
+
+class LabelImageStat(Base):
+    __tablename__ = "image_label_stats"
+
+    day = Column(Date, primary_key=True)
+    label = Column(String(255), primary_key=True)
+    image_count = Column(Integer, nullable=False, default=0)
+
+
+# ملف واحد في مخزن المحتوى (app.storage) مهما تكرر رفعه
+class StoredFile(Base):
+    __tablename__ = "stored_files"
+
+    content_hash = Column(String(64), primary_key=True)   # sha256
+    path = Column(String(500), nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # عدد سجلات image_items التي تشير إليه
+
+
+# طابور الإدخال الدائم (app.ingest): صورة محفوظة تنتظر التنبؤ
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(Integer, primary_key=True)
+    image_id = Column(Integer, ForeignKey("image_items.id", ondelete="CASCADE"), nullable=False, unique=True)
+    kind = Column(String(20), nullable=False)                  # letters / words
+    status = Column(String(20), nullable=False, default="queued")  # queued / running / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    # أوقات UTC بدون منطقة تُضبط من بايثون (مقارنات متسقة على SQLite)
+    next_attempt_at = Column(DateTime, nullable=False)
+    locked_until = Column(DateTime, nullable=True)             # مهلة المعالجة (عامل توقف = يُستعاد بعدها)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_ingest_jobs_status_next_attempt_at", "status", "next_attempt_at"),
+    )
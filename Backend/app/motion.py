@@ -0,0 +1,160 @@
+"""
+بوابة الحركة لجلسات الكاميرا الحية (إطار كل N ثوانٍ سواء تحرّك المستخدم أم لا)
+- لكل (جلسة، نموذج، خيارات): صورة رمادية مصغّرة لآخر إطار تم تحليله + نتيجته
+- إطار جديد: متوسط الفرق المطلق مع تلك الصورة < MOTION_THRESHOLD → نفس النتيجة بدون Holistic/CNN
+- المقارنة دائماً مع آخر إطار "محلَّل" (وليس آخر إطار مستلم) حتى لا تتراكم حركة بطيئة بدون تحليل
+- الجلسات في LRU محدود مع TTL (العميل لا يُبلغ عن إغلاق الكاميرا)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional
+
+import numpy as np
+from PIL import Image
+
+MOTION_GATE = os.getenv("MUBSER_MOTION_GATE", "1") == "1"
+# متوسط |فرق| البكسل (0-255) على الصورة المصغّرة ؛ ضجيج الكاميرا الثابتة عادة < 1.5
+MOTION_THRESHOLD = float(os.getenv("MUBSER_MOTION_THRESHOLD", "3.0"))
+MOTION_THUMB_WIDTH = int(os.getenv("MUBSER_MOTION_THUMB_WIDTH", "32"))
+# أقصى عمر للنتيجة المعاد استخدامها (إعادة تحليل إلزامية بعده حتى لو بقي المشهد ساكناً)
+MOTION_MAX_REUSE_SECONDS = float(os.getenv("MUBSER_MOTION_MAX_REUSE_SECONDS", "30"))
+MOTION_SESSION_TTL_SECONDS = float(os.getenv("MUBSER_MOTION_SESSION_TTL_SECONDS", "120"))
+MOTION_MAX_SESSIONS = int(os.getenv("MUBSER_MOTION_MAX_SESSIONS", "1024"))
+# معرّف الجلسة يأتي من العميل
+SESSION_ID_MAX_LENGTH = 64
+
+
+def thumbnail(img: Image.Image, width: int = MOTION_THUMB_WIDTH) -> np.ndarray:
+    """رمادي (h,width) int16: reduce() بالصناديق أولاً ثم bilinear (~1ms لإطار 720p)"""
+    w, h = img.size
+    size = (width, max(1, round(width * h / w)))
+    return np.asarray(img.resize(size, Image.BILINEAR, reducing_gap=2.0).convert("L"), dtype=np.int16)
+
+
+def motion_score(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.abs(a - b).mean())
+
+
+@dataclass
+class GateCheck:
+    key: Hashable
+    thumb: np.ndarray
+    score: Optional[float]  # None: لا يوجد إطار سابق للمقارنة
+    reused: bool
+    value: Any
+    gate_ms: float
+
+
+class _Gate:
+    __slots__ = ("thumb", "value", "cost_ms", "analyzed_at", "seen_at")
+
+    def __init__(self, thumb: np.ndarray, value: Any, cost_ms: float, now: float):
+        self.thumb = thumb
+        self.value = value
+        self.cost_ms = cost_ms
+        self.analyzed_at = now
+        self.seen_at = now
+
+
+class SessionStore:
+    """
+    بوابات الجلسات (آمن للخيوط):
+    - check(key, img): يصغّر الإطار ويقارنه → GateCheck (reused=True مع النتيجة السابقة)
+    - update(check, value, cost_ms): بعد التحليل الكامل يصبح هذا الإطار مرجع الجلسة
+    - saved_ms: مجموع كلفة آخر تحليل كامل لكل إطار أُعيدت نتيجته (تقدير لما تم توفيره)
+    """
+
+    def __init__(
+        self,
+        enabled: bool = MOTION_GATE,
+        threshold: float = MOTION_THRESHOLD,
+        max_reuse_seconds: float = MOTION_MAX_REUSE_SECONDS,
+        ttl_seconds: float = MOTION_SESSION_TTL_SECONDS,
+        max_sessions: int = MOTION_MAX_SESSIONS,
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_reuse = max_reuse_seconds
+        self.ttl = ttl_seconds
+        self.max_sessions = max(1, max_sessions)
+
+        self._gates: "OrderedDict[Hashable, _Gate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0
+        self.expired = 0
+        self.saved_ms = 0.0
+        self.gate_ms = 0.0
+
+    def _evict(self, now: float):
+        # الأقدم استخداماً أولاً (move_to_end عند كل إطار)
+        while self._gates:
+            key, gate = next(iter(self._gates.items()))
+            if len(self._gates) <= self.max_sessions and now - gate.seen_at <= self.ttl:
+                break
+            del self._gates[key]
+            self.expired += 1
+
+    def check(self, key: Hashable, img: Image.Image) -> GateCheck:
+        t0 = time.perf_counter()
+        thumb = thumbnail(img)
+        now = time.monotonic()
+        reused, value, score = False, None, None
+        with self._lock:
+            self.frames += 1
+            gate = self._gates.get(key)
+            if gate is not None:
+                gate.seen_at = now
+                self._gates.move_to_end(key)
+                if gate.thumb.shape == thumb.shape:
+                    score = motion_score(thumb, gate.thumb)
+                    if score < self.threshold and now - gate.analyzed_at <= self.max_reuse:
+                        reused, value = True, gate.value
+                        self.skipped += 1
+                        self.saved_ms += gate.cost_ms
+            gate_ms = (time.perf_counter() - t0) * 1000.0
+            self.gate_ms += gate_ms
+        return GateCheck(key, thumb, score, reused, value, gate_ms)
+
+    def update(self, check: GateCheck, value: Any, cost_ms: float):
+        now = time.monotonic()
+        with self._lock:
+            self._gates[check.key] = _Gate(check.thumb, value, cost_ms, now)
+            self._gates.move_to_end(check.key)
+            self._evict(now)
+
+    def drop(self, session_id: str):
+        """حذف كل بوابات جلسة (نهاية بث WebSocket)"""
+        with self._lock:
+            for key in [k for k in self._gates if k[0] == session_id]:
+                del self._gates[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._evict(time.monotonic())
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "sessions": len({key[0] for key in self._gates}),
+                "frames": self.frames,
+                "analyzed": self.frames - self.skipped,
+                "skipped": self.skipped,
+                "skip_ratio": (self.skipped / self.frames) if self.frames else 0.0,
+                "saved_ms": round(self.saved_ms, 1),
+                "gate_ms": round(self.gate_ms, 1),
+                "expired": self.expired,
+            }
+
+
+def session_key(session_id: Optional[str], *scope: Hashable) -> Optional[tuple]:
+    """(session_id, النموذج، الخيارات) ؛ None = بدون بوابة (طلب مفرد أو البوابة معطّلة)"""
+    if not session_id or not motion_gate.enabled:
+        return None
+    return (session_id[:SESSION_ID_MAX_LENGTH],) + scope
+
+
+# مشترك بين /analyze و /analyze_word و /ws/analyze_word
+motion_gate = SessionStore()
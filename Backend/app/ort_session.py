@@ -0,0 +1,238 @@
+"""
+إنشاء جلسات ONNX Runtime بإعدادات قابلة للضبط
+- عدد الخيوط (intra/inter)، وضع التنفيذ، مستوى تحسين الرسم
+- حفظ الرسم المحسَّن على القرص (MUBSER_ORT_CACHE_DIR) حتى يتخطى التشغيل البارد إعادة التحسين
+- ضبط تلقائي اختياري: قياس عدة إعدادات خيوط على النموذج الفعلي واختيار الأسرع
+"""
+import hashlib
+import json
+import logging
+import os
+import platform
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import onnxruntime as ort
+
+logger = logging.getLogger(__name__)
+
+# 0 = افتراضي ORT ، وإلا عدد الخيوط لكل جلسة
+ORT_INTRA_THREADS = os.getenv("MUBSER_ORT_INTRA_THREADS", "")
+ORT_INTER_THREADS = int(os.getenv("MUBSER_ORT_INTER_THREADS", "1"))
+ORT_EXECUTION_MODE = os.getenv("MUBSER_ORT_EXECUTION_MODE", "sequential")   # sequential | parallel
+ORT_GRAPH_OPT = os.getenv("MUBSER_ORT_GRAPH_OPT", "all")                    # disable | basic | extended | all
+# مجلد الرسوم المحسّنة ونتائج الضبط (فارغ = تعطيل ، المسار النسبي بجانب ملف النموذج لا في مجلد التشغيل)
+ORT_CACHE_DIR = os.getenv("MUBSER_ORT_CACHE_DIR", "")
+ORT_AUTOTUNE = os.getenv("MUBSER_ORT_AUTOTUNE", "0") == "1"
+ORT_AUTOTUNE_RUNS = int(os.getenv("MUBSER_ORT_AUTOTUNE_RUNS", "20"))
+# نسخة النموذج: fp32 | int8 ... (فارغ = ما تحدده الميتاداتا في "variant")
+MODEL_VARIANT = os.getenv("MUBSER_MODEL_VARIANT", "")
+
+_GRAPH_OPT_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+_EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def _processes_per_host() -> int:
+    """عدد العمليات التي تحمل نسخة من الجلسة على نفس الجهاز"""
+    from .workers import WORKER_COUNT, WORKER_MODE
+
+    uvicorn_workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    per_worker = WORKER_COUNT if WORKER_MODE == "process" else 1
+    return max(1, uvicorn_workers * per_worker)
+
+
+def default_intra_threads() -> int:
+    """تقسيم الأنوية على العمليات بدلاً من أن تأخذ كل جلسة كل الأنوية"""
+    if ORT_INTRA_THREADS.strip():
+        return int(ORT_INTRA_THREADS)
+    return max(1, (os.cpu_count() or 1) // _processes_per_host())
+
+
+class SessionSettings:
+    """إعدادات جلسة واحدة (تُقرأ من البيئة افتراضياً)"""
+
+    def __init__(
+        self,
+        intra_threads: Optional[int] = None,
+        inter_threads: int = ORT_INTER_THREADS,
+        execution_mode: str = ORT_EXECUTION_MODE,
+        graph_opt: str = ORT_GRAPH_OPT,
+    ):
+        if execution_mode not in _EXECUTION_MODES:
+            raise ValueError(f"MUBSER_ORT_EXECUTION_MODE غير معروف: {execution_mode}")
+        if graph_opt not in _GRAPH_OPT_LEVELS:
+            raise ValueError(f"MUBSER_ORT_GRAPH_OPT غير معروف: {graph_opt}")
+        self.intra_threads = default_intra_threads() if intra_threads is None else intra_threads
+        self.inter_threads = inter_threads
+        self.execution_mode = execution_mode
+        self.graph_opt = graph_opt
+
+    def with_threads(self, intra_threads: int) -> "SessionSettings":
+        return SessionSettings(intra_threads, self.inter_threads, self.execution_mode, self.graph_opt)
+
+    def to_options(self) -> ort.SessionOptions:
+        so = ort.SessionOptions()
+        so.intra_op_num_threads = self.intra_threads
+        so.inter_op_num_threads = self.inter_threads
+        so.execution_mode = _EXECUTION_MODES[self.execution_mode]
+        so.graph_optimization_level = _GRAPH_OPT_LEVELS[self.graph_opt]
+        return so
+
+    def as_dict(self) -> dict:
+        return {
+            "intra_threads": self.intra_threads,
+            "inter_threads": self.inter_threads,
+            "execution_mode": self.execution_mode,
+            "graph_opt": self.graph_opt,
+        }
+
+
+def resolve_variant(model_path, meta: dict, variant: str = MODEL_VARIANT) -> Tuple[Path, str]:
+    """
+    اختيار ملف النموذج حسب الميتاداتا:
+        "variant": "int8",
+        "variants": {"int8": {"file": "Mubser_model.int8.onnx", ...}}
+    النسخ تُضاف للميتاداتا فقط بعد اجتياز بوابة الدقة (scripts/quantize_models.py)
+    """
+    model_path = Path(model_path)
+    variant = variant or meta.get("variant") or "fp32"
+    if variant == "fp32":
+        return model_path, variant
+    entry = (meta.get("variants") or {}).get(variant)
+    if not entry:
+        logger.warning(f"⚠️ النسخة '{variant}' غير موجودة في ميتاداتا {model_path.name} - استخدام fp32")
+        return model_path, "fp32"
+    return model_path.parent / entry["file"], variant
+
+
+def _model_fingerprint(model_path: Path, graph_opt: str) -> str:
+    """
+    الرسم المحسَّن قد يعتمد على المعالج وإصدار ORT
+    لذلك المفتاح = محتوى النموذج + المستوى + الإصدار + المعمارية
+    """
+    h = hashlib.blake2b(digest_size=8)
+    with model_path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    h.update(f"{graph_opt}:{ort.__version__}:{platform.machine()}".encode())
+    return h.hexdigest()
+
+
+def _cache_paths(model_path: Path, graph_opt: str) -> Optional[Tuple[Path, Path]]:
+    if not ORT_CACHE_DIR:
+        return None
+    cache_dir = model_path.parent / ORT_CACHE_DIR  # المسار المطلق يبقى كما هو
+    key = f"{model_path.stem}.{_model_fingerprint(model_path, graph_opt)}"
+    return cache_dir / f"{key}.opt.onnx", cache_dir / f"{key}.tune.json"
+
+
+def _build(model_path: Path, settings: SessionSettings, providers: Sequence[str],
+           optimized_path: Optional[Path]) -> Tuple[ort.InferenceSession, bool]:
+    """يرجّع (الجلسة، هل حُمّلت من الرسم المحسَّن المحفوظ)"""
+    so = settings.to_options()
+    if optimized_path is not None and optimized_path.exists():
+        # الرسم محسَّن مسبقاً - لا داعي لإعادة التحسين
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            return ort.InferenceSession(str(optimized_path), sess_options=so, providers=list(providers)), True
+        except Exception as e:
+            logger.warning(f"⚠️ تجاهل الرسم المحسَّن التالف '{optimized_path}': {e}")
+            optimized_path.unlink(missing_ok=True)
+            so.graph_optimization_level = _GRAPH_OPT_LEVELS[settings.graph_opt]
+
+    tmp_path = None
+    if optimized_path is not None and settings.graph_opt != "disable":
+        optimized_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = optimized_path.with_suffix(f".{os.getpid()}.tmp")
+        so.optimized_model_filepath = str(tmp_path)
+
+    session = ort.InferenceSession(str(model_path), sess_options=so, providers=list(providers))
+    if tmp_path is not None and tmp_path.exists():
+        os.replace(tmp_path, optimized_path)  # كتابة ذرية (عدة عمّال قد يكتبون معاً)
+        logger.info(f"✅ حُفظ الرسم المحسَّن: {optimized_path}")
+    return session, False
+
+
+def _benchmark(session: ort.InferenceSession, sample: np.ndarray, runs: int) -> float:
+    """وسيط زمن الاستدلال بالملي ثانية"""
+    input_name = session.get_inputs()[0].name
+    for _ in range(3):
+        session.run(None, {input_name: sample})
+    times = []
+    for _ in range(max(1, runs)):
+        t0 = time.perf_counter()
+        session.run(None, {input_name: sample})
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return float(np.median(times))
+
+
+def _thread_candidates(limit: int) -> List[int]:
+    cpus = os.cpu_count() or 1
+    return sorted({n for n in (1, 2, 4, limit, cpus) if 1 <= n <= cpus})
+
+
+def autotune(model_path: Path, settings: SessionSettings, providers: Sequence[str],
+             sample: np.ndarray, optimized_path: Optional[Path], runs: int = ORT_AUTOTUNE_RUNS) -> Dict:
+    """قياس عدة قيم intra_threads على النموذج الفعلي واختيار الأسرع"""
+    results = {}
+    for n in _thread_candidates(settings.intra_threads):
+        session, _ = _build(model_path, settings.with_threads(n), providers, optimized_path)
+        results[n] = _benchmark(session, sample, runs)
+        logger.info(f"⏱️ {model_path.name}: intra_threads={n} → {results[n]:.2f}ms")
+    best = min(results, key=results.get)
+    return {"intra_threads": best, "results_ms": {str(k): round(v, 3) for k, v in results.items()}}
+
+
+def create_session(
+    model_path,
+    providers: Optional[Sequence[str]] = None,
+    settings: Optional[SessionSettings] = None,
+    sample_shape: Optional[Tuple[int, ...]] = None,
+) -> Tuple[ort.InferenceSession, dict]:
+    """
+    ينشئ جلسة ONNX بإعدادات البيئة
+    - sample_shape: شكل إدخال تجريبي للضبط التلقائي (MUBSER_ORT_AUTOTUNE=1)
+    يرجّع: (الجلسة، وصف الإعدادات المستخدمة)
+    """
+    model_path = Path(model_path)
+    providers = list(providers or ["CPUExecutionProvider"])
+    settings = settings or SessionSettings()
+    paths = _cache_paths(model_path, settings.graph_opt)
+    optimized_path, tune_path = paths if paths else (None, None)
+
+    tuning = None
+    if ORT_AUTOTUNE and sample_shape is not None:
+        if tune_path is not None and tune_path.exists():
+            tuning = json.loads(tune_path.read_text(encoding="utf-8"))
+            tuning["cached"] = True
+        else:
+            sample = np.random.default_rng(0).random(sample_shape, dtype=np.float32)
+            tuning = autotune(model_path, settings, providers, sample, optimized_path)
+            if tune_path is not None:
+                tune_path.parent.mkdir(parents=True, exist_ok=True)
+                tune_path.write_text(json.dumps(tuning), encoding="utf-8")
+            tuning["cached"] = False
+        settings = settings.with_threads(int(tuning["intra_threads"]))
+
+    t0 = time.perf_counter()
+    session, from_cache = _build(model_path, settings, providers, optimized_path)
+    info = {
+        **settings.as_dict(),
+        "providers": providers,
+        "optimized_cache": str(optimized_path) if optimized_path else None,
+        "optimized_cache_hit": from_cache,
+        "create_ms": round((time.perf_counter() - t0) * 1000.0, 2),
+        "autotune": tuning,
+    }
+    logger.info(f"✅ جلسة ONNX '{model_path.name}': {settings.as_dict()}")
+    return session, info
@@ -0,0 +1,459 @@
+"""
+إطار مشترك لنماذج التصنيف (الحروف + الكلمات + النقاط المفتاحية)
+- OnnxClassifier: ميتاداتا + جلسة ONNX + مُجمِّع دفعات + softmax/top-k/mapping في مكان واحد
+- سجلات المراحل: كواشف MediaPipe ، صناديق القص ، طرق تغيير الحجم ، دوال التنبؤ على إطار
+- Frame: إطار واحد تُحسب نتائج الكشف عليه مرة واحدة وتُشارك بين النماذج
+- landmark_cache: نتائج الكشف لآخر الإطارات (المفتاح = hash البكسلات + اسم الكاشف)
+- إعدادات المعالجة لكل نموذج تُقرأ من "pipeline" في ملف .meta.json
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .batching import BATCH_MAX_SIZE, MicroBatcher
+from . import metrics
+from .cache import pixel_hash
+from .ort_session import create_session, resolve_variant
+
+logger = logging.getLogger(__name__)
+
+LANDMARK_CACHE_SIZE = int(os.getenv("MUBSER_LANDMARK_CACHE_SIZE", "256"))
+
+Box = Tuple[int, int, int, int]
+Prediction = Tuple[str, float, List[Tuple[str, float]]]
+
+# =====================================================
+#                 سجلات المراحل
+# =====================================================
+
+# اسم الكاشف -> دالة (Frame) -> نتيجة MediaPipe
+DETECTORS: Dict[str, Callable[["Frame"], Any]] = {}
+# اسم الصندوق -> دالة (نتيجة الكشف، w، h، pad) -> صندوق أو None
+BOXES: Dict[str, Callable[[Any, int, int, int], Optional[Box]]] = {}
+# اسم النموذج -> دالة (Frame، top_k) -> (label, confidence, top_k_list)
+FRAME_PREDICTORS: Dict[str, Callable[["Frame", int], Prediction]] = {}
+
+
+def _registrar(table: Dict[str, Callable], name: str):
+    def decorator(fn: Callable) -> Callable:
+        table[name] = fn
+        return fn
+    return decorator
+
+
+def register_detector(name: str):
+    return _registrar(DETECTORS, name)
+
+
+def register_box(name: str):
+    return _registrar(BOXES, name)
+
+
+def register_predictor(name: str):
+    return _registrar(FRAME_PREDICTORS, name)
+
+
+def _resize_cv2(interpolation: int):
+    def resize(gray: np.ndarray, size: int, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        return cv2.resize(gray, (size, size), dst=dst, interpolation=interpolation)
+    return resize
+
+
+def _resize_pil(resample):
+    def resize(gray: np.ndarray, size: int, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        out = np.asarray(Image.fromarray(gray).resize((size, size), resample))
+        if dst is None:
+            return out
+        dst[...] = out
+        return dst
+    return resize
+
+
+# طرق تغيير حجم القصّة الرمادية (area = cv2 ، الباقي نفس نتائج PIL)
+RESIZERS: Dict[str, Callable[..., np.ndarray]] = {
+    "area": _resize_cv2(cv2.INTER_AREA),
+    "bilinear": _resize_cv2(cv2.INTER_LINEAR),
+    "bicubic": _resize_pil(Image.BICUBIC),
+    "lanczos": _resize_pil(Image.LANCZOS),
+}
+
+FALLBACKS = ("full", "center")
+
+
+def downscale(rgb: np.ndarray, max_size: Optional[int]) -> np.ndarray:
+    """تصغير الإطار (أطول ضلع = max_size) لتسريع MediaPipe ؛ None = بدون تصغير"""
+    h, w = rgb.shape[:2]
+    if not max_size or max(w, h) <= max_size:
+        return rgb
+    scale = max_size / max(w, h)
+    return cv2.resize(rgb, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+def center_box(w: int, h: int) -> Box:
+    """قص مركزي (3/4 الضلع الأقصر)"""
+    center_x, center_y = w // 2, h // 2
+    crop_size = min(w, h) * 3 // 4
+    x1 = max(0, center_x - crop_size // 2)
+    y1 = max(0, center_y - crop_size // 2)
+    return x1, y1, min(w, x1 + crop_size), min(h, y1 + crop_size)
+
+
+class PipelineConfig:
+    """
+    إعدادات المعالجة لنموذج واحد - من "pipeline" في الميتاداتا (وإلا افتراضيات النموذج):
+        "pipeline": {"detector": "holistic", "box": "union", "pad": 20, "max_size": 640,
+                     "detect_size": 640, "enhance": true, "resize": "area", "fallback": "center"}
+    - max_size: أطول ضلع للإطار الذي يُقص منه ، detect_size: أطول ضلع لنسخة الكاشف
+      (الصندوق من نقاط مُطبّعة ، فيُطبَّق على إطار القص مباشرة) ؛ None = نفس max_size
+    """
+
+    KEYS = ("detector", "box", "pad", "max_size", "detect_size", "enhance", "resize", "fallback")
+
+    def __init__(
+        self,
+        detector: str,
+        box: str,
+        pad: int = 20,
+        max_size: Optional[int] = None,
+        detect_size: Optional[int] = None,
+        enhance: bool = False,
+        resize: str = "area",
+        fallback: str = "full",
+    ):
+        if resize not in RESIZERS:
+            raise ValueError(f"pipeline.resize غير معروف: {resize}")
+        if fallback not in FALLBACKS:
+            raise ValueError(f"pipeline.fallback غير معروف: {fallback}")
+        self.detector = detector
+        self.box = box
+        self.pad = int(pad)
+        self.max_size = int(max_size) if max_size else None
+        self.detect_size = int(detect_size) if detect_size else None
+        self.enhance = bool(enhance)
+        self.resize = resize
+        self.fallback = fallback
+
+    @classmethod
+    def from_meta(cls, meta: dict, defaults: dict) -> "PipelineConfig":
+        overrides = meta.get("pipeline") or {}
+        unknown = set(overrides) - set(cls.KEYS)
+        if unknown:
+            raise ValueError(f"مفاتيح pipeline غير معروفة: {sorted(unknown)}")
+        return cls(**{**defaults, **overrides})
+
+    @property
+    def detection_size(self) -> Optional[int]:
+        return self.detect_size or self.max_size
+
+    def as_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.KEYS}
+
+
+# =====================================================
+#         كاش نتائج الكشف + الإطار المشترك
+# =====================================================
+
+class LandmarkCache:
+    """
+    LRU لنتائج MediaPipe (بدون TTL: الكشف لا يعتمد على إصدار المصنّف)
+    - المفتاح: (hash البكسلات، اسم الكاشف)
+    """
+
+    def __init__(self, max_entries: int = LANDMARK_CACHE_SIZE):
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+landmark_cache = LandmarkCache()
+
+
+class Frame:
+    """
+    إطار واحد + ما حُسب عليه (نسخ مصغّرة، نتائج الكشف)
+    - shared=True: النماذج تستخدم نتيجة Holistic واحدة (يد الحروف تُشتق منها)
+      حتى يعمل الكشف مرة واحدة عند تشغيل أكثر من نموذج على نفس الإطار
+    """
+
+    def __init__(self, image: Union[Image.Image, np.ndarray], shared: bool = False):
+        if isinstance(image, Image.Image):
+            self.image: Optional[Image.Image] = image
+            self.rgb = np.asarray(image if image.mode == "RGB" else image.convert("RGB"))
+        else:
+            self.image = None
+            self.rgb = np.ascontiguousarray(image)
+        self.shared = shared
+        self.detections_run = 0
+        self._key: Optional[str] = None
+        self._resized: Dict[Optional[int], np.ndarray] = {}
+        self._results: Dict[str, Any] = {}
+
+    @property
+    def key(self) -> str:
+        if self._key is None:
+            if self.image is not None:
+                self._key = pixel_hash(self.image)
+            else:
+                self._key = pixel_hash(Image.fromarray(self.rgb))
+        return self._key
+
+    def resized(self, max_size: Optional[int]) -> np.ndarray:
+        if max_size not in self._resized:
+            with metrics.stage("downscale"):
+                self._resized[max_size] = downscale(self.rgb, max_size)
+        return self._resized[max_size]
+
+    def cached(self, detector: str) -> Any:
+        """نتيجة كاشف محسوبة مسبقاً على هذا الإطار (بدون تشغيله)"""
+        return self._results.get(detector)
+
+    def detect(self, detector: str) -> Any:
+        if detector in self._results:
+            return self._results[detector]
+        if detector not in DETECTORS:
+            raise KeyError(f"كاشف غير معروف: {detector}")
+
+        key = (self.key, detector) if landmark_cache.enabled else None
+        found, result = landmark_cache.get(key) if key is not None else (False, None)
+        if not found:
+            with metrics.stage(f"detect_{detector}"):
+                result = DETECTORS[detector](self)
+            # النتائج المشتقة (يد من Holistic) لا تُحسب كشفاً ولا تُخزَّن في الكاش العام
+            if not getattr(result, "derived", False):
+                self.detections_run += 1
+                if key is not None:
+                    landmark_cache.put(key, result)
+        self._results[detector] = result
+        return result
+
+    def locate(self, config: PipelineConfig) -> Tuple[np.ndarray, Box]:
+        """
+        الصورة التي يُقص منها (حسب max_size) + صندوق القص من كاشف النموذج
+        - بدون نتيجة: fallback من الإعدادات ، خطأ في الكشف: الإطار كاملاً
+        """
+        rgb = self.resized(config.max_size)
+        h, w = rgb.shape[:2]
+        try:
+            box = BOXES[config.box](self.detect(config.detector), w, h, config.pad)
+        except Exception as e:
+            logger.error(f"❌ خطأ في القص ({config.detector}/{config.box}): {e}")
+            metrics.CROPS.inc(config.detector, "error")
+            return rgb, (0, 0, w, h)
+        if box is None:
+            metrics.CROPS.inc(config.detector, "miss")
+            box = center_box(w, h) if config.fallback == "center" else (0, 0, w, h)
+        else:
+            metrics.CROPS.inc(config.detector, "hit")
+        return rgb, box
+
+
+class HandsFromHolistic:
+    """
+    واجهة نتيجة Hands (multi_hand_landmarks) مشتقة من نتيجة Holistic
+    - اليد الأكبر في الإطار (Hands بـ max_num_hands=1 يرجّع اليد الأوضح)
+    """
+
+    derived = True
+
+    def __init__(self, res):
+        hands = [h for h in (res.left_hand_landmarks, res.right_hand_landmarks) if h]
+        hands.sort(key=self._extent, reverse=True)
+        self.multi_hand_landmarks = hands[:1] or None
+
+    @staticmethod
+    def _extent(hand) -> float:
+        xs = [lm.x for lm in hand.landmark]
+        ys = [lm.y for lm in hand.landmark]
+        return (max(xs) - min(xs)) * (max(ys) - min(ys))
+
+
+# =====================================================
+#            softmax / top-k / mapping المشتركة
+# =====================================================
+
+def softmax(z: np.ndarray) -> np.ndarray:
+    """softmax على المحور الأخير (يعمل لصف واحد أو دفعة كاملة)"""
+    z = z - np.max(z, axis=-1, keepdims=True)
+    ez = np.exp(z)
+    return ez / np.sum(ez, axis=-1, keepdims=True)
+
+
+def top_k_indices(probs: np.ndarray, k: int) -> np.ndarray:
+    """
+    أعلى k لكل صف بشكل متجهي
+    - probs شكلها (N,C) ، المخرج (N,k) مرتب تنازلياً
+    """
+    part = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(probs, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+def format_prediction(
+    probs: np.ndarray, top_indices: np.ndarray, classes: Sequence[str], label_mapping: Optional[dict] = None
+) -> Prediction:
+    """
+    (label, confidence, top_k_list) لصف واحد
+    - label_mapping: إن وُجدت ترجمة للتسمية الأولى تُرفق بها وبكل top_k ("W1 | كلمة")
+    """
+    top_idx = int(top_indices[0])
+    top_label = classes[top_idx]
+    top_conf = float(probs[top_idx])
+    top_k_list = [(classes[i], float(probs[i])) for i in top_indices]
+
+    if label_mapping and top_label in label_mapping:
+        top_label = f"{top_label} | {label_mapping[top_label]}"
+        top_k_list = [
+            (f"{lbl} | {label_mapping[lbl]}" if lbl in label_mapping else lbl, p) for lbl, p in top_k_list
+        ]
+    return top_label, top_conf, top_k_list
+
+
+def load_meta(meta_path: Union[str, Path]) -> dict:
+    with Path(meta_path).open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class OnnxClassifier:
+    """
+    أساس نماذج التصنيف: ميتاداتا + جلسة ONNX + مُجمِّع دفعات
+    - الصنف الفرعي يحدد name و batcher_name و default_pipeline (و sample_shape إن لزم)
+    """
+
+    name = "model"
+    batcher_name = "model"
+    default_pipeline: dict = {}
+
+    def __init__(self, model_path: Union[str, Path], meta_path: Union[str, Path], providers: Optional[List[str]] = None):
+        # ================= الميتاداتا =================
+        try:
+            self.meta = load_meta(meta_path)
+            self.classes: List[str] = self.meta["classes"]
+            self.img_size: int = int(self.meta.get("img_size", 64))
+            # اختياري: تطبيع (إذا موجود في الميتاداتا)
+            norm = self.meta.get("normalize") or {}
+            self.norm_mean: Optional[List[float]] = norm.get("mean")
+            self.norm_std: Optional[List[float]] = norm.get("std")
+            # اختياري: mapping لتحويل اللابل لعرض عربي/إنجليزي
+            self.label_mapping: dict = self.meta.get("mapping") or {}
+            self.config = PipelineConfig.from_meta(self.meta, self.default_pipeline) if self.default_pipeline else None
+            logger.info(f"✅ [{self.name}] تم تحميل {len(self.classes)} صنف من الميتاداتا")
+        except Exception as e:
+            logger.error(f"❌ [{self.name}] خطأ في تحميل الميتاداتا '{meta_path}': {e}")
+            raise
+
+        # ================= جلسة ONNX =================
+        try:
+            # fp32 أو نسخة مكمّمة (int8) حسب الميتاداتا / MUBSER_MODEL_VARIANT
+            model_path, self.variant = resolve_variant(model_path, self.meta)
+            self.session, self.session_info = create_session(model_path, providers, sample_shape=self.sample_shape())
+            self.input_name = self.session.get_inputs()[0].name
+            self.output_names = [o.name for o in self.session.get_outputs()]
+            self.output_name = self.output_names[0]
+            logger.info(f"✅ [{self.name}] تم تحميل النموذج ({self.variant})")
+        except Exception as e:
+            logger.error(f"❌ [{self.name}] خطأ في تحميل النموذج: {e}")
+            raise
+
+        self.model_id = Path(model_path).name  # مفتاح الكاش لهذا النموذج
+        # تجميع الطلبات المتزامنة في دفعة واحدة
+        self.batcher = MicroBatcher(self._run_session, name=self.batcher_name)
+
+    def sample_shape(self) -> Tuple[int, ...]:
+        """شكل إدخال تجريبي للضبط التلقائي (MUBSER_ORT_AUTOTUNE=1)"""
+        return BATCH_MAX_SIZE, 1, self.img_size, self.img_size
+
+    def _run_session(self, x: np.ndarray) -> np.ndarray:
+        metrics.MODEL_ROWS.inc(self.name, amount=x.shape[0])
+        with metrics.ONNX_RUN_SECONDS.time(self.name):
+            return self.session.run([self.output_name], {self.input_name: x})[0]
+
+    def normalize(self, x: np.ndarray) -> np.ndarray:
+        """Normalize من الميتاداتا (اختياري) - في نفس المصفوفة ، x بقيم [0..1]"""
+        if self.norm_mean and self.norm_std:
+            mean = float(self.norm_mean[0])
+            std = float(self.norm_std[0]) if float(self.norm_std[0]) != 0 else 1.0
+            x -= mean
+            x /= std
+        return x
+
+    def to_input(self, gray: np.ndarray) -> np.ndarray:
+        """قصّة رمادية uint8 (H,W) → إدخال (1,1,S,S) حسب resize/normalize النموذج"""
+        with metrics.stage("resize"):
+            resized = RESIZERS[self.config.resize](gray, self.img_size)
+        x = np.empty((1, 1, self.img_size, self.img_size), dtype=np.float32)
+        np.multiply(resized, np.float32(1.0 / 255.0), out=x[0, 0])
+        return self.normalize(x)
+
+    def probs(self, x: np.ndarray, views: int = 1) -> np.ndarray:
+        """احتمالات (N,C) لدفعة (N*views,...) - متوسط النسخ عند views > 1"""
+        probs = softmax(self.batcher.submit(x))
+        if views > 1:
+            probs = probs.reshape(-1, views, probs.shape[-1]).mean(axis=1)
+        metrics.MODEL_PREDICTIONS.inc(self.name, amount=probs.shape[0])
+        return probs
+
+    def labels(self, mapped: bool = True) -> List[str]:
+        """أسماء الأصناف بترتيب المخرجات (بنفس صيغة format_prediction: "W1 | كلمة")"""
+        mapping = self.label_mapping if mapped else {}
+        return [f"{c} | {mapping[c]}" if c in mapping else c for c in self.classes]
+
+    def format_top_k(self, probs: np.ndarray, top_k: int, mapped: bool = True) -> List[Prediction]:
+        """probs (N,C) → (label, confidence, top_k_list) لكل صف"""
+        k = int(max(1, min(top_k, probs.shape[-1])))
+        indices = top_k_indices(probs, k)
+        mapping = self.label_mapping if mapped else None
+        return [format_prediction(probs[i], indices[i], self.classes, mapping) for i in range(probs.shape[0])]
+
+    def classify(self, x: np.ndarray, top_k: int = 5, views: int = 1, mapped: bool = True) -> List[Prediction]:
+        """تصنيف دفعة جاهزة في استدعاء session.run واحد (عبر مُجمِّع الدفعات)"""
+        return self.format_top_k(self.probs(x, views=views), top_k, mapped=mapped)
+
+    def close(self):
+        if hasattr(self, "batcher"):
+            self.batcher.close()
@@ -0,0 +1,241 @@
+"""
+سجل النماذج: تحميل كسول + مجمّع كواشف MediaPipe لكل نموذج
+- النموذج (ONNX + الميتاداتا) يُحمَّل مرة واحدة عند أول استخدام
+- كواشف MediaPipe (غير آمنة للخيوط) تُعار من مجمّع بحجم N حتى لا تتسلسل الخيوط على رسم واحد
+- warmup اختياري عند بدء التشغيل + حالة الجاهزية لـ /ready
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# مجلد ملفات النماذج (الافتراضي: مجلد التشغيل كما في السابق)
+MODEL_DIR = Path(os.getenv("MUBSER_MODEL_DIR", "."))
+DETECTOR_POOL_SIZE = int(os.getenv("MUBSER_DETECTOR_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+# نماذج تُحمَّل عند بدء التشغيل: "letters,words" أو "all" (فارغ = تحميل كسول فقط)
+WARMUP_MODELS = os.getenv("MUBSER_WARMUP", "")
+
+
+class ModelEntry:
+    """نموذج واحد في السجل"""
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        detector_factory: Optional[Callable[[], Any]] = None,
+        pool_size: int = DETECTOR_POOL_SIZE,
+        warmup: Optional[Callable[[Any], None]] = None,
+        optional: bool = False,
+    ):
+        self.name = name
+        self.loader = loader
+        self.detector_factory = detector_factory
+        self.pool_size = max(1, pool_size)
+        self.warmup_fn = warmup
+        # نموذج اختياري: غيابه لا يؤثر على /ready ولا يدخل في MUBSER_WARMUP=all
+        self.optional = optional
+
+        self._model: Any = None
+        self._load_lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.warmed = False
+
+        self._pool: "queue.LifoQueue" = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def get(self) -> Any:
+        if self._model is not None:
+            return self._model
+        with self._load_lock:
+            if self._model is None:
+                t0 = time.perf_counter()
+                try:
+                    self._model = self.loader()
+                except Exception as e:
+                    self.error = str(e)
+                    logger.error(f"❌ فشل تحميل النموذج '{self.name}': {e}")
+                    raise
+                self.load_seconds = time.perf_counter() - t0
+                self.error = None
+                logger.info(f"✅ تم تحميل '{self.name}' خلال {self.load_seconds:.2f}s")
+        return self._model
+
+    @contextmanager
+    def detector(self):
+        """استعارة كاشف من المجمّع (يُنشأ عند الحاجة حتى pool_size ثم ننتظر)"""
+        if self.detector_factory is None:
+            raise RuntimeError(f"النموذج '{self.name}' بدون كاشف")
+
+        det = None
+        try:
+            det = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                if self._created < self.pool_size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    det = self.detector_factory()
+                except Exception:
+                    with self._pool_lock:
+                        self._created -= 1
+                    raise
+            else:
+                det = self._pool.get()
+
+        with self._pool_lock:
+            self._in_use += 1
+        try:
+            yield det
+        finally:
+            with self._pool_lock:
+                self._in_use -= 1
+            self._pool.put(det)
+
+    def warmup(self):
+        """تحميل النموذج + إنشاء كل الكواشف + استدلال تجريبي"""
+        model = self.get()
+        if self.detector_factory is not None:
+            # نستعير pool_size كاشفاً في نفس الوقت حتى يُنشأ المجمّع بالكامل
+            with ExitStack() as stack:
+                for _ in range(self.pool_size):
+                    stack.enter_context(self.detector())
+        if self.warmup_fn is not None:
+            self.warmup_fn(model)
+        self.warmed = True
+
+    def close(self):
+        """إغلاق الكواشف وإسقاط النموذج (لإعادة التحميل)"""
+        with self._load_lock:
+            self._model = None
+            self.warmed = False
+        while True:
+            try:
+                det = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            with self._pool_lock:
+                self._created -= 1
+            try:
+                det.close()
+            except Exception:
+                pass
+
+    def status(self) -> dict:
+        with self._pool_lock:
+            pool = {"size": self.pool_size, "created": self._created, "in_use": self._in_use}
+        return {
+            "loaded": self.loaded,
+            "optional": self.optional,
+            "warmed": self.warmed,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "error": self.error,
+            "variant": getattr(self._model, "variant", None),
+            "session": getattr(self._model, "session_info", None),
+            "detectors": pool if self.detector_factory is not None else None,
+        }
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._entries: Dict[str, ModelEntry] = {}
+        self._warmup_targets: List[str] = []
+        self._warmup_error: Optional[str] = None
+
+    def register(self, name: str, loader: Callable[[], Any], **kwargs) -> ModelEntry:
+        entry = ModelEntry(name, loader, **kwargs)
+        self._entries[name] = entry
+        return entry
+
+    def entry(self, name: str) -> ModelEntry:
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"نموذج غير مسجّل: {name}")
+
+    def get(self, name: str) -> Any:
+        return self.entry(name).get()
+
+    def detector(self, name: str):
+        return self.entry(name).detector()
+
+    def names(self) -> List[str]:
+        return list(self._entries)
+
+    def warmup(self, names: Optional[Iterable[str]] = None):
+        if names is None:
+            names = [n for n, e in self._entries.items() if not e.optional]
+        targets = list(names)
+        self._warmup_targets = targets
+        for name in targets:
+            try:
+                self.entry(name).warmup()
+            except Exception as e:
+                self._warmup_error = f"{name}: {e}"
+                logger.error(f"❌ فشل تسخين '{name}': {e}")
+
+    def start_warmup(self, names: Iterable[str]) -> threading.Thread:
+        """تسخين في الخلفية حتى لا يتأخر بدء الخادم - /ready يرجّع 503 حتى ينتهي"""
+        self._warmup_targets = list(names)
+        thread = threading.Thread(
+            target=self.warmup, args=(self._warmup_targets,), name="model-warmup", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def reload(self, name: str):
+        """إسقاط النموذج ليُعاد تحميله عند الاستخدام التالي + مسح الكاش الخاص به"""
+        from .cache import prediction_cache
+
+        entry = self.entry(name)
+        model = entry._model
+        entry.close()
+        if model is None:
+            return
+        if hasattr(model, "close"):
+            model.close()
+        prediction_cache.invalidate(getattr(model, "model_id", None) or name)
+
+    def ready(self) -> bool:
+        """جاهز = نماذج التسخين محمّلة ولا يوجد نموذج فشل تحميله"""
+        if any(e.error and not e.optional for e in self._entries.values()):
+            return False
+        return all(self._entries[n].warmed for n in self._warmup_targets if n in self._entries)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready(),
+            "warmup": self._warmup_targets,
+            "warmup_error": self._warmup_error,
+            "models": {name: e.status() for name, e in self._entries.items()},
+        }
+
+
+def warmup_targets(spec: str = WARMUP_MODELS) -> Optional[List[str]]:
+    """تحويل MUBSER_WARMUP إلى قائمة أسماء (None = لا تسخين)"""
+    spec = spec.strip()
+    if not spec:
+        return None
+    if spec == "all":
+        return [name for name in registry.names() if not registry.entry(name).optional]
+    return [s.strip() for s in spec.split(",") if s.strip()]
+
+
+registry = ModelRegistry()
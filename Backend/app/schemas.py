@@ -1,31 +1,43 @@
-from pydantic import BaseModel, Field
-from typing import Optional
-from datetime import datetime
-
-class ImageBase(BaseModel):
-    notes: Optional[str] = Field(None, description="نص مرتبط بالصورة (اختياري)")
-
-class ImageOut(BaseModel):
-    id: int
-    filename: str
-    content_type: str
-    size_bytes: int
-    saved_path: str
-    notes: Optional[str] = None
-    extracted_text: Optional[str] = None
-    created_at: datetime
-    updated_at: datetime    
-
-    class Config:
-        from_attributes = True
-
-class AnalyzeResponse(BaseModel):
-    label: str
-    confidence: float
-    text: str
-
-
-
-class AnalyzeBase64Request(BaseModel):
-    image_b64: str  # data URL أو Base64 خام
-    filename: str | None = None
\ No newline at end of file
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+class ImageBase(BaseModel):
+    notes: Optional[str] = Field(None, description="نص مرتبط بالصورة (اختياري)")
+
+class ImageOut(BaseModel):
+    id: int
+    filename: str
+    content_type: str
+    size_bytes: int
+    saved_path: str
+    notes: Optional[str] = None
+    extracted_text: Optional[str] = None
+    predicted_label: Optional[str] = None
+    confidence: Optional[float] = None
+    status: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime    
+
+    class Config:
+        from_attributes = True
+
+class AnalyzeResponse(BaseModel):
+    label: str
+    confidence: float
+    text: str
+    # جلسة حية مع التجميع الزمني فقط
+    stable: Optional[bool] = None
+    emitted: Optional[bool] = None
+
+
+
+class AnalyzeBase64Request(BaseModel):
+    image_b64: str  # data URL أو Base64 خام
+    filename: str | None = None
+    session_id: Optional[str] = Field(None, max_length=64, description="معرّف جلسة الكاميرا الحية")
+    smooth: bool = True
+
+class AnalyzeWordBase64Request(AnalyzeBase64Request):
+    use_tta: bool = False
+    engine: Optional[str] = Field(None, description="cnn | landmarks | cascade (الافتراضي MUBSER_WORD_ENGINE)")
\ No newline at end of file
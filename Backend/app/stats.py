@@ -0,0 +1,215 @@
+"""
+إحصائيات الصور المحفوظة من جداول تجميع (بدل COUNT/GROUP BY/SUM على كل image_items)
+- عدّادات يومية (عدد + حجم) وعدّادات لكل تسمية في اليوم
+- تُحدَّث داخل نفس المعاملة عبر أحداث ImageItem (after_insert / after_update / after_delete)
+  والكاش يُفرَّغ بعد commit الجلسة فقط (قبلها قد يُخزَّن طلب متزامن المجاميع القديمة)
+  الحذف/الإدراج الجماعي (Core بدون ORM) لا يمر بالأحداث → rebuild_stats
+- الاستعلام يقرأ صفوف الأيام المطلوبة فقط: O(عدد الأيام) وليس O(عدد الصور)
+- كاش TTL قصير اختياري للنتيجة (MUBSER_STATS_CACHE_TTL_SECONDS، 0 = بدون)
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+
+from .database import increment
+from .models import DailyImageStat, ImageItem, LabelImageStat
+
+logger = logging.getLogger(__name__)
+
+STATS_CACHE_TTL_SECONDS = float(os.getenv("MUBSER_STATS_CACHE_TTL_SECONDS", "5"))
+STATS_CACHE_MAX_ENTRIES = 128
+REBUILD_BATCH = 5000
+
+_daily = DailyImageStat.__table__
+_labels = LabelImageStat.__table__
+
+
+def utc_day(value: Optional[datetime]) -> date:
+    """يوم الصورة بتوقيت UTC (SQLite يرجّع وقتاً بدون منطقة وهو UTC أصلاً)"""
+    if value is None:
+        return datetime.now(timezone.utc).date()
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+def _mark_dirty(target: ImageItem):
+    session = object_session(target)
+    if session is not None:
+        session.info["stats_dirty"] = True
+
+
+def _apply(conn, day: date, label: Optional[str], size_bytes: int, sign: int):
+    increment(conn, _daily, {"day": day}, {"image_count": sign, "total_bytes": sign * (size_bytes or 0)})
+    if label:
+        increment(conn, _labels, {"day": day, "label": label}, {"image_count": sign})
+
+
+@event.listens_for(ImageItem, "after_insert")
+def _on_insert(mapper, conn, target: ImageItem):
+    # created_at من server_default: قراءته بالمفتاح الأساسي (نفس اليوم الذي سيُحذف منه لاحقاً)
+    created = conn.execute(select(ImageItem.created_at).where(ImageItem.id == target.id)).scalar()
+    _apply(conn, utc_day(created), target.predicted_label, target.size_bytes, +1)
+    _mark_dirty(target)
+
+
+@event.listens_for(ImageItem, "after_update")
+def _on_update(mapper, conn, target: ImageItem):
+    # التسمية تُملأ لاحقاً في وضع الإدخال async (app.ingest)
+    history = inspect(target).attrs.predicted_label.history
+    if not history.has_changes():
+        return
+    day = utc_day(target.created_at)
+    for old in history.deleted:
+        if old:
+            increment(conn, _labels, {"day": day, "label": old}, {"image_count": -1})
+    for new in history.added:
+        if new:
+            increment(conn, _labels, {"day": day, "label": new}, {"image_count": 1})
+    _mark_dirty(target)
+
+
+@event.listens_for(ImageItem, "after_delete")
+def _on_delete(mapper, conn, target: ImageItem):
+    _apply(conn, utc_day(target.created_at), target.predicted_label, target.size_bytes, -1)
+    _mark_dirty(target)
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session: Session):
+    # الجلسات غير المتزامنة تمر بنفس الحدث (AsyncSession تغلّف Session)
+    if session.info.pop("stats_dirty", False):
+        stats_cache.clear()
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session: Session):
+    session.info.pop("stats_dirty", None)
+
+
+def rebuild_stats(conn) -> int:
+    """إعادة بناء التجميعات من image_items (مرة واحدة: قاعدة قديمة أو بعد تعديل جماعي)"""
+    daily: Dict[date, list] = {}
+    labels: Dict[Tuple[date, str], int] = {}
+    scanned, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            select(ImageItem.id, ImageItem.created_at, ImageItem.size_bytes, ImageItem.predicted_label)
+            .where(ImageItem.id > last_id)
+            .order_by(ImageItem.id)
+            .limit(REBUILD_BATCH)
+        ).all()
+        if not rows:
+            break
+        for _, created, size_bytes, label in rows:
+            day = utc_day(created)
+            counters = daily.setdefault(day, [0, 0])
+            counters[0] += 1
+            counters[1] += size_bytes or 0
+            if label:
+                labels[(day, label)] = labels.get((day, label), 0) + 1
+        scanned += len(rows)
+        last_id = rows[-1][0]
+
+    conn.execute(delete(_labels))
+    conn.execute(delete(_daily))
+    if daily:
+        conn.execute(insert(_daily), [
+            {"day": day, "image_count": count, "total_bytes": size} for day, (count, size) in daily.items()
+        ])
+    if labels:
+        conn.execute(insert(_labels), [
+            {"day": day, "label": label, "image_count": count} for (day, label), count in labels.items()
+        ])
+    stats_cache.clear()
+    return scanned
+
+
+def stats_missing(conn) -> bool:
+    """جداول التجميع فارغة بينما توجد صور (أُنشئت للتو على قاعدة قديمة)"""
+    has_stats = conn.execute(select(_daily.c.day).limit(1)).first() is not None
+    has_images = conn.execute(select(ImageItem.id).limit(1)).first() is not None
+    return has_images and not has_stats
+
+
+class StatsCache:
+    """كاش TTL صغير لنتائج الإحصائيات (مفتاحه النطاق المطلوب)"""
+
+    def __init__(self, ttl_seconds: float = STATS_CACHE_TTL_SECONDS, max_entries: int = STATS_CACHE_MAX_ENTRIES):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[dict]:
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            return entry[1]
+
+    def put(self, key: Tuple, value: dict):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """كتابة في هذه العملية = نتائج قديمة (العمليات الأخرى تنتظر انتهاء TTL)"""
+        with self._lock:
+            self._entries.clear()
+
+
+stats_cache = StatsCache()
+
+
+async def image_stats(db: AsyncSession, date_from: Optional[date] = None, date_to: Optional[date] = None) -> dict:
+    """إحصائيات الأيام [date_from, date_to] (شاملة) من جداول التجميع"""
+    key = (date_from, date_to)
+    cached = stats_cache.get(key)
+    if cached is not None:
+        return cached
+
+    daily_query = select(_daily.c.day, _daily.c.image_count, _daily.c.total_bytes).where(_daily.c.image_count > 0)
+    label_count = func.sum(_labels.c.image_count)
+    label_query = select(_labels.c.label, label_count)
+    if date_from is not None:
+        daily_query = daily_query.where(_daily.c.day >= date_from)
+        label_query = label_query.where(_labels.c.day >= date_from)
+    if date_to is not None:
+        daily_query = daily_query.where(_daily.c.day <= date_to)
+        label_query = label_query.where(_labels.c.day <= date_to)
+    label_query = label_query.group_by(_labels.c.label).having(label_count > 0).order_by(label_count.desc(), _labels.c.label)
+
+    daily = (await db.execute(daily_query.order_by(_daily.c.day))).all()
+    labels = (await db.execute(label_query)).all()
+
+    total_size = sum(size for _, _, size in daily)
+    result = {
+        "total_images": sum(count for _, count, _ in daily),
+        "total_size_mb": round(total_size / (1024 * 1024), 2),
+        "daily_stats": [
+            {"date": str(day), "count": count, "size_mb": round(size / (1024 * 1024), 2)}
+            for day, count, size in daily
+        ],
+        "labels": [{"label": label, "count": count} for label, count in labels],
+        "range": {"from": str(date_from) if date_from else None, "to": str(date_to) if date_to else None},
+    }
+    stats_cache.put(key, result)
+    return result
@@ -0,0 +1,172 @@
+"""
+مخزن الصور المرفوعة حسب المحتوى (content-addressed)
+- المسار: UPLOAD_DIR/ab/cd/<sha256><ext> (مجلدان من أول الـ hash بدل مجلد واحد ضخم)
+- الكتابة: ملف مؤقت في UPLOAD_DIR/.tmp (نفس نظام الملفات) ثم os.replace (ذري، بدون name_1 name_2 ...)
+- إزالة التكرار: صف لكل محتوى في stored_files مع ref_count، الرفع المتكرر = نفس الملف
+- الرفع: وضع الملف بعد تعديل ref_count وقبل commit (مع قفل الكتابة)، وعند فشل commit
+  يُحذف الملف إن لم يبقَ له صف (remove_if_unreferenced)
+- الحذف: لا يُحذف الملف إلا بعد commit الحذف، وبعد التأكد مجدداً (مع قفل الكتابة) أن
+  رفعاً متزامناً لنفس المحتوى لم يُنشئ الصف من جديد
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import uuid
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+from PIL import Image
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import metrics
+from .database import increment
+from .models import StoredFile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+HASH_CHUNK_SIZE = 1024 * 1024
+_EXTENSION = re.compile(r"^\.[a-z0-9]{1,5}$")
+
+
+class InvalidUploadError(ValueError):
+    """الملف المرفوع ليس صورة صالحة"""
+
+
+@dataclass
+class StagedFile:
+    """ملف مؤقت محسوب الـ hash ينتظر الإضافة للمخزن"""
+    temp_path: str
+    content_hash: str
+    size_bytes: int
+    extension: str
+
+
+def blob_path(content_hash: str, extension: str = "", root: str = UPLOAD_DIR) -> str:
+    return os.path.join(root, content_hash[:2], content_hash[2:4], content_hash + extension)
+
+
+def file_extension(filename: Optional[str]) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if _EXTENSION.match(ext) else ""
+
+
+def hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def stage_upload(source: BinaryIO, filename: Optional[str], root: str = UPLOAD_DIR) -> StagedFile:
+    """نسخ الرفع إلى ملف مؤقت مع حساب sha256 + التحقق من الصورة (InvalidUploadError)"""
+    tmp_dir = os.path.join(root, ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    temp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with metrics.stage("upload_write"), open(temp_path, "wb") as out:
+            for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+                h.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        discard(temp_path)
+        raise
+    try:
+        with metrics.stage("upload_verify"), Image.open(temp_path) as im:
+            im.verify()
+    except Exception as e:
+        discard(temp_path)
+        raise InvalidUploadError("ملف صورة غير صالح") from e
+    return StagedFile(temp_path, h.hexdigest(), size, file_extension(filename))
+
+
+def discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def place(source_path: str, dest_path: str, move: bool = True):
+    """وضع الملف في مساره النهائي إن لم يكن موجوداً (move=False: ربط/نسخ مع إبقاء المصدر)"""
+    if os.path.exists(dest_path):
+        if move:
+            discard(source_path)
+        return
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    if move:
+        os.replace(source_path, dest_path)
+        return
+    temp_path = os.path.join(os.path.dirname(dest_path), f".{uuid.uuid4().hex}")
+    try:
+        os.link(source_path, temp_path)
+    except OSError:
+        shutil.copy2(source_path, temp_path)
+    os.replace(temp_path, dest_path)
+
+
+def _acquire_sync(session, content_hash: str, path: str, size_bytes: int) -> str:
+    """ref_count += 1 (أو إنشاء الصف) ويرجّع مسار الملف المعتمد لهذا المحتوى"""
+    conn = session.connection()
+    increment(
+        conn, StoredFile.__table__, {"content_hash": content_hash}, {"ref_count": 1},
+        defaults={"path": path, "size_bytes": size_bytes},
+    )
+    return conn.execute(select(StoredFile.path).where(StoredFile.content_hash == content_hash)).scalar_one()
+
+
+async def commit_upload(db: AsyncSession, staged: StagedFile, root: str = UPLOAD_DIR) -> str:
+    """
+    إضافة الملف المؤقت للمخزن داخل معاملة db (قبل commit) - يرجّع saved_path
+    محتوى موجود مسبقاً: يُحذف الملف المؤقت ويُعاد المسار الموجود
+    """
+    path = await db.run_sync(
+        _acquire_sync, staged.content_hash, blob_path(staged.content_hash, staged.extension, root), staged.size_bytes
+    )
+    place(staged.temp_path, path)
+    return path
+
+
+async def release(db: AsyncSession, content_hash: str) -> Optional[str]:
+    """
+    ref_count -= 1 ، وعند الصفر: حذف الصف (داخل معاملة db) ويرجّع مسار الملف
+    الملف نفسه يُحذف بعد commit عبر remove_if_unreferenced
+    """
+    await db.execute(
+        update(StoredFile).where(StoredFile.content_hash == content_hash).values(ref_count=StoredFile.ref_count - 1)
+    )
+    row = (await db.execute(
+        select(StoredFile.ref_count, StoredFile.path).where(StoredFile.content_hash == content_hash)
+    )).first()
+    if row is not None and row.ref_count <= 0:
+        await db.execute(delete(StoredFile).where(StoredFile.content_hash == content_hash))
+        return row.path
+    return None
+
+
+async def remove_if_unreferenced(db: AsyncSession, content_hash: str, path: str):
+    """
+    حذف ملف المحتوى إن لم يعد له صف في stored_files (بعد commit الحذف أو rollback الرفع)
+    - الكتابة الأولى تأخذ قفل الكتابة حتى commit، فلا يُنشئ رفعٌ متزامن الصف بين الفحص والحذف
+    - الفشل هنا لا يُفشل الطلب: يبقى ملف يتيم فقط
+    """
+    try:
+        await db.execute(
+            delete(StoredFile).where(StoredFile.content_hash == content_hash, StoredFile.ref_count <= 0)
+        )
+        row = (await db.execute(
+            select(StoredFile.content_hash).where(StoredFile.content_hash == content_hash)
+        )).first()
+        if row is None:
+            discard(path)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.warning(f"⚠️ تعذّر تنظيف الملف {path}: {e}")
@@ -0,0 +1,95 @@
+"""
+جلسات بث الإطارات (WebSocket) للتعرّف على الكلمات
+- كل جلسة تملك رسم Holistic بوضع التتبع (بدون كشف كامل لكل إطار)
+- نحتفظ بآخر إطار فقط: إذا تأخر خط المعالجة تُتخطّى الإطارات القديمة
+"""
+import asyncio
+import os
+import threading
+from typing import Optional
+
+# الحد الأقصى لجلسات البث المتزامنة (لكل عامل uvicorn)
+STREAM_MAX_SESSIONS = int(os.getenv("MUBSER_STREAM_MAX_SESSIONS", "8"))
+
+_active = 0
+_active_lock = threading.Lock()
+
+
+class StreamLimitError(RuntimeError):
+    """تم بلوغ الحد الأقصى لجلسات البث"""
+
+
+class WordStreamSession:
+    """
+    جلسة بث واحدة:
+    - push(): يستبدل الإطار المنتظر (ويحسب المُتخطّى)
+    - next_frame(): ينتظر أحدث إطار، يرجّع None عند انتهاء الجلسة
+    """
+
+    def __init__(self):
+        global _active
+        with _active_lock:
+            if _active >= STREAM_MAX_SESSIONS:
+                raise StreamLimitError("عدد جلسات البث وصل للحد الأقصى")
+            _active += 1
+
+        # رسم Holistic يُبنى في open() داخل مجمّع الاستدلال (بناؤه بطيء ولا يُشغَّل في حلقة الأحداث)
+        self.holistic = None
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self._latest: Optional[bytes] = None
+        self._event = asyncio.Event()
+        self._finished = False
+        self._closed = False
+
+    def open(self):
+        from .Model_Word import new_tracking_holistic
+
+        self.holistic = new_tracking_holistic()
+
+    def push(self, data: bytes):
+        self.received += 1
+        if self._latest is not None:
+            self.dropped += 1
+        self._latest = data
+        self._event.set()
+
+    def finish(self):
+        """العميل انقطع - لا مزيد من الإطارات"""
+        self._finished = True
+        self._event.set()
+
+    async def next_frame(self) -> Optional[bytes]:
+        while self._latest is None:
+            if self._finished:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        data, self._latest = self._latest, None
+        self.processed += 1
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+        }
+
+    def close(self):
+        global _active
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self.holistic is not None:
+                self.holistic.close()
+        except Exception:
+            pass
+        with _active_lock:
+            _active -= 1
+
+
+def active_sessions() -> int:
+    return _active
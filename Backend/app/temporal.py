@@ -0,0 +1,133 @@
+"""
+تجميع زمني لاحتمالات إطارات الكاميرا الحية (بديل رخيص لـ TTA)
+- الإطارات المتتالية من نفس الجلسة = عدة "نسخ" حقيقية لنفس الإشارة
+- متوسط أسّي (EMA) لمتجه softmax كامل لكل (جلسة، نموذج): probs = α·جديد + (1-α)·سابق
+- الاستقرار: نفس الصنف الأعلى في آخر TEMPORAL_STABLE_FRAMES إطارات وثقته ≥ TEMPORAL_STABLE_CONFIDENCE
+  emitted=True مرة واحدة عند استقرار تسمية جديدة (لإضافة الكلمة إلى النص المترجم)
+- الحالة: متجه C عدد عشري لكل جلسة ، LRU محدود + حذف بعد خمول TTL
+يُشغَّل في العملية الرئيسية (الجلسات مشتركة بين عمّال المجمّع في وضع process)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable, Optional
+
+import numpy as np
+
+TEMPORAL_SMOOTHING = os.getenv("MUBSER_TEMPORAL", "1") == "1"
+# وزن الإطار الجديد: 0.5 ≈ أثر آخر 3-4 إطارات
+TEMPORAL_ALPHA = float(os.getenv("MUBSER_TEMPORAL_ALPHA", "0.5"))
+TEMPORAL_STABLE_FRAMES = int(os.getenv("MUBSER_TEMPORAL_STABLE_FRAMES", "3"))
+TEMPORAL_STABLE_CONFIDENCE = float(os.getenv("MUBSER_TEMPORAL_STABLE_CONFIDENCE", "0.5"))
+# خمول أطول من هذا = إشارة جديدة (الحالة السابقة لا تُخلط بها)
+TEMPORAL_IDLE_SECONDS = float(os.getenv("MUBSER_TEMPORAL_IDLE_SECONDS", "30"))
+TEMPORAL_MAX_SESSIONS = int(os.getenv("MUBSER_TEMPORAL_MAX_SESSIONS", "1024"))
+
+
+@dataclass
+class Smoothed:
+    probs: np.ndarray  # (C,) نسخة من المتوسط بعد هذا الإطار
+    top: int
+    frames: int  # عدد الإطارات في المتوسط
+    streak: int  # عدد الإطارات المتتالية بنفس الصنف الأعلى
+    stable: bool
+    emitted: bool
+
+    def info(self) -> dict:
+        return {"frames": self.frames, "streak": self.streak, "stable": self.stable, "emitted": self.emitted}
+
+
+class _State:
+    __slots__ = ("probs", "frames", "top", "streak", "emitted_top", "seen_at")
+
+    def __init__(self, probs: np.ndarray, now: float):
+        self.probs = np.array(probs, dtype=np.float32)
+        self.frames = 1
+        self.top = int(self.probs.argmax())
+        self.streak = 1
+        self.emitted_top: Optional[int] = None
+        self.seen_at = now
+
+
+class TemporalAggregator:
+    """update(key, probs) → Smoothed (آمن للخيوط)"""
+
+    def __init__(
+        self,
+        enabled: bool = TEMPORAL_SMOOTHING,
+        alpha: float = TEMPORAL_ALPHA,
+        stable_frames: int = TEMPORAL_STABLE_FRAMES,
+        stable_confidence: float = TEMPORAL_STABLE_CONFIDENCE,
+        idle_seconds: float = TEMPORAL_IDLE_SECONDS,
+        max_sessions: int = TEMPORAL_MAX_SESSIONS,
+    ):
+        self.enabled = enabled
+        self.alpha = min(1.0, max(0.0, alpha))
+        self.stable_frames = max(1, stable_frames)
+        self.stable_confidence = stable_confidence
+        self.idle = idle_seconds
+        self.max_sessions = max(1, max_sessions)
+
+        self._states: "OrderedDict[Hashable, _State]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.emitted = 0
+        self.evicted = 0
+
+    def _evict(self, now: float):
+        while self._states:
+            key, state = next(iter(self._states.items()))
+            if len(self._states) <= self.max_sessions and now - state.seen_at <= self.idle:
+                break
+            del self._states[key]
+            self.evicted += 1
+
+    def update(self, key: Hashable, probs: np.ndarray) -> Smoothed:
+        now = time.monotonic()
+        with self._lock:
+            self.updates += 1
+            state = self._states.get(key)
+            if state is None or now - state.seen_at > self.idle or state.probs.shape != probs.shape:
+                state = self._states[key] = _State(probs, now)
+            else:
+                state.probs *= 1.0 - self.alpha
+                state.probs += self.alpha * probs
+                state.frames += 1
+                state.seen_at = now
+                top = int(state.probs.argmax())
+                state.streak = state.streak + 1 if top == state.top else 1
+                state.top = top
+            self._states.move_to_end(key)
+            self._evict(now)
+
+            stable = bool(state.streak >= self.stable_frames and state.probs[state.top] >= self.stable_confidence)
+            emitted = stable and state.emitted_top != state.top
+            if emitted:
+                state.emitted_top = state.top
+                self.emitted += 1
+            return Smoothed(state.probs.copy(), state.top, state.frames, state.streak, stable, emitted)
+
+    def reset(self, session_id: str):
+        """حذف حالة كل نماذج الجلسة (نهاية بث WebSocket)"""
+        with self._lock:
+            for key in [k for k in self._states if k[0] == session_id]:
+                del self._states[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._evict(time.monotonic())
+            return {
+                "enabled": self.enabled,
+                "alpha": self.alpha,
+                "stable_frames": self.stable_frames,
+                "stable_confidence": self.stable_confidence,
+                "sessions": len(self._states),
+                "updates": self.updates,
+                "emitted": self.emitted,
+                "evicted": self.evicted,
+            }
+
+
+temporal_aggregator = TemporalAggregator()
@@ -0,0 +1,127 @@
+"""
+صيغة ثنائية مضغوطة لـ POST /analyze_tensor (عملاء يكشفون ويقصّون محلياً)
+بدل JPEG للإطار كاملاً: قصّة رمادية جاهزة بحجم img_size أو متجه نقاط مفتاحية → session.run مباشرة
+
+الطلب (little-endian):
+  رأس 12 بايت: magic "MBT" | version u8 | model u8 | payload u8 | top_k u8 | flags u8 | count u16 | dim u16
+  - model:   1 = letters ، 2 = words ، 3 = word_landmarks
+  - payload: 1 = uint8 (count × dim × dim) قصّة رمادية قبل /255 والتطبيع
+             2 = float32 (count × dim) خصائص landmarks.landmark_features
+             3 = float16 (count × dim)
+  - flags:   bit0 = TTA (قصص الكلمات فقط)
+  ثم count عينة متتالية (دفعة واحدة = استدعاء ONNX واحد)
+
+الرد (application/x-mubser-result):
+  رأس 8 بايت: magic "MBR" | version u8 | model u8 | k u8 | count u16
+  ثم لكل عينة k × (class u16 ، confidence f32) مرتبة تنازلياً
+  أسماء الأصناف وحجم الإدخال: GET /wire/classes/{model} (مرة واحدة عند بدء العميل)
+"""
+import os
+import struct
+from dataclasses import dataclass
+
+import numpy as np
+
+WIRE_VERSION = 1
+REQUEST_MAGIC = b"MBT"
+RESPONSE_MAGIC = b"MBR"
+REQUEST_HEADER = struct.Struct("<3sBBBBBHH")
+RESPONSE_HEADER = struct.Struct("<3sBBBH")
+REQUEST_MEDIA_TYPE = "application/x-mubser-tensor"
+RESPONSE_MEDIA_TYPE = "application/x-mubser-result"
+
+WIRE_MAX_SAMPLES = int(os.getenv("MUBSER_WIRE_MAX_SAMPLES", "64"))
+# أكبر ضلع لقصة (≥ img_size لكل النماذج) - مع WIRE_MAX_SAMPLES يحدد أقصى حجم للجسم
+WIRE_MAX_TILE = int(os.getenv("MUBSER_WIRE_MAX_TILE", "128"))
+
+MODEL_CODES = {1: "letters", 2: "words", 3: "word_landmarks"}
+MODEL_IDS = {name: code for code, name in MODEL_CODES.items()}
+
+PAYLOAD_TILE = 1
+PAYLOAD_FLOAT32 = 2
+PAYLOAD_FLOAT16 = 3
+_PAYLOAD_DTYPES = {PAYLOAD_TILE: np.uint8, PAYLOAD_FLOAT32: np.dtype("<f4"), PAYLOAD_FLOAT16: np.dtype("<f2")}
+
+FLAG_TTA = 0x01
+
+_ENTRY = np.dtype([("cls", "<u2"), ("conf", "<f4")])
+
+
+class WireFormatError(ValueError):
+    """رأس أو حجم غير صالح في الطلب الثنائي"""
+
+
+@dataclass
+class TensorRequest:
+    model: str
+    payload: int
+    top_k: int
+    tta: bool
+    samples: np.ndarray  # (N,dim,dim) uint8 أو (N,dim) float32
+
+    @property
+    def is_tile(self) -> bool:
+        return self.payload == PAYLOAD_TILE
+
+
+def decode_request(data: bytes, max_samples: int = WIRE_MAX_SAMPLES) -> TensorRequest:
+    if len(data) < REQUEST_HEADER.size:
+        raise WireFormatError("الطلب أقصر من الرأس")
+    magic, version, model, payload, top_k, flags, count, dim = REQUEST_HEADER.unpack_from(data)
+    if magic != REQUEST_MAGIC:
+        raise WireFormatError("magic غير صحيح")
+    if version != WIRE_VERSION:
+        raise WireFormatError(f"إصدار غير مدعوم: {version}")
+    if model not in MODEL_CODES:
+        raise WireFormatError(f"نموذج غير معروف: {model}")
+    if payload not in _PAYLOAD_DTYPES:
+        raise WireFormatError(f"نوع حمولة غير معروف: {payload}")
+    if not 1 <= count <= max_samples:
+        raise WireFormatError(f"عدد العينات يجب أن يكون بين 1 و {max_samples}")
+    if dim == 0:
+        raise WireFormatError("dim = 0")
+    if payload == PAYLOAD_TILE and dim > WIRE_MAX_TILE:
+        raise WireFormatError(f"القصة أكبر من {WIRE_MAX_TILE}x{WIRE_MAX_TILE}")
+
+    dtype = np.dtype(_PAYLOAD_DTYPES[payload])
+    shape = (count, dim, dim) if payload == PAYLOAD_TILE else (count, dim)
+    expected = REQUEST_HEADER.size + int(np.prod(shape)) * dtype.itemsize
+    if len(data) != expected:
+        raise WireFormatError(f"حجم الحمولة {len(data)} بايت (المتوقع {expected})")
+
+    samples = np.frombuffer(data, dtype=dtype, offset=REQUEST_HEADER.size).reshape(shape)
+    if payload != PAYLOAD_TILE:
+        samples = samples.astype(np.float32)
+    return TensorRequest(MODEL_CODES[model], payload, max(1, top_k), bool(flags & FLAG_TTA), samples)
+
+
+def encode_request(model: str, samples: np.ndarray, top_k: int = 5, tta: bool = False) -> bytes:
+    """للعملاء والاختبارات: uint8 (N,S,S) → قصص ، float (N,D) → نقاط float32"""
+    samples = np.asarray(samples)
+    if samples.dtype == np.uint8:
+        payload, dim = PAYLOAD_TILE, samples.shape[-1]
+    elif samples.dtype == np.float16:
+        payload, dim = PAYLOAD_FLOAT16, samples.shape[-1]
+    else:
+        payload, dim, samples = PAYLOAD_FLOAT32, samples.shape[-1], samples.astype("<f4")
+    header = REQUEST_HEADER.pack(
+        REQUEST_MAGIC, WIRE_VERSION, MODEL_IDS[model], payload, top_k, FLAG_TTA if tta else 0, samples.shape[0], dim
+    )
+    return header + np.ascontiguousarray(samples).tobytes()
+
+
+def encode_response(model: str, indices: np.ndarray, confidences: np.ndarray) -> bytes:
+    count, k = indices.shape
+    entries = np.empty((count, k), dtype=_ENTRY)
+    entries["cls"] = indices
+    entries["conf"] = confidences
+    return RESPONSE_HEADER.pack(RESPONSE_MAGIC, WIRE_VERSION, MODEL_IDS[model], k, count) + entries.tobytes()
+
+
+def decode_response(data: bytes):
+    """(model, indices (N,k), confidences (N,k))"""
+    magic, version, model, k, count = RESPONSE_HEADER.unpack_from(data)
+    if magic != RESPONSE_MAGIC or version != WIRE_VERSION:
+        raise WireFormatError("رد غير صالح")
+    entries = np.frombuffer(data, dtype=_ENTRY, offset=RESPONSE_HEADER.size).reshape(count, k)
+    return MODEL_CODES[model], entries["cls"].astype(np.int64), entries["conf"].astype(np.float32)
@@ -0,0 +1,150 @@
+"""
+طبقة تنفيذ الاستدلال خارج حلقة asyncio
+- thread: مجمّع خيوط يشارك نفس النماذج المحمّلة
+- process: مجمّع عمليات، كل عملية تحمّل نسختها الخاصة من النماذج
+- طابور محدود: عند الامتلاء يُرفض الطلب (503 + Retry-After)
+- run_local: مهام لا تُنقل إلى عملية (رسم تتبع خاص بجلسة بث) - خيوط بنفس الحد والطابور
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+WORKER_MODE = os.getenv("MUBSER_WORKER_MODE", "thread")          # thread | process
+WORKER_COUNT = int(os.getenv("MUBSER_WORKERS", str(min(4, os.cpu_count() or 1))))
+WORKER_QUEUE_DEPTH = int(os.getenv("MUBSER_WORKER_QUEUE_DEPTH", "32"))
+RETRY_AFTER_SECONDS = int(os.getenv("MUBSER_RETRY_AFTER", "1"))
+
+
+class PoolSaturatedError(RuntimeError):
+    """الطابور ممتلئ - يجب على العميل إعادة المحاولة لاحقاً"""
+
+    def __init__(self, retry_after: int = RETRY_AFTER_SECONDS):
+        super().__init__("الخادم مشغول - أعد المحاولة لاحقاً")
+        self.retry_after = retry_after
+
+
+def _init_process_worker():
+    """تحميل النماذج وكواشفها مرة واحدة داخل كل عملية عاملة"""
+    from . import inference, Model_Word  # noqa: F401
+    from .registry import registry
+
+    registry.warmup()
+
+
+def _timed_call(fn: Callable, submitted_at: float, args, kwargs) -> Tuple[Any, float, float]:
+    # time.time لأن perf_counter غير قابل للمقارنة بين العمليات
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return result, started - submitted_at, time.time() - started
+
+
+class InferencePool:
+    """
+    ينفّذ دوال الاستدلال في مجمّع عمّال ويرجّع (النتيجة، التوقيتات بالملي ثانية)
+    الحد الأقصى للطلبات المعلّقة = workers + queue_depth
+    """
+
+    def __init__(
+        self,
+        mode: str = WORKER_MODE,
+        workers: int = WORKER_COUNT,
+        queue_depth: int = WORKER_QUEUE_DEPTH,
+    ):
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.max_pending = self.workers + max(0, queue_depth)
+        self._pending = 0
+        self._rejected = 0
+        self._completed = 0
+        self._lock = threading.Lock()
+
+        if mode == "process":
+            # spawn بدلاً من fork: العملية الأم تشغّل خيوط MediaPipe/المُجمِّع
+            self._executor: Executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker,
+            )
+        elif mode == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="inference"
+            )
+        else:
+            raise ValueError(f"MUBSER_WORKER_MODE غير معروف: {mode}")
+        if mode == "thread":
+            self._local_executor: Executor = self._executor
+        else:
+            self._local_executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="inference-local"
+            )
+        logger.info(f"✅ مجمّع الاستدلال: {mode} × {self.workers} (طابور {queue_depth})")
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PoolSaturatedError()
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, float]]:
+        """
+        fn ترجّع (النتيجة، توقيت المراحل بالملي ثانية) - انظر jobs.py
+        يرجّع: (النتيجة، التوقيتات + زمن الانتظار في الطابور)
+        في وضع process يجب أن تكون fn دالة على مستوى الموديول والمدخلات قابلة للـ pickle
+        """
+        return await self._run(self._executor, fn, args, kwargs)
+
+    async def run_local(self, fn: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, float]]:
+        """
+        مثل run لكن في خيط من العملية الحالية دائماً (مدخلات غير قابلة للـ pickle)
+        يخضع لنفس حد الطلبات المعلّقة (PoolSaturatedError)
+        """
+        return await self._run(self._local_executor, fn, args, kwargs)
+
+    async def _run(self, executor: Executor, fn: Callable, args, kwargs) -> Tuple[Any, Dict[str, float]]:
+        self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            (result, stages), queued, ran = await loop.run_in_executor(
+                executor, _timed_call, fn, time.time(), args, kwargs
+            )
+        finally:
+            self._release()
+        timings = {"queue": queued * 1000.0, **stages, "total": ran * 1000.0}
+        metrics.observe_job(getattr(fn, "__name__", "job"), timings)
+        return result, timings
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._local_executor is not self._executor:
+            self._local_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """تنسيق التوقيتات كترويسة Server-Timing"""
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings.items())
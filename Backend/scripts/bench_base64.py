@@ -0,0 +1,97 @@
+"""
+مقارنة مسار Base64/JSON (/analyze_base64) بمسار multipart (/analyze)
+التشغيل (من مجلد Backend ، مع ملفات النماذج في MUBSER_MODEL_DIR):
+    python -m scripts.bench_base64 --image path/to/frame.jpg --runs 100
+- decode: فك Base64 فقط (split + b64decode التقليدي مقابل image_io.decode_base64 على أجزاء) مع ذروة الذاكرة
+- http:   الطلب كاملاً عبر TestClient (نفس الصورة ← كاش التنبؤ يجعل الفرق هو النقل والفك)
+يطبع p50 / p99 بالملي ثانية وحجم جسم الطلب لكل مسار
+"""
+import argparse
+import base64
+import json
+import time
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from app.image_io import decode_base64
+
+
+def _sample_jpeg(width: int = 1280, height: int = 720) -> bytes:
+    rng = np.random.default_rng(0)
+    arr = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    buf = BytesIO()
+    Image.fromarray(arr).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _naive_decode(data_url: str) -> bytes:
+    """الطريقة المعتادة: نسخة مقصوصة من النص ثم encode ضمني ثم b64decode"""
+    payload = data_url.split(",", 1)[1] if data_url.startswith("data:") else data_url
+    return base64.b64decode(payload)
+
+
+def _measure(fn, runs: int) -> np.ndarray:
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return np.array(times)
+
+
+def _peak_kib(fn) -> float:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark base64 JSON vs multipart analyze")
+    parser.add_argument("--image", help="صورة اختبار (افتراضياً صورة عشوائية 1280x720)")
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--no-http", action="store_true", help="قياس الفك فقط (بدون تحميل النماذج)")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            data = f.read()
+    else:
+        data = _sample_jpeg()
+    data_url = "data:image/jpeg;base64," + base64.b64encode(data).decode("ascii")
+    assert decode_base64(data_url) == _naive_decode(data_url) == data
+
+    print(f"payload: {len(data) / 1024:.1f} KiB (base64 {len(data_url) / 1024:.1f} KiB), runs: {args.runs}")
+    for name, fn in (("naive", lambda: _naive_decode(data_url)), ("chunked", lambda: decode_base64(data_url))):
+        t = _measure(fn, args.runs)
+        print(f"decode {name:>8}: p50={np.percentile(t, 50):7.2f} ms  p99={np.percentile(t, 99):7.2f} ms  "
+              f"peak={_peak_kib(fn):8.1f} KiB")
+
+    if args.no_http:
+        return
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    client = TestClient(app)
+    body = json.dumps({"image_b64": data_url})
+    requests = {
+        "multipart": lambda: client.post("/analyze", files={"image": ("frame.jpg", data, "image/jpeg")}),
+        "base64": lambda: client.post("/analyze_base64", content=body, headers={"content-type": "application/json"}),
+    }
+    for name, fn in requests.items():
+        response = fn()
+        assert response.status_code == 200, response.text
+        size = len(response.request.content)
+        t = _measure(fn, args.runs)
+        print(f"http {name:>10}: p50={np.percentile(t, 50):7.2f} ms  p99={np.percentile(t, 99):7.2f} ms  "
+              f"body={size / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+قياس فك JPEG المصغّر (DCT draft) + كشف على نسخة صغيرة لصور الهاتف 12MP
+التشغيل (من مجلد Backend ، مع ملفات النماذج في MUBSER_MODEL_DIR):
+    python -m scripts.bench_decode --image path/to/photo.jpg --runs 10
+- full:  فك بالدقة الكاملة + Hands على الإطار كاملاً (السلوك السابق)
+- draft: فك بمقياس DCT (MUBSER_DECODE_MIN_SIDE) + كشف على detect_size والقص من الإطار المفكوك
+كل وضع في عملية مستقلة: p50 بالملي ثانية للفك وللتنبؤ (حروف + كلمات) وزيادة ذروة RSS (Linux)
+
+الدقة قبل/بعد على صور حقيقية (مجلد صور هاتف 12MP):
+    python -m scripts.bench_decode --images path/to/photos/
+- لكل صورة: تسمية الحروف والكلمات و check_image_quality في الوضعين
+- الاتفاق = نسبة الصور التي أعطى فيها draft نفس تسمية full ، وفرق الثقة المتوسط
+"""
+import argparse
+import glob
+import multiprocessing as mp
+import os
+import queue
+import resource
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+
+def _sample_jpeg(width: int = 4032, height: int = 3024) -> bytes:
+    """صورة هاتف اصطناعية: تدرجات ناعمة + ضوضاء خفيفة (حجم ملف قريب من الحقيقي)"""
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 256, size=(48, 64, 3), dtype=np.uint8)
+    img = np.asarray(Image.fromarray(small).resize((width, height), Image.BICUBIC), dtype=np.int16)
+    img = np.clip(img + rng.integers(-6, 7, size=img.shape, dtype=np.int16), 0, 255).astype(np.uint8)
+    buf = BytesIO()
+    Image.fromarray(img).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _reset_peak_rss():
+    """Linux: تصفير VmHWM بعد الاستيراد والتسخين حتى تقيس الذروة الفك والتنبؤ فقط"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mib() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _rss_mib() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _run_mode(mode: str, data: bytes, runs: int, models: bool, out):
+    from app.image_io import DECODE_MIN_SIDE, decode_image_bytes
+    from app.pipeline import Frame, landmark_cache
+
+    min_side = 0 if mode == "full" else DECODE_MIN_SIDE
+
+    def decode():
+        return decode_image_bytes(data, min_side)
+
+    predict = None
+    if models:
+        from app import Model_Word, inference  # noqa: F401 (تسجيل النماذج)
+        from app.registry import registry
+
+        letters = registry.get("letters")
+        if mode == "full":
+            letters.config.detect_size = None
+
+        def predict(img):
+            # ndarray بدل PIL: بدون كاش التنبؤ ، وتفريغ كاش الكشف حتى يعمل MediaPipe كل مرة
+            landmark_cache.clear()
+            frame = Frame(np.asarray(img))
+            letters.predict_frame(frame)
+            Model_Word.predict_word_frame(frame)
+
+        predict(decode())
+
+    _reset_peak_rss()
+    base = _rss_mib()
+    decode_ms, predict_ms = [], []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        img = decode()
+        decode_ms.append((time.perf_counter() - t0) * 1000.0)
+        if predict is not None:
+            t0 = time.perf_counter()
+            predict(img)
+            predict_ms.append((time.perf_counter() - t0) * 1000.0)
+        size = img.size
+        del img
+    out.put({
+        "size": size,
+        "decode": float(np.percentile(decode_ms, 50)),
+        "predict": float(np.percentile(predict_ms, 50)) if predict_ms else None,
+        "rss": _peak_rss_mib() - base,
+    })
+
+
+def _accuracy_mode(mode: str, paths: list, out):
+    """تسمية + ثقة لكل نموذج وفحص الجودة لكل صورة في وضع واحد"""
+    from app import Model_Word, inference  # noqa: F401 (تسجيل النماذج)
+    from app.image_io import DECODE_MIN_SIDE, InvalidImageError, decode_image_bytes
+    from app.pipeline import Frame, landmark_cache
+    from app.registry import registry
+
+    letters = registry.get("letters")
+    if mode == "full":
+        letters.config.detect_size = None
+    min_side = 0 if mode == "full" else DECODE_MIN_SIDE
+
+    results = []
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            img = decode_image_bytes(data, min_side)
+        except InvalidImageError:
+            results.append(None)
+            continue
+        landmark_cache.clear()
+        frame = Frame(np.asarray(img))
+        results.append({
+            "letters": letters.predict_frame(frame, top_k=1)[:2],
+            "words": Model_Word.predict_word_frame(frame, top_k=1)[:2],
+            "quality": Model_Word.check_image_quality(img),
+        })
+    out.put(results)
+
+
+def _spawn(ctx, target, args):
+    out = ctx.Queue()
+    proc = ctx.Process(target=target, args=(*args, out))
+    proc.start()
+    # القراءة قبل join: نتيجة كبيرة (صور كثيرة) تملأ الأنبوب فلا تنتهي العملية قبل قراءتها
+    while True:
+        try:
+            result = out.get(timeout=1.0)
+            break
+        except queue.Empty:
+            if not proc.is_alive():
+                raise SystemExit(f"{args[0]}: فشلت عملية القياس (exit {proc.exitcode})")
+    proc.join()
+    return result
+
+
+def _accuracy(ctx, pattern: str):
+    """مقارنة full و draft على صور حقيقية"""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*")
+    paths = sorted(p for p in glob.glob(pattern) if p.lower().endswith((".jpg", ".jpeg")))
+    if not paths:
+        raise SystemExit(f"لا توجد صور JPEG في {pattern}")
+
+    full = _spawn(ctx, _accuracy_mode, ("full", paths))
+    draft = _spawn(ctx, _accuracy_mode, ("draft", paths))
+    pairs = [(a, b) for a, b in zip(full, draft) if a is not None and b is not None]
+    print(f"images: {len(pairs)}/{len(paths)} decoded")
+    if not pairs:
+        return
+    for name in ("letters", "words"):
+        same = sum(a[name][0] == b[name][0] for a, b in pairs)
+        delta = np.mean([b[name][1] - a[name][1] for a, b in pairs])
+        print(f"{name:>8}: top-1 agreement {same}/{len(pairs)} ({same / len(pairs):.1%})  mean conf delta {delta:+.4f}")
+    same = sum(a["quality"] == b["quality"] for a, b in pairs)
+    ok_full = sum(a["quality"] for a, _ in pairs)
+    ok_draft = sum(b["quality"] for _, b in pairs)
+    print(f" quality: agreement {same}/{len(pairs)}  ok full={ok_full} draft={ok_draft}")
+    for path, (a, b) in zip(paths, zip(full, draft)):
+        if a is not None and b is not None and (a["letters"][0] != b["letters"][0] or a["words"][0] != b["words"][0]):
+            print(f"  diff {os.path.basename(path)}: letters {a['letters'][0]}→{b['letters'][0]}  words {a['words'][0]}→{b['words'][0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DCT-scaled JPEG decode and proxy detection")
+    parser.add_argument("--image", help="صورة JPEG (افتراضياً صورة اصطناعية 4032x3024)")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--no-models", action="store_true", help="قياس الفك فقط (بدون تحميل النماذج)")
+    parser.add_argument("--images", help="مجلد أو glob لصور JPEG حقيقية: مقارنة دقة full و draft بدل قياس الزمن")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    if args.images:
+        _accuracy(ctx, args.images)
+        return
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            data = f.read()
+    else:
+        data = _sample_jpeg()
+    with Image.open(BytesIO(data)) as im:
+        print(f"input: {im.size[0]}x{im.size[1]} {im.format}, {len(data) / 1024:.0f} KiB, runs: {args.runs}")
+
+    for mode in ("full", "draft"):
+        r = _spawn(ctx, _run_mode, (mode, data, args.runs, not args.no_models))
+        line = f"{mode:>5}: decoded {r['size'][0]}x{r['size'][1]}  decode p50={r['decode']:7.2f} ms"
+        if r["predict"] is not None:
+            line += f"  predict p50={r['predict']:7.2f} ms"
+        print(f"{line}  peak rss +{r['rss']:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+مقارنة زمن استقبال الصور: المسار القديم (حفظ على القرص) مقابل الفك من الذاكرة
+التشغيل (من مجلد Backend):
+    python -m scripts.bench_ingest --image path/to/frame.jpg --runs 200
+يطبع p50 / p99 بالملي ثانية لكل مسار
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from app.image_io import decode_image_bytes
+
+
+def _disk_path(data: bytes, filename: str, dest_dir: str) -> Image.Image:
+    """نسخة من المسار القديم: حفظ + verify + إعادة فتح + حذف"""
+    dest_path = os.path.join(dest_dir, filename)
+    base, ext = os.path.splitext(filename)
+    i = 1
+    while os.path.exists(dest_path):
+        filename = f"{base}_{i}{ext}"
+        dest_path = os.path.join(dest_dir, filename)
+        i += 1
+
+    with open(dest_path, "wb") as buffer:
+        shutil.copyfileobj(BytesIO(data), buffer)
+    try:
+        with Image.open(dest_path) as im:
+            im.verify()
+        img = Image.open(dest_path).convert("RGB")
+    finally:
+        os.remove(dest_path)
+    return img
+
+
+def _memory_path(data: bytes) -> Image.Image:
+    return decode_image_bytes(data)
+
+
+def _sample_jpeg(width: int = 1280, height: int = 720) -> bytes:
+    rng = np.random.default_rng(0)
+    arr = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    buf = BytesIO()
+    Image.fromarray(arr).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _measure(fn, runs: int) -> np.ndarray:
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return np.array(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upload ingestion paths")
+    parser.add_argument("--image", help="صورة اختبار (افتراضياً صورة عشوائية 1280x720)")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            data = f.read()
+    else:
+        data = _sample_jpeg()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # ملفات موجودة مسبقاً تحاكي مجلد رفع مزدحم بنفس الاسم
+        for i in range(50):
+            open(os.path.join(tmp, f"frame_{i}.jpg" if i else "frame.jpg"), "wb").close()
+
+        results = {
+            "disk": _measure(lambda: _disk_path(data, "frame.jpg", tmp), args.runs),
+            "memory": _measure(lambda: _memory_path(data), args.runs),
+        }
+
+    print(f"payload: {len(data) / 1024:.1f} KiB, runs: {args.runs}")
+    for name, t in results.items():
+        print(f"{name:>7}: p50={np.percentile(t, 50):7.2f} ms  p99={np.percentile(t, 99):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
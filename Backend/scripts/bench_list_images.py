@@ -0,0 +1,122 @@
+"""
+زمن صفحة GET /images مع نمو الجدول (يجب أن يبقى ثابتاً تقريباً)
+التشغيل (من مجلد Backend):
+    python -m scripts.bench_list_images --sizes 10000,100000,1000000
+- يملأ قاعدة SQLite مؤقتة بسجلات اصطناعية (على مدى سنة، بتسميات حروف/كلمات)
+- يقيس نفس استعلامات app.listing: الصفحة الأولى، صفحة عميقة، فلترة تسمية، نطاق يوم، projection
+- legacy = الاستعلام القديم (كل الجدول بكل الأعمدة) حتى --legacy-max صف
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import listing
+from app.database import Base, async_url, make_async_engine, make_engine
+from app.models import ImageItem
+
+START = datetime(2025, 1, 1)
+# أعمدة بأسمائها: status / content_hash وما يُضاف لاحقاً تأخذ قيمها الافتراضية
+COLUMNS = (
+    "id", "filename", "content_type", "size_bytes", "saved_path", "notes",
+    "extracted_text", "predicted_label", "confidence", "created_at", "updated_at",
+)
+LABELS = [f"L{i}" for i in range(32)] + [f"W{i}" for i in range(89)]
+
+
+def _seed(path: str, start_id: int, count: int, seconds_per_row: float):
+    rng = np.random.default_rng(start_id)
+    labels = rng.integers(0, len(LABELS), size=count)
+    confs = rng.random(count)
+    rows = []
+    for i in range(count):
+        row_id = start_id + i
+        created = (START + timedelta(seconds=row_id * seconds_per_row)).strftime("%Y-%m-%d %H:%M:%S")
+        label = LABELS[labels[i]]
+        rows.append((
+            row_id, f"img_{row_id}.jpg", "image/jpeg", 120_000, f"uploads/img_{row_id}.jpg", None,
+            f"{label} (ثقة: {confs[i]:.2%})", label, float(confs[i]), created, created,
+        ))
+    con = sqlite3.connect(path)
+    placeholders = ",".join("?" * len(COLUMNS))
+    con.executemany(f"INSERT INTO image_items ({','.join(COLUMNS)}) VALUES ({placeholders})", rows)
+    con.commit()
+    con.close()
+
+
+async def _time(fn: Callable[[], Awaitable], runs: int) -> float:
+    await fn()
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        await fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return float(np.percentile(times, 50))
+
+
+async def _measure(url: str, size: int, limit: int, runs: int, legacy_max: int, seconds_per_row: float) -> Dict[str, float]:
+    engine = make_async_engine(async_url(url))
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    fields = list(listing.LIST_FIELDS)
+    middle = START + timedelta(seconds=size // 2 * seconds_per_row)
+    results: Dict[str, float] = {}
+
+    async def page(before_id=None, created_from=None, created_to=None, label=None, columns=fields):
+        async with factory() as db:
+            bounds = await listing.id_range(db, created_from, created_to)
+            query = listing.page_query(columns, limit, before_id, bounds, created_from, created_to, label)
+            return (await db.execute(query)).all()
+
+    async def legacy():
+        async with factory() as db:
+            return (await db.execute(select(ImageItem))).scalars().all()
+
+    try:
+        results["first_page"] = await _time(lambda: page(), runs)
+        results["deep_page"] = await _time(lambda: page(before_id=size // 10), runs)
+        results["label"] = await _time(lambda: page(label="W42"), runs)
+        results["label_deep"] = await _time(lambda: page(before_id=size // 10, label="W42"), runs)
+        results["one_day"] = await _time(lambda: page(created_from=middle, created_to=middle + timedelta(days=1)), runs)
+        results["projection"] = await _time(lambda: page(columns=["id", "predicted_label", "confidence"]), runs)
+        if size <= legacy_max:
+            results["legacy_all"] = await _time(legacy, 1)
+    finally:
+        await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark keyset pagination for GET /images")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--legacy-max", type=int, default=100000, help="أكبر حجم يُقاس فيه الاستعلام القديم")
+    args = parser.parse_args()
+
+    sizes = sorted(int(n) for n in args.sizes.split(","))
+    # سنة كاملة موزعة على أكبر حجم
+    seconds_per_row = 365 * 24 * 3600 / sizes[-1]
+    path = os.path.join(tempfile.mkdtemp(prefix="mubser_list_"), "bench.db")
+    url = f"sqlite:///{path}"
+    engine = make_engine(url)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    seeded = 0
+    for size in sizes:
+        _seed(path, seeded + 1, size - seeded, seconds_per_row)
+        seeded = size
+        results = asyncio.run(_measure(url, size, args.limit, args.runs, args.legacy_max, seconds_per_row))
+        print(f"rows={size:>9}: " + "  ".join(f"{k}={v:.2f}ms" for k, v in results.items()))
+
+
+if __name__ == "__main__":
+    main()
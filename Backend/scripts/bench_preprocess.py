@@ -0,0 +1,229 @@
+"""
+مقارنة المعالجة المسبقة لنموذج الكلمات: المسار القديم (PIL ↔ cv2) مقابل مسار ndarray
+التشغيل (من مجلد Backend):
+    python -m scripts.bench_preprocess --image path/to/frame.jpg --runs 200
+- يطبع زمن كل مرحلة (p50) وحجم المخازن الجديدة التي تحجزها
+- يتحقق أن المخرجات متكافئة ضمن --atol (بوحدات مستوى الرمادي 0..255)
+- الكشف (MediaPipe) مستبعد افتراضياً: نفس صندوق القص لكلا المسارين (--detect لاستخدام الكاشف)
+"""
+import argparse
+import sys
+import time
+from io import BytesIO
+from typing import Callable, Dict, List, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageEnhance
+
+from app import Model_Word
+from app.Model_Word import (
+    _apply_optional_normalize,
+    _center_box,
+    _downscale_for_detection,
+    _enhance_lut,
+    _model,
+    _resize_buffer,
+    crop_box_array,
+    preprocess_array,
+)
+
+MAX_SIZE = 640
+Stage = Tuple[str, Callable]
+
+
+def _img_bytes(img: Image.Image) -> int:
+    return img.size[0] * img.size[1] * len(img.getbands())
+
+
+# ---------- المسار القديم (نسخة من preprocess_pil قبل التعديل، بدون الكشف) ----------
+
+def _legacy_stages(box, size: int) -> List[Stage]:
+    def downscale(img):
+        w, h = img.size
+        if max(w, h) <= MAX_SIZE:
+            return img, 0
+        scale = MAX_SIZE / max(w, h)
+        out = img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
+        return out, _img_bytes(out)
+
+    def to_array(img):
+        out = np.array(img)
+        return out, out.nbytes
+
+    def rgb2bgr(rgb):
+        out = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        return out, out.nbytes
+
+    def bgr2rgb_detect(bgr):
+        # نسخة RGB كانت تُمرَّر لـ MediaPipe ثم تُهمل
+        rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        return bgr, rgb.nbytes
+
+    def crop(bgr):
+        x1, y1, x2, y2 = box
+        return bgr[y1:y2, x1:x2], 0
+
+    def crop_bgr2rgb(crop):
+        out = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        return out, out.nbytes
+
+    def fromarray(rgb):
+        out = Image.fromarray(rgb)
+        return out, _img_bytes(out)
+
+    def contrast(img):
+        out = ImageEnhance.Contrast(img).enhance(1.2)
+        # + نسخة L لحساب المتوسط + صورة "degenerate" بنفس الحجم
+        return out, _img_bytes(out) * 2 + img.size[0] * img.size[1]
+
+    def brightness(img):
+        out = ImageEnhance.Brightness(img).enhance(1.1)
+        return out, _img_bytes(out) * 2
+
+    def convert_l(img):
+        out = img.convert("L")
+        return out, _img_bytes(out)
+
+    def resize(img):
+        out = img.resize((size, size), Image.LANCZOS)
+        return out, _img_bytes(out)
+
+    def to_float(img):
+        arr = np.array(img, dtype=np.float32)
+        out = arr / 255.0
+        return out[None, :, :], arr.nbytes + out.nbytes
+
+    def normalize(x):
+        out = _apply_optional_normalize(x.copy())  # القديم: (x - mean) / std = مصفوفتان جديدتان
+        return out[:, None, :, :], out.nbytes * 2
+
+    return [
+        ("downscale", downscale), ("to_array", to_array), ("rgb2bgr", rgb2bgr),
+        ("bgr2rgb_detect", bgr2rgb_detect), ("crop", crop), ("crop_bgr2rgb", crop_bgr2rgb),
+        ("fromarray", fromarray), ("contrast", contrast), ("brightness", brightness),
+        ("convert_L", convert_l), ("resize", resize), ("to_float", to_float), ("normalize", normalize),
+    ]
+
+
+# ---------- المسار الجديد (نفس مراحل preprocess_array) ----------
+
+def _array_stages(box, size: int) -> List[Stage]:
+    def to_array(img):
+        out = np.asarray(img)
+        return out, out.nbytes
+
+    def downscale(rgb):
+        out = _downscale_for_detection(rgb, MAX_SIZE)
+        return out, 0 if out is rgb else out.nbytes
+
+    def crop(rgb):
+        x1, y1, x2, y2 = box
+        return rgb[y1:y2, x1:x2], 0
+
+    def gray(crop):
+        out = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        return out, out.nbytes
+
+    def enhance(g):
+        lut = _enhance_lut(int(g.mean() + 0.5))
+        cv2.LUT(g, lut, dst=g)
+        return g, lut.nbytes
+
+    def resize(g):
+        return cv2.resize(g, (size, size), dst=_resize_buffer(size), interpolation=cv2.INTER_AREA), 0
+
+    def to_float(resized):
+        x = np.empty((1, 1, size, size), dtype=np.float32)
+        np.multiply(resized, np.float32(1.0 / 255.0), out=x[0, 0])
+        return x, x.nbytes
+
+    def normalize(x):
+        return _apply_optional_normalize(x), 0
+
+    return [
+        ("to_array", to_array), ("downscale", downscale), ("crop", crop), ("gray", gray),
+        ("enhance_lut", enhance), ("resize", resize), ("to_float", to_float), ("normalize", normalize),
+    ]
+
+
+def _profile(stages: List[Stage], img: Image.Image, runs: int):
+    times: Dict[str, List[float]] = {name: [] for name, _ in stages}
+    alloc: Dict[str, int] = {}
+    out = None
+    for _ in range(runs):
+        out = img
+        for name, fn in stages:
+            t0 = time.perf_counter()
+            out, nbytes = fn(out)
+            times[name].append((time.perf_counter() - t0) * 1000.0)
+            alloc[name] = nbytes
+    return out, times, alloc
+
+
+def _print_profile(title: str, times, alloc):
+    print(f"\n{title}")
+    total_ms = total_bytes = 0.0
+    for name in times:
+        p50 = float(np.percentile(times[name], 50))
+        total_ms += p50
+        total_bytes += alloc[name]
+        print(f"  {name:>15}: {p50:8.3f} ms  {alloc[name] / 1024:10.1f} KiB")
+    print(f"  {'total':>15}: {total_ms:8.3f} ms  {total_bytes / 1024:10.1f} KiB")
+
+
+def _sample_frame(width: int = 1280, height: int = 720) -> Image.Image:
+    """إطار اصطناعي ناعم (تدرج + أشكال + ضجيج خفيف) أقرب لصور الكاميرا من الضجيج الخالص"""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = 80 + 60 * (xx / width) + 40 * (yy / height)
+    for _ in range(12):
+        cx, cy, r = rng.uniform(0, width), rng.uniform(0, height), rng.uniform(40, 200)
+        base += rng.uniform(-80, 80) * np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * r * r))
+    rgb = np.stack([base, base * 0.9 + 10, base * 0.8 + 20], axis=-1) + rng.normal(0, 4, (height, width, 3))
+    buf = BytesIO()
+    Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8)).save(buf, format="JPEG", quality=90)
+    return Image.open(BytesIO(buf.getvalue())).convert("RGB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Model_Word preprocessing paths")
+    parser.add_argument("--image", help="صورة اختبار (افتراضياً إطار اصطناعي 1280x720)")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--detect", action="store_true", help="حساب صندوق القص بـ MediaPipe بدلاً من القص المركزي")
+    parser.add_argument("--atol", type=float, default=8.0, help="أقصى فرق مسموح لكل بكسل (0..255)")
+    args = parser.parse_args()
+
+    img = Image.open(args.image).convert("RGB") if args.image else _sample_frame()
+    model = _model()
+    size = model.img_size
+
+    small = _downscale_for_detection(np.asarray(img), MAX_SIZE)
+    box = crop_box_array(small) if args.detect else _center_box(small.shape[1], small.shape[0])
+    print(f"image: {img.size[0]}x{img.size[1]}, box: {box}, img_size: {size}, runs: {args.runs}")
+
+    legacy, legacy_t, legacy_a = _profile(_legacy_stages(box, size), img, args.runs)
+    fused, fused_t, fused_a = _profile(_array_stages(box, size), img, args.runs)
+    _print_profile("legacy (PIL ↔ cv2)", legacy_t, legacy_a)
+    _print_profile("ndarray", fused_t, fused_a)
+
+    # end-to-end عبر الدالة الفعلية في Model_Word (وليس نسخة المراحل أعلاه)
+    rgb = np.asarray(img)
+    t = []
+    for _ in range(args.runs):
+        t0 = time.perf_counter()
+        actual = preprocess_array(rgb, box=box)
+        t.append((time.perf_counter() - t0) * 1000.0)
+    print(f"\nModel_Word.preprocess_array: p50={np.percentile(t, 50):.3f} ms  p99={np.percentile(t, 99):.3f} ms")
+
+    # التكافؤ بوحدات الرمادي (نلغي التطبيع)
+    std = float(model.norm_std[0]) if model.norm_std and float(model.norm_std[0]) != 0 else 1.0
+    diff = np.abs(legacy - actual) * std * 255.0
+    assert np.array_equal(actual, fused), "مراحل البنشمارك لا تطابق preprocess_array"
+    print(f"equivalence: max={diff.max():.2f}  mean={diff.mean():.3f}  (atol={args.atol})")
+    if diff.max() > args.atol:
+        sys.exit("❌ المخرجات خارج حد التكافؤ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+مقارنة حجم الرفع وكلفة المعالج لكل تنبؤ: JPEG للإطار كاملاً مقابل الصيغة الثنائية (app.wire)
+التشغيل (من مجلد Backend ، مع ملفات النماذج في MUBSER_MODEL_DIR):
+    python -m scripts.bench_wire --image sample.jpg --width 1280 --height 720
+- jpeg:   فك + (جودة) + كشف MediaPipe + قص + تصغير + ONNX (مسار /analyze و /analyze_word)
+- tensor: نفس القصّة الرمادية يحضّرها "العميل" مرة واحدة ثم decode_request + ONNX فقط
+- يطبع: البايتات ، زمن المعالج لكل تنبؤ (كل الخيوط) ، وتطابق التسمية الأولى بين المسارين
+"""
+import argparse
+import time
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app import jobs, wire
+from app.cache import prediction_cache
+from app.image_io import decode_image_bytes
+from app.pipeline import RESIZERS, Frame, landmark_cache
+from app.registry import registry
+
+
+def _client_tile(model: str, img: Image.Image) -> np.ndarray:
+    """ما يفعله عميل يكشف محلياً: نفس قص/رمادي/تحسين/تصغير الخادم → uint8 (S,S)"""
+    from app import Model_Word
+
+    clf = registry.get(model)
+    rgb, (x1, y1, x2, y2) = Frame(img).locate(clf.config)
+    gray = cv2.cvtColor(np.ascontiguousarray(rgb[y1:y2, x1:x2]), cv2.COLOR_RGB2GRAY)
+    if model == "words" and clf.config.enhance:
+        cv2.LUT(gray, Model_Word._enhance_lut(int(gray.mean() + 0.5)), dst=gray)
+    return RESIZERS[clf.config.resize](gray, clf.img_size).copy()
+
+
+def _cpu_ms(fn, runs: int) -> float:
+    fn()
+    t0 = time.process_time()
+    for _ in range(runs):
+        fn()
+    return (time.process_time() - t0) * 1000.0 / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JPEG upload vs binary tile/landmark payload")
+    parser.add_argument("--image", default="sample.jpg")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--quality", type=int, default=90, help="جودة JPEG (العميل الحالي 0.9)")
+    parser.add_argument("--models", default="letters,words")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    frame = Image.open(args.image).convert("RGB").resize((args.width, args.height), Image.BILINEAR)
+    buf = BytesIO()
+    frame.save(buf, format="JPEG", quality=args.quality)
+    jpeg = buf.getvalue()
+
+    from app import Model_Word, inference  # noqa: F401 (تسجيل النماذج)
+
+    print(f"{'model':>8} {'path':>7} {'bytes':>9} {'cpu ms':>8}  top-1")
+    for model in args.models.split(","):
+        job = jobs.analyze_letter_job if model == "letters" else jobs.analyze_word_job
+
+        def jpeg_path():
+            # بدون كاش: كل طلب إطار جديد من الكاميرا
+            prediction_cache.invalidate()
+            landmark_cache.clear()
+            result, _ = job(decode_image_bytes(jpeg))
+            return result
+
+        payload = wire.encode_request(model, _client_tile(model, decode_image_bytes(jpeg))[None], top_k=5)
+
+        def tensor_path():
+            req = wire.decode_request(payload)
+            (indices, confidences), _ = jobs.classify_tensor_job(req.model, req.samples, req.top_k, req.tta)
+            return wire.encode_response(req.model, indices, confidences)
+
+        jpeg_label = jpeg_path()
+        jpeg_label = jpeg_label[0] if model == "letters" else jpeg_label["label"]
+        _, indices, _ = wire.decode_response(tensor_path())
+        tensor_label = registry.get(model).labels(mapped=model != "letters")[int(indices[0, 0])]
+
+        print(f"{model:>8} {'jpeg':>7} {len(jpeg):>9} {_cpu_ms(jpeg_path, args.runs):8.2f}  {jpeg_label}")
+        print(f"{model:>8} {'tensor':>7} {len(payload):>9} {_cpu_ms(tensor_path, args.runs):8.2f}  {tensor_label}")
+
+
+if __name__ == "__main__":
+    main()
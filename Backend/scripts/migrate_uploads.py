@@ -0,0 +1,96 @@
+"""
+نقل الملفات المرفوعة القديمة (UPLOAD_DIR/<اسم العميل>) إلى مخزن المحتوى (app.storage)
+التشغيل (من مجلد Backend، نفس المجلد الذي يعمل منه الخادم):
+    python -m scripts.migrate_uploads --dry-run
+    python -m scripts.migrate_uploads
+- لكل سجل بدون content_hash: sha256 → ربط الملف في UPLOAD_DIR/ab/cd/ → تحديث saved_path + ref_count
+- الملفات المتطابقة تصبح ملفاً واحداً ، والملف القديم يُحذف بعد commit فقط
+- قابل للاستئناف: إعادة التشغيل تكمل السجلات المتبقية (والملفات المفقودة تُتخطى وتُعد)
+"""
+import argparse
+import os
+import time
+
+from sqlalchemy import select, update
+
+from app.database import Base, SQLALCHEMY_DATABASE_URL, increment, make_engine
+from app.migrations import upgrade_schema
+from app.models import ImageItem, StoredFile
+from app.storage import UPLOAD_DIR, blob_path, discard, file_extension, hash_file, place
+
+
+def migrate(engine, root: str, batch: int, dry_run: bool) -> dict:
+    counts = {"migrated": 0, "deduplicated": 0, "missing": 0}
+    bytes_saved = 0
+    last_id = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(ImageItem.id, ImageItem.saved_path)
+                .where(ImageItem.id > last_id, ImageItem.content_hash.is_(None))
+                .order_by(ImageItem.id)
+                .limit(batch)
+            ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        for row_id, old_path in rows:
+            if not os.path.isfile(old_path):
+                counts["missing"] += 1
+                continue
+            content_hash = hash_file(old_path)
+            if dry_run:
+                counts["migrated"] += 1
+                continue
+
+            with engine.begin() as conn:
+                increment(
+                    conn, StoredFile.__table__, {"content_hash": content_hash}, {"ref_count": 1},
+                    defaults={"path": blob_path(content_hash, file_extension(old_path), root), "size_bytes": os.path.getsize(old_path)},
+                )
+                path, refs = conn.execute(
+                    select(StoredFile.path, StoredFile.ref_count).where(StoredFile.content_hash == content_hash)
+                ).one()
+                # ربط (أو نسخ) مع إبقاء الأصل حتى ينجح commit
+                place(old_path, path, move=False)
+                conn.execute(
+                    update(ImageItem).where(ImageItem.id == row_id).values(content_hash=content_hash, saved_path=path)
+                )
+            counts["migrated"] += 1
+            if refs > 1:
+                counts["deduplicated"] += 1
+                bytes_saved += os.path.getsize(path)
+
+            if os.path.abspath(old_path) != os.path.abspath(path):
+                with engine.connect() as conn:
+                    shared = conn.execute(select(ImageItem.id).where(ImageItem.saved_path == old_path).limit(1)).first()
+                if shared is None:
+                    discard(old_path)
+    counts["saved_mb"] = round(bytes_saved / (1024 * 1024), 2)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move legacy uploads into the content-addressed store")
+    parser.add_argument("--url", default=SQLALCHEMY_DATABASE_URL, help="رابط قاعدة البيانات")
+    parser.add_argument("--root", default=UPLOAD_DIR, help="مجلد الرفع")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="حساب فقط بدون نقل")
+    args = parser.parse_args()
+
+    engine = make_engine(args.url)
+    try:
+        # الأعمدة/الجداول الجديدة إن لم يُشغَّل الخادم بعد
+        Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
+        t0 = time.perf_counter()
+        counts = migrate(engine, args.root, args.batch, args.dry_run)
+    finally:
+        engine.dispose()
+    prefix = "dry-run: " if args.dry_run else ""
+    print(f"{prefix}{counts} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+تكميم نموذجي الحروف والكلمات إلى INT8 + بوابة دقة/زمن مقابل FP32
+التشغيل (من مجلد Backend):
+    python -m scripts.quantize_models --model words --calib-dir data/calib --eval-dir data/heldout
+- calib-dir: صور المعايرة الثابتة (تمر بنفس المعالجة المسبقة للخادم)
+- eval-dir: صور محجوزة (غير صور المعايرة)؛ إذا كانت داخل مجلدات باسم الصنف تُحسب الدقة أيضاً
+- يطبع توافق top-1/top-5 وزمن الصورة الواحدة (p50/p99) لكل نسخة
+- النسخة تُسجَّل في الميتاداتا ("variants" + "variant") فقط إذا لم تتجاوز الخسارة --max-drop
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+# المعايرة والمقارنة تتم دائماً على نسخة FP32 مهما كانت النسخة المفعّلة في الميتاداتا
+os.environ["MUBSER_MODEL_VARIANT"] = "fp32"
+
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+from PIL import Image
+
+from app.registry import MODEL_DIR
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+CALIBRATION_METHODS = {
+    "minmax": CalibrationMethod.MinMax,
+    "entropy": CalibrationMethod.Entropy,
+    "percentile": CalibrationMethod.Percentile,
+}
+
+
+def _letters() -> Tuple[Path, Path, Callable[[Image.Image], np.ndarray]]:
+    from app.inference import get_predictor
+
+    predictor = get_predictor()
+    return MODEL_DIR / "Mubser_model.onnx", MODEL_DIR / "Mubser_model.meta.json", predictor.preprocess
+
+
+def _words() -> Tuple[Path, Path, Callable[[Image.Image], np.ndarray]]:
+    from app import Model_Word
+
+    return Model_Word.MODEL_PATH, Model_Word.META_PATH, Model_Word.preprocess_pil
+
+
+MODELS = {"letters": _letters, "words": _words}
+
+
+def _list_images(folder: Path, limit: Optional[int] = None) -> List[Path]:
+    paths = sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_EXTS)
+    return paths[:limit] if limit else paths
+
+
+def _load_samples(paths: List[Path], preprocess) -> List[np.ndarray]:
+    samples = []
+    for p in paths:
+        with Image.open(p) as im:
+            samples.append(np.ascontiguousarray(preprocess(im.convert("RGB")), dtype=np.float32))
+    return samples
+
+
+class _FolderReader(CalibrationDataReader):
+    """يمرّر صور المعايرة (بعد المعالجة المسبقة) واحدة تلو الأخرى"""
+
+    def __init__(self, input_name: str, samples: List[np.ndarray]):
+        self._it = iter([{input_name: x} for x in samples])
+
+    def get_next(self):
+        return next(self._it, None)
+
+
+def quantize(model_path: Path, out_path: Path, mode: str, calib: List[np.ndarray], method: str):
+    if mode == "dynamic":
+        quantize_dynamic(str(model_path), str(out_path), weight_type=QuantType.QInt8)
+        return
+
+    # خطوة اختيارية موصى بها: استنتاج الأشكال + دمج العمليات قبل التكميم
+    src = model_path
+    prep_path = out_path.with_suffix(".prep.onnx")
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+
+        quant_pre_process(str(model_path), str(prep_path), skip_symbolic_shape=True)
+        src = prep_path
+    except Exception as e:
+        print(f"⚠️ تخطي quant_pre_process: {e}")
+
+    input_name = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    try:
+        quantize_static(
+            str(src),
+            str(out_path),
+            _FolderReader(input_name, calib),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=CALIBRATION_METHODS[method],
+        )
+    finally:
+        prep_path.unlink(missing_ok=True)
+
+
+def _run(model_path: Path, samples: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """logits لكل صورة + زمن الصورة الواحدة بالملي ثانية (بعد الإحماء)"""
+    session = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+    name = session.get_inputs()[0].name
+    for x in samples[:3]:
+        session.run(None, {name: x})
+    logits, times = [], []
+    for x in samples:
+        t0 = time.perf_counter()
+        out = session.run(None, {name: x})[0]
+        times.append((time.perf_counter() - t0) * 1000.0)
+        logits.append(out[0])
+    return np.stack(logits), np.array(times)
+
+
+def _labels(paths: List[Path], eval_dir: Path, meta: dict) -> Optional[np.ndarray]:
+    """اسم المجلد الأب = الصنف (أو ترجمته في mapping)؛ None إذا لم تكن الصور مصنّفة"""
+    index = {c: i for i, c in enumerate(meta["classes"])}
+    for cls, mapped in (meta.get("mapping") or {}).items():
+        if cls in index:
+            index.setdefault(mapped, index[cls])
+    labels = []
+    for p in paths:
+        rel = p.relative_to(eval_dir)
+        if len(rel.parts) < 2 or rel.parts[0] not in index:
+            return None
+        labels.append(index[rel.parts[0]])
+    return np.array(labels)
+
+
+def compare(fp32_path: Path, int8_path: Path, samples: List[np.ndarray], labels: Optional[np.ndarray]) -> dict:
+    ref, ref_t = _run(fp32_path, samples)
+    q, q_t = _run(int8_path, samples)
+
+    ref_top1 = ref.argmax(axis=1)
+    q_top1 = q.argmax(axis=1)
+    q_top5 = np.argsort(-q, axis=1)[:, :5]
+
+    report = {
+        "images": len(samples),
+        "top1_agreement": float((ref_top1 == q_top1).mean()),
+        "top5_agreement": float((q_top5 == ref_top1[:, None]).any(axis=1).mean()),
+        "fp32_latency_p50_ms": float(np.percentile(ref_t, 50)),
+        "fp32_latency_p99_ms": float(np.percentile(ref_t, 99)),
+        "latency_p50_ms": float(np.percentile(q_t, 50)),
+        "latency_p99_ms": float(np.percentile(q_t, 99)),
+        "fp32_size_mb": fp32_path.stat().st_size / 2**20,
+        "size_mb": int8_path.stat().st_size / 2**20,
+    }
+    if labels is not None:
+        report["fp32_accuracy"] = float((ref_top1 == labels).mean())
+        report["accuracy"] = float((q_top1 == labels).mean())
+        report["accuracy_drop"] = report["fp32_accuracy"] - report["accuracy"]
+    else:
+        # بدون تسميات: الخسارة = نسبة الصور التي تغيّر فيها التنبؤ الأول
+        report["accuracy_drop"] = 1.0 - report["top1_agreement"]
+    return report
+
+
+def _write_meta(meta_path: Path, meta: dict):
+    tmp = meta_path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, meta_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize Mubser ONNX models to INT8 with an accuracy gate")
+    parser.add_argument("--model", choices=sorted(MODELS), required=True)
+    parser.add_argument("--calib-dir", type=Path, help="صور المعايرة (مطلوبة في الوضع static)")
+    parser.add_argument("--eval-dir", type=Path, required=True, help="صور محجوزة للمقارنة")
+    parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--calibrate", choices=sorted(CALIBRATION_METHODS), default="minmax")
+    parser.add_argument("--calib-limit", type=int, default=300)
+    parser.add_argument("--variant", default="int8", help="اسم النسخة في الميتاداتا")
+    parser.add_argument("--max-drop", type=float, default=0.01, help="أقصى انخفاض مسموح في الدقة (0.01 = 1%%)")
+    parser.add_argument("--no-activate", action="store_true", help="تسجيل النسخة بدون جعلها الافتراضية")
+    args = parser.parse_args()
+
+    if args.mode == "static" and not args.calib_dir:
+        parser.error("--calib-dir مطلوب في الوضع static")
+
+    model_path, meta_path, preprocess = MODELS[args.model]()
+    with meta_path.open("r", encoding="utf-8") as f:
+        meta = json.load(f)
+    out_path = model_path.with_name(f"{model_path.stem}.{args.variant}.onnx")
+
+    calib = []
+    if args.mode == "static":
+        calib = _load_samples(_list_images(args.calib_dir, args.calib_limit), preprocess)
+        print(f"📦 معايرة على {len(calib)} صورة ({args.calibrate})")
+    quantize(model_path, out_path, args.mode, calib, args.calibrate)
+    print(f"✅ {out_path}")
+
+    eval_paths = _list_images(args.eval_dir)
+    if not eval_paths:
+        sys.exit("❌ لا توجد صور في --eval-dir")
+    report = compare(model_path, out_path, _load_samples(eval_paths, preprocess), _labels(eval_paths, args.eval_dir, meta))
+    report["mode"] = args.mode
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(
+        f"⏱️ p50: fp32={report['fp32_latency_p50_ms']:.3f}ms → {args.variant}={report['latency_p50_ms']:.3f}ms"
+        f" | top1={report['top1_agreement']:.2%} top5={report['top5_agreement']:.2%}"
+    )
+
+    if report["accuracy_drop"] > args.max_drop:
+        print(f"❌ رفض النسخة: انخفاض الدقة {report['accuracy_drop']:.2%} > {args.max_drop:.2%} (الميتاداتا لم تتغير)")
+        sys.exit(1)
+
+    meta.setdefault("variants", {})[args.variant] = {"file": out_path.name, **report}
+    if not args.no_activate:
+        meta["variant"] = args.variant
+    _write_meta(meta_path, meta)
+    print(f"✅ سُجّلت النسخة '{args.variant}' في {meta_path}" + ("" if args.no_activate else " وتم تفعيلها"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+تدريب مصنّف النقاط المفتاحية (MLP) لمحرك الكلمات + تصديره إلى ONNX
+التشغيل (من مجلد Backend):
+    python -m scripts.train_landmark_model --data path/to/mubser2_model --split-from path/to/data_Split --out .
+- data: الصور الأصلية قبل التنظيف (DATA_DIR في دفتر "model 2 -Data Prep": <class>/*)
+  إطارات كاملة فيها الوجه والجسم كما تصل إلى الخادم ، وليست قصص data_Split الرمادية 64x64
+  (Holistic لا يجد وجهاً أو جسماً في القصص ونادراً ما يجد اليد ، فتختلف الخصائص عن وقت الخدمة)
+- split-from: data_Split من نفس الدفتر لاستخدام نفس تقسيم train/val/test (بمطابقة اسم الملف)
+  بدونه: تقسيم طبقي 80/10/10 بنفس البذرة ؛ الصور المحذوفة في التنظيف (مكررة/تالفة) تُستبعد مع split-from
+- الخصائص تُستخرج بنفس دالة الخادم (app.landmarks.extract_features) وتُحفظ في --features-cache
+- المخرجات: Mubser_landmarks_mlp.onnx + Mubser_landmarks_mlp.meta.json
+يتطلب torch (كما في دفاتر التدريب) - غير مطلوب على الخادم
+"""
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import onnxruntime as ort
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from app.landmarks import FEATURE_DIM, FEATURE_VERSION, MODEL_PATH, extract_features, hands_detected
+
+SPLITS = ("train", "val", "test")
+# نفس نسب وبذرة التقسيم في دفتر التجهيز
+SPLIT_RATIOS = (0.8, 0.1, 0.1)
+SPLIT_SEED = 42
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+class LandmarkMLP(nn.Module):
+    def __init__(self, in_dim: int, num_classes: int, hidden: int = 256, dropout: float = 0.3):
+        super().__init__()
+        self.net = nn.Sequential(
+            nn.Linear(in_dim, hidden), nn.BatchNorm1d(hidden), nn.ReLU(), nn.Dropout(dropout),
+            nn.Linear(hidden, hidden // 2), nn.BatchNorm1d(hidden // 2), nn.ReLU(), nn.Dropout(dropout),
+            nn.Linear(hidden // 2, num_classes),
+        )
+
+    def forward(self, x):
+        return self.net(x)
+
+
+def _images(folder: Path) -> List[Path]:
+    return sorted(p for p in folder.glob("*") if p.suffix.lower() in IMAGE_EXTS)
+
+
+def _split_paths(data_dir: Path, classes: List[str], split_from: Optional[Path]) -> Dict[str, Dict[str, List[Path]]]:
+    """{split: {class: [صور أصلية]}}"""
+    splits: Dict[str, Dict[str, List[Path]]] = {split: {} for split in SPLITS}
+    for cls in classes:
+        paths = _images(data_dir / cls)
+        if split_from is not None:
+            # data_Split يحفظ <stem>.png لكل صورة أصلية
+            by_stem = {p.stem: p for p in paths}
+            for split in SPLITS:
+                stems = [p.stem for p in _images(split_from / split / cls)]
+                splits[split][cls] = [by_stem[s] for s in stems if s in by_stem]
+            continue
+        idx = list(range(len(paths)))
+        random.Random(SPLIT_SEED).shuffle(idx)
+        n_train = int(round(len(paths) * SPLIT_RATIOS[0]))
+        n_val = int(round(len(paths) * SPLIT_RATIOS[1]))
+        bounds = {"train": (0, n_train), "val": (n_train, n_train + n_val), "test": (n_train + n_val, len(paths))}
+        for split, (lo, hi) in bounds.items():
+            splits[split][cls] = [paths[i] for i in idx[lo:hi]]
+    return splits
+
+
+def _extract_split(split: str, paths: Dict[str, List[Path]], classes: List[str]) -> Tuple[Optional[np.ndarray], np.ndarray, int]:
+    """يرجّع (X أو None إن لم تُكتشف يد في أي صورة، y، عدد الصور بدون يد المستبعدة)"""
+    xs, ys, skipped = [], [], 0
+    for label, cls in enumerate(classes):
+        for p in paths.get(cls, []):
+            with Image.open(p) as im:
+                features = extract_features(np.asarray(im.convert("RGB")))
+            if not hands_detected(features):
+                skipped += 1
+                continue
+            xs.append(features)
+            ys.append(label)
+        print(f"  {split}/{cls}: {len(paths.get(cls, []))} صورة")
+    if not xs:
+        return None, np.zeros(0, dtype=np.int64), skipped
+    return np.stack(xs).astype(np.float32), np.array(ys, dtype=np.int64), skipped
+
+
+def load_features(data_dir: Path, cache: Path, split_from: Optional[Path] = None) -> Dict[str, np.ndarray]:
+    if cache.exists():
+        print(f"📦 استخدام الخصائص المحفوظة: {cache}")
+        arrays = dict(np.load(cache, allow_pickle=False))
+        if int(arrays["feature_version"]) == FEATURE_VERSION:
+            return arrays
+        print("⚠️ إصدار الخصائص تغيّر - إعادة الاستخراج")
+
+    classes = sorted(d.name for d in data_dir.iterdir() if d.is_dir())
+    if not classes:
+        raise SystemExit(f"❌ لا توجد مجلدات أصناف في {data_dir}")
+    arrays: Dict[str, np.ndarray] = {"classes": np.array(classes), "feature_version": np.array(FEATURE_VERSION)}
+    for split, paths in _split_paths(data_dir, classes, split_from).items():
+        if not any(paths.values()):
+            continue
+        x, y, skipped = _extract_split(split, paths, classes)
+        if x is None:
+            print(f"⚠️ {split}: لم تُكتشف يد في أي صورة ({skipped}) - تم تخطيه")
+            continue
+        arrays[f"x_{split}"], arrays[f"y_{split}"] = x, y
+        print(f"✅ {split}: {len(y)} عينة ({skipped} بدون يد مستبعدة)")
+    if "x_train" not in arrays:
+        raise SystemExit("❌ لا توجد عينات تدريب (train) بعد استبعاد الصور بدون يد")
+    np.savez_compressed(cache, **arrays)
+    return arrays
+
+
+def _augment(x: torch.Tensor, noise: float) -> torch.Tensor:
+    """ضجيج + تكبير/تصغير خفيف للإحداثيات (علامتا وجود اليدين ثابتتان)"""
+    coords = x[:, :-2]
+    scale = torch.empty(x.shape[0], 1).uniform_(0.9, 1.1)
+    coords = coords * scale + noise * torch.randn_like(coords) * (coords != 0)
+    return torch.cat([coords, x[:, -2:]], dim=1)
+
+
+def _accuracy(model: nn.Module, x: np.ndarray, y: np.ndarray) -> float:
+    model.eval()
+    with torch.no_grad():
+        pred = model(torch.from_numpy(x)).argmax(dim=1).numpy()
+    return float((pred == y).mean())
+
+
+def train(arrays: Dict[str, np.ndarray], args) -> Tuple[nn.Module, dict]:
+    torch.manual_seed(args.seed)
+    classes = list(arrays["classes"])
+    x_train, y_train = arrays["x_train"], arrays["y_train"]
+    x_val, y_val = arrays.get("x_val", x_train), arrays.get("y_val", y_train)
+
+    model = LandmarkMLP(FEATURE_DIM, len(classes), hidden=args.hidden, dropout=args.dropout)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr, weight_decay=args.weight_decay)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=args.epochs)
+    criterion = nn.CrossEntropyLoss(label_smoothing=0.1)
+
+    xt, yt = torch.from_numpy(x_train), torch.from_numpy(y_train)
+    best_acc, best_state, best_epoch, stale = -1.0, None, 0, 0
+    for epoch in range(1, args.epochs + 1):
+        model.train()
+        order = torch.randperm(len(yt))
+        total = 0.0
+        for start in range(0, len(order), args.batch_size):
+            idx = order[start:start + args.batch_size]
+            if len(idx) < 2:  # BatchNorm يحتاج أكثر من عينة
+                continue
+            optimizer.zero_grad()
+            loss = criterion(model(_augment(xt[idx], args.noise)), yt[idx])
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(idx)
+        scheduler.step()
+
+        val_acc = _accuracy(model, x_val, y_val)
+        if val_acc > best_acc:
+            best_acc, best_epoch, stale = val_acc, epoch, 0
+            best_state = {k: v.clone() for k, v in model.state_dict().items()}
+        else:
+            stale += 1
+        if epoch % 10 == 0 or stale == 0:
+            print(f"epoch {epoch:3d}  loss={total / len(yt):.4f}  val_acc={val_acc:.4f}")
+        if stale >= args.patience:
+            print(f"⏹️ توقف مبكر عند epoch {epoch}")
+            break
+
+    model.load_state_dict(best_state)
+    metrics = {"val_accuracy": best_acc, "best_epoch": best_epoch, "train_samples": int(len(yt))}
+    if "x_test" in arrays:
+        metrics["test_accuracy"] = _accuracy(model, arrays["x_test"], arrays["y_test"])
+    return model, metrics
+
+
+def export(model: nn.Module, out_path: Path, arrays: Dict[str, np.ndarray]) -> float:
+    """تصدير ONNX (محور دفعة ديناميكي) + التحقق بـ onnxruntime على مجموعة الاختبار"""
+    model.eval()
+    torch.onnx.export(
+        model,
+        torch.zeros(1, FEATURE_DIM),
+        str(out_path),
+        input_names=["input"],
+        output_names=["output"],
+        dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+        opset_version=13,
+    )
+    x = arrays.get("x_test", arrays["x_train"])
+    y = arrays.get("y_test", arrays["y_train"])
+    session = ort.InferenceSession(str(out_path), providers=["CPUExecutionProvider"])
+    logits = session.run(None, {"input": x})[0]
+    return float((logits.argmax(axis=1) == y).mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and export the landmark MLP word classifier")
+    parser.add_argument("--data", type=Path, required=True, help="الصور الأصلية قبل التنظيف (<class>/*)")
+    parser.add_argument("--split-from", type=Path, help="مجلد data_Split لنفس تقسيم train/val/test")
+    parser.add_argument("--out", type=Path, default=MODEL_PATH.parent)
+    parser.add_argument("--features-cache", type=Path, default=Path("landmark_features.npz"))
+    parser.add_argument("--mapping-from", type=Path, default=Path("Mubser_model_89cls_64.meta.json"),
+                        help="ميتاداتا نموذج الكلمات لنسخ mapping (إن وُجد)")
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--patience", type=int, default=25)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--weight-decay", type=float, default=1e-4)
+    parser.add_argument("--hidden", type=int, default=256)
+    parser.add_argument("--dropout", type=float, default=0.3)
+    parser.add_argument("--noise", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    arrays = load_features(args.data, args.features_cache, args.split_from)
+    model, metrics = train(arrays, args)
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    onnx_path = args.out / MODEL_PATH.name
+    metrics["onnx_test_accuracy"] = export(model, onnx_path, arrays)
+
+    meta = {
+        "classes": [str(c) for c in arrays["classes"]],
+        "feature_version": FEATURE_VERSION,
+        "feature_dim": FEATURE_DIM,
+        "metrics": metrics,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if args.mapping_from.exists():
+        with args.mapping_from.open("r", encoding="utf-8") as f:
+            mapping = json.load(f).get("mapping")
+        if mapping:
+            meta["mapping"] = mapping
+    meta_path = onnx_path.with_suffix(".meta.json")
+    meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print(json.dumps(metrics, indent=2))
+    print(f"✅ {onnx_path}\n✅ {meta_path}")
+
+
+if __name__ == "__main__":
+    main()
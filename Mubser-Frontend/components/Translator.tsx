@@ -51,8 +51,9 @@ const Translator: React.FC<TranslatorProps> = ({ mode }) => {
   const fileInputRef = useRef<HTMLInputElement>(null);
   const intervalRef = useRef<number | null>(null);
   const inFlightRef = useRef<boolean>(false);
+  const liveSessionRef = useRef<string | null>(null);
 
-  const analyzeImageBlob = useCallback(async (imageBlob: Blob) => {
+  const analyzeImageBlob = useCallback(async (imageBlob: Blob, sessionId?: string | null) => {
     if (inFlightRef.current) return;
     inFlightRef.current = true;
     setStatus(Status.Translating);
@@ -67,6 +68,7 @@ const Translator: React.FC<TranslatorProps> = ({ mode }) => {
     try {
       const formData = new FormData();
       formData.append('image', imageBlob, 'capture.jpg');
+      if (sessionId) formData.append('session_id', sessionId);
 
       const response = await fetch(backendUrl, {
         method: 'POST',
@@ -150,7 +152,7 @@ const Translator: React.FC<TranslatorProps> = ({ mode }) => {
       ctx.restore();
 
       const blob = await canvasToBlob(canvas, 'image/jpeg', 0.9);
-      await analyzeImageBlob(blob);
+      await analyzeImageBlob(blob, liveSessionRef.current);
     } catch (e) {
       console.error("Error processing frame:", e);
     }
@@ -174,6 +176,7 @@ const Translator: React.FC<TranslatorProps> = ({ mode }) => {
       intervalRef.current = null;
     }
     setIsCameraOn(false);
+    liveSessionRef.current = null;
     setStatus(Status.Idle);
     setDetectedText('');
     setConfidence(0);
@@ -194,6 +197,7 @@ const Translator: React.FC<TranslatorProps> = ({ mode }) => {
       if (videoRef.current) {
         videoRef.current.srcObject = stream;
         streamRef.current = stream;
+        liveSessionRef.current = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
         setIsCameraOn(true);
         setStatus(Status.Watching);
       }